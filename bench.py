@@ -0,0 +1,198 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import scanner
+from hasher import HashEngine
+from hash_cache import HashCache
+from dirindex import DirSizeIndex
+from listing import build_listing
+from compare import compare_directories, COMPARE_MODES
+from snapshot import create_snapshot
+from shards import iter_sharded_differences
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Фиксированное время изменения, чтобы деревья с одним seed совпадали побайтно и по метаданным
+BASE_MTIME = 1600000000
+PHASES = ('scan', 'listing', 'hash', 'hash_cached') + tuple(f'compare_{mode}' for mode in COMPARE_MODES) + \
+    ('compare_sharded', 'snapshot')
+
+def file_size(rng, mean_size, sigma, max_size):
+    return min(max_size, int(rng.lognormvariate(0, sigma) * mean_size))
+
+def generate_tree(root, depth=3, fanout=4, files_per_dir=20, mean_size=16 * 1024, sigma=1.0,
+                  max_size=16 * 1024 * 1024, seed=0):
+    rng = random.Random(seed)
+    stats = {'files': 0, 'dirs': 0, 'bytes': 0}
+
+    def build(path, level):
+        os.makedirs(path, exist_ok=True)
+        stats['dirs'] += 1
+        for i in range(files_per_dir):
+            size = file_size(rng, mean_size, sigma, max_size)
+            file_path = os.path.join(path, f'file{i:04d}.bin')
+            with open(file_path, 'wb') as f:
+                f.write(rng.randbytes(size))
+            mtime = BASE_MTIME + stats['files']
+            os.utime(file_path, (mtime, mtime))
+            stats['files'] += 1
+            stats['bytes'] += size
+        if level < depth:
+            for i in range(fanout):
+                build(os.path.join(path, f'dir{i:02d}'), level + 1)
+
+    build(root, 0)
+    return stats
+
+def mutate_tree(source, target, modify=0.05, add=0.02, delete=0.02, seed=0):
+    rng = random.Random(seed + 1)
+    shutil.copytree(source, target)
+    stats = {'modified': 0, 'added': 0, 'deleted': 0}
+    for root, dirs, files in os.walk(target):
+        dirs.sort()
+        for name in sorted(files):
+            file_path = os.path.join(root, name)
+            roll = rng.random()
+            if roll < delete:
+                os.remove(file_path)
+                stats['deleted'] += 1
+            elif roll < delete + modify:
+                # Половина изменений сохраняет размер и время -> их находит только сравнение содержимого
+                size = os.path.getsize(file_path)
+                st = os.stat(file_path)
+                with open(file_path, 'r+b') as f:
+                    f.seek(rng.randrange(size) if size else 0)
+                    f.write(rng.randbytes(1))
+                if rng.random() < 0.5:
+                    os.utime(file_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+                stats['modified'] += 1
+        if rng.random() < add * max(1, len(files)):
+            with open(os.path.join(root, f'added{stats["added"]:04d}.bin'), 'wb') as f:
+                f.write(rng.randbytes(rng.randrange(1, 64 * 1024)))
+            stats['added'] += 1
+    return stats
+
+def read_io_counters():
+    try:
+        with open('/proc/self/io') as f:
+            return {key: int(value) for key, value in (line.split(':') for line in f)}
+    except OSError:
+        return None
+
+def peak_rss_kb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+def measure(func, files, total_bytes):
+    scanner.reset_stat_calls()
+    io_before = read_io_counters()
+    started = time.perf_counter()
+    func()
+    seconds = time.perf_counter() - started
+    io_after = read_io_counters()
+    result = {
+        'seconds': round(seconds, 6),
+        'files': files,
+        'bytes': total_bytes,
+        'files_per_s': round(files / seconds, 1) if seconds else None,
+        'mb_per_s': round(total_bytes / seconds / 2**20, 2) if seconds else None,
+        'stat_calls': scanner.stat_calls,
+        'peak_rss_kb': peak_rss_kb()
+    }
+    if io_before and io_after:
+        result['read_syscalls'] = io_after['syscr'] - io_before['syscr']
+        result['write_syscalls'] = io_after['syscw'] - io_before['syscw']
+        result['bytes_read'] = io_after['rchar'] - io_before['rchar']
+    return result
+
+def run_benchmarks(tree1, tree2, work_dir, phases=PHASES, workers=None, processes=None):
+    index = DirSizeIndex(tree1)
+    files = index.file_count(tree1)
+    total_bytes = index.size(tree1)
+    all_files = [os.path.join(root, name) for root, dirs, names in os.walk(tree1) for name in names]
+    directories = [root for root, dirs, names in os.walk(tree1)]
+    cache = HashCache(os.path.join(work_dir, 'hashes.db'))
+    cached_engine = HashEngine(workers, cache=cache)
+    cached_engine.hash_map(all_files)
+
+    runners = {
+        'scan': lambda: DirSizeIndex(tree1),
+        'listing': lambda: [build_listing(directory, index) for directory in directories],
+        'hash': lambda: HashEngine(workers, cache=None).hash_map(all_files),
+        'hash_cached': lambda: cached_engine.hash_map(all_files),
+        'compare_sharded': lambda: list(iter_sharded_differences(tree1, tree2, 'full', processes, cache=None)),
+        'snapshot': lambda: create_snapshot(tree1, False, output=os.path.join(work_dir, 'snapshot.zip'), workers=workers)
+    }
+    for mode in COMPARE_MODES:
+        runners[f'compare_{mode}'] = lambda mode=mode: compare_directories(
+            tree1, tree2, mode, HashEngine(workers, cache=None), recursive=True)
+
+    results = {}
+    for phase in phases:
+        # Сравнение читает оба дерева
+        scale = 2 if phase.startswith('compare_') else 1
+        results[phase] = measure(runners[phase], files * scale, total_bytes * scale)
+    cache.close()
+    return results
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='bench', description="Benchmark FolderWatcher on a synthetic tree")
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--fanout', type=int, default=4)
+    parser.add_argument('--files', type=int, default=20, help="files per directory")
+    parser.add_argument('--mean-size', type=int, default=16 * 1024)
+    parser.add_argument('--sigma', type=float, default=1.0, help="spread of the log-normal file size distribution")
+    parser.add_argument('--max-size', type=int, default=16 * 1024 * 1024)
+    parser.add_argument('--modify', type=float, default=0.05)
+    parser.add_argument('--add', type=float, default=0.02)
+    parser.add_argument('--delete', type=float, default=0.02)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--processes', type=int, help="processes for the compare_sharded phase")
+    parser.add_argument('--phases', nargs='+', choices=PHASES, default=PHASES)
+    parser.add_argument('--dir', help="keep the generated trees in this directory")
+    parser.add_argument('--output', '-o', help="write the JSON report to a file")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    work_dir = args.dir or tempfile.mkdtemp(prefix='folderwatcher-bench-')
+    try:
+        tree1 = os.path.join(work_dir, 'tree1')
+        tree2 = os.path.join(work_dir, 'tree2')
+        for tree in (tree1, tree2):
+            shutil.rmtree(tree, ignore_errors=True)
+        generated = generate_tree(tree1, args.depth, args.fanout, args.files, args.mean_size, args.sigma,
+                                  args.max_size, args.seed)
+        mutated = mutate_tree(tree1, tree2, args.modify, args.add, args.delete, args.seed)
+        report = {
+            'config': {key: value for key, value in vars(args).items() if key not in ('dir', 'output')},
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'tree': dict(generated, **mutated),
+            'phases': run_benchmarks(tree1, tree2, work_dir, args.phases, args.workers, args.processes)
+        }
+    finally:
+        if not args.dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,104 +1,496 @@
 import os
-import time
-import hashlib
-import stat
-from pyads import ADS
+from collections import namedtuple
+from hasher import default_engine, resolve_algorithm, SAMPLE_SIZE, ALGORITHM
+from scanner import FileInfo, scan_directory, format_attributes, format_mtime, FILE_FIELDS, FIELD_ORDER
+from tree import DirNode, scan_tree, prune_tree
+from records import build_record_store
+from dirindex import DirSizeIndex
+from manifest import is_manifest, load_manifest_tree
+from zipview import ZipSnapshot, is_snapshot_archive
+from moves import match_moves, match_moved_dirs
+import streams
+import metrics
+
+COMPARE_QUICK = 'size_mtime'
+COMPARE_SAMPLED = 'sampled'
+COMPARE_FULL = 'full'
+COMPARE_MODES = (COMPARE_QUICK, COMPARE_SAMPLED, COMPARE_FULL)
+
+DIFF_MODIFIED = 'modified'
+DIFF_ONLY_IN1 = 'only_in1'
+DIFF_ONLY_IN2 = 'only_in2'
+DIFF_MOVED = 'moved'
+
+# Для перемещённых path - новый путь, source - прежний
+Difference = namedtuple('Difference', ('status', 'path', 'is_dir', 'changes', 'source'), defaults=(None, None))
 
 def calculate_directory_size(path):
-    total_size = 0
-    for entry in os.scandir(path):
-        if entry.is_dir(follow_symlinks=False):
-            total_size += calculate_directory_size(entry.path)
-        else:
-            total_size += entry.stat(follow_symlinks=False).st_size
-    return total_size
+    return DirSizeIndex(path).size(path)
 
 def get_file_attributes(path):
-    stats = os.stat(path)
-    attrs = stats.st_file_attributes
-    attrs_to_test = [
-            (stat.FILE_ATTRIBUTE_ARCHIVE, 'a'), # Архивный файл
-            (stat.FILE_ATTRIBUTE_READONLY, 'r'), # Файл только для чтения
-            (stat.FILE_ATTRIBUTE_SYSTEM, 's'), # Системный файл
-            (stat.FILE_ATTRIBUTE_HIDDEN, 'h'), # Скрытый файл
-            (stat.FILE_ATTRIBUTE_NOT_CONTENT_INDEXED, 'i') # Файл не индексируется для поиска
-        ]
-    return ''.join([ch if attrs & attr else "-" for attr, ch in attrs_to_test])
+    return format_attributes(os.stat(path).st_file_attributes)
 
 def get_last_modified(path):
-    last_modified_timestamp = os.path.getmtime(path)
-    last_modified_time = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(last_modified_timestamp))
-    return last_modified_time
+    return format_mtime(os.path.getmtime(path))
+
+def calculate_file_hash(file_path):
+    return default_engine.hash_file(file_path)
+
+def list_streams(info):
+    if info.streams is not None:
+        return info.streams
+    return streams.list_streams(info.path)
+
+def file_record(info, fields=FILE_FIELDS, mtime_resolution_ns=1):
+    record = {'size': info.size}
+    if 'attributes' in fields:
+        record['attributes'] = info.attributes_text()
+    if 'last_modified' in fields:
+        mtime_ns = info.mtime_ns - info.mtime_ns % mtime_resolution_ns
+        record['last_modified'] = format_mtime(mtime_ns / 1e9)
+    if 'ads' in fields:
+        record['ads'] = list_streams(info)
+    return record
+
+class LiveSource:
+    native_algorithm = None
+    fields = FILE_FIELDS
+    mtime_resolution_ns = 1
+    has_samples = True
+    has_content = True
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def digests(self, infos, algorithm, sampled=False, progress=None):
+        return self.engine.hash_map((info.path for info in infos), sampled, algorithm, progress)
+
+def choose_algorithm(sources, mode, algorithm=None):
+    natives = {source.native_algorithm for source in sources if source.native_algorithm}
+    if algorithm is None:
+        # Оба снимка в zip (или zip и диск) -> достаточно CRC из центрального каталога
+        if natives == {'crc32'}:
+            return 'crc32', False
+        # Манифест хранит хеши одного алгоритма -> по умолчанию сравниваем в нём
+        if len(natives) == 1:
+            algorithm = natives.pop()
+    return resolve_algorithm(algorithm), mode == COMPARE_SAMPLED
+
+def content_mode(sources, mode):
+    # Без хешей у одной из сторон содержимое не сравнить -> только размер и время изменения
+    if mode != COMPARE_QUICK and not all(source.has_content for source in sources):
+        metrics.logger.info("Snapshot has no content hashes, comparing by size and modification time")
+        return COMPARE_QUICK
+    return mode
+
+def digests_differ(digest1, digest2):
+    # Хеш None - файл не прочитан: равенство не доказано, считаем различием
+    return digest1 is None or digest2 is None or digest1 != digest2
+
+def compare_content(pairs, mode, engine, sources=None, progress=None, algorithm=ALGORITHM):
+    if mode == COMPARE_QUICK:
+        # Быстрый режим доверяет размеру и времени изменения, содержимое не сравнивается
+        return {name: False for name in pairs}
+    source1, source2 = sources or (LiveSource(engine), LiveSource(engine))
+    differs = {name: info1.size != info2.size for name, (info1, info2) in pairs.items()}
+
+    def compare_tier(candidates, sampled):
+        with metrics.phase('hash'):
+            digests = source1.digests([pairs[name][0] for name in candidates], algorithm, sampled, progress)
+            digests.update(source2.digests([pairs[name][1] for name in candidates], algorithm, sampled, progress))
+        for name in candidates:
+            info1, info2 = pairs[name]
+            differs[name] = digests_differ(digests.get(info1.path), digests.get(info2.path))
+
+    # Одинаковый размер -> сравниваем начало и конец файла.
+    # У zip выборки нет (пришлось бы распаковывать), там сразу CRC из каталога архива
+    candidates = [name for name, differ in differs.items() if not differ]
+    if source1.has_samples and source2.has_samples:
+        compare_tier(candidates, True)
+        if mode == COMPARE_SAMPLED:
+            return differs
+        # Выборка совпала -> полный хеш, если выборка не покрыла файл целиком
+        candidates = [name for name in candidates if not differs[name] and pairs[name][0].size > 2 * SAMPLE_SIZE]
+    compare_tier(candidates, False)
+    return differs
+
+def compare_files(common, mode, engine, sources=None, fields=FILE_FIELDS, mtime_resolution_ns=1, progress=None,
+                  algorithm=ALGORITHM):
+    content_diff = compare_content(common, mode, engine, sources, progress, algorithm)
+    size_diff_files = {}
+    for f, (info1, info2) in common.items():
+        record1 = file_record(info1, fields, mtime_resolution_ns)
+        record2 = file_record(info2, fields, mtime_resolution_ns)
+        diff = {key: record1.get(key) != record2.get(key) for key in FIELD_ORDER}
+        diff['hash'] = content_diff[f]
+        if any(diff.values()):
+            size_diff_files[f] = diff
+    return size_diff_files
+
+def collect_differences(differences, with_moves=False):
+    # Прежняя форма результата - шесть наборов; словарь переносов (новый путь -> прежний) добавляется седьмым,
+    # только если поиск переносов был запрошен
+    size_diff_files = {}
+    only_in1_files, only_in2_files = set(), set()
+    only_in1_dirs, only_in2_dirs = set(), set()
+    size_diff_dirs = set()
+    moved = {}
+    for difference in differences:
+        if difference.status == DIFF_MOVED:
+            moved[difference.path] = difference.source
+        elif difference.status == DIFF_MODIFIED:
+            if difference.is_dir:
+                size_diff_dirs.add(difference.path)
+            else:
+                size_diff_files[difference.path] = difference.changes
+        elif difference.status == DIFF_ONLY_IN1:
+            (only_in1_dirs if difference.is_dir else only_in1_files).add(difference.path)
+        else:
+            (only_in2_dirs if difference.is_dir else only_in2_files).add(difference.path)
+    result = size_diff_files, only_in1_files, only_in2_files, only_in1_dirs, only_in2_dirs, size_diff_dirs
+    return result + (moved,) if with_moves else result
+
+def modified_files(common, mode, engine, sources=None, fields=FILE_FIELDS, mtime_resolution_ns=1, progress=None,
+                   algorithm=ALGORITHM):
+    for path, changes in compare_files(common, mode, engine, sources, fields, mtime_resolution_ns, progress,
+                                       algorithm).items():
+        yield Difference(DIFF_MODIFIED, path, False, changes)
+
+def iter_tree_differences(tree1, tree2, mode=COMPARE_FULL, engine=None, progress=None, algorithm=None):
+    engine = engine or default_engine
+    source1 = tree1.source or LiveSource(engine)
+    source2 = tree2.source or LiveSource(engine)
+    fields = source1.fields & source2.fields
+    mtime_resolution_ns = max(source1.mtime_resolution_ns, source2.mtime_resolution_ns)
+    mode = content_mode((source1, source2), mode)
+
+    def digest_key(source, stored):
+        def key(info):
+            record = file_record(info, fields - {'ads'}, mtime_resolution_ns)
+            if stored:
+                record['hash'] = source.stored_digest(info)
+            return '\0'.join(str(value) for value in record.values())
+        return key
 
-def list_ads_files(file_path):
-    ads_files = []
+    algorithm = choose_algorithm((source1, source2), mode, algorithm)[0]
+    # Поддерево с совпавшим дайджестом не читается; содержимое хешируется по уровням лишь в различающихся каталогах.
+    # При сравнении содержимого дайджест по одним метаданным пропустил бы правку с теми же размером и временем,
+    # поэтому отсекаем, только если обе стороны хранят хеши нужного алгоритма (манифесты, CRC в zip)
+    stored = mode != COMPARE_QUICK and source1.native_algorithm == source2.native_algorithm == algorithm
+    prune = mode == COMPARE_QUICK or stored
+    if prune:
+        with metrics.phase('digest'):
+            tree1.update_digest(recursive=True, key=digest_key(source1, stored))
+            tree2.update_digest(recursive=True, key=digest_key(source2, stored))
+
+    modified_dirs = set()
+    stack = [('', tree1, tree2)]
+    while stack:
+        prefix, node1, node2 = stack.pop()
+        # Одинаковый дайджест -> всё поддерево совпадает, дальше не спускаемся
+        if prune and node1.digest == node2.digest:
+            continue
+        differences = []
+        common = {}
+        for name, child1 in node1.children.items():
+            rel_path = os.path.join(prefix, name)
+            child2 = node2.children.get(name)
+            is_dir1 = isinstance(child1, DirNode)
+            if child2 is None:
+                differences.append(Difference(DIFF_ONLY_IN1, rel_path, is_dir1))
+            elif is_dir1 != isinstance(child2, DirNode):
+                differences.append(Difference(DIFF_ONLY_IN1, rel_path, is_dir1))
+                differences.append(Difference(DIFF_ONLY_IN2, rel_path, not is_dir1))
+            elif is_dir1:
+                stack.append((rel_path, child1, child2))
+            else:
+                common[rel_path] = (child1, child2)
+        for name, child2 in node2.children.items():
+            if name not in node1.children:
+                differences.append(Difference(DIFF_ONLY_IN2, os.path.join(prefix, name), isinstance(child2, DirNode)))
+        # Общие файлы сравниваем по каталогам, чтобы результаты выдавались по мере обхода
+        differences.extend(modified_files(common, mode, engine, (source1, source2), fields, mtime_resolution_ns,
+                                          progress, algorithm))
+        parent = prefix if differences else ''
+        while parent and parent not in modified_dirs:
+            modified_dirs.add(parent)
+            parent = os.path.dirname(parent)
+        yield from differences
+    for path in sorted(modified_dirs):
+        yield Difference(DIFF_MODIFIED, path, True)
+
+def compare_trees(tree1, tree2, mode=COMPARE_FULL, engine=None, progress=None, algorithm=None):
+    return collect_differences(iter_tree_differences(tree1, tree2, mode, engine, progress, algorithm))
+
+def iter_store_differences(store1, store2, mode=COMPARE_FULL, engine=None, progress=None, algorithm=None):
+    # Обход двух хранилищ слиянием отсортированных записей каталога; FileInfo создаются только для общих файлов.
+    # Дайджестов каталогов здесь нет: у живых деревьев хранимых хешей нет, а метаданные всё равно уже прочитаны,
+    # так что сравнить их построчно не дороже, чем свернуть в дайджест
+    engine = engine or default_engine
+    algorithm = resolve_algorithm(algorithm)
+    modified_dirs = set()
+    stack = ['']
+    while stack:
+        rel_dir = stack.pop()
+        rows1, rows2 = store1.rows(rel_dir), store2.rows(rel_dir)
+        i, j = rows1.start, rows2.start
+        differences = []
+        common = {}
+        subdirs = []
+        while i < rows1.stop or j < rows2.stop:
+            name1 = store1.name_bytes(i) if i < rows1.stop else None
+            name2 = store2.name_bytes(j) if j < rows2.stop else None
+            if name2 is None or name1 is not None and name1 < name2:
+                differences.append(Difference(DIFF_ONLY_IN1, store1.rel_path(i), store1.is_dir(i)))
+                i += 1
+            elif name1 is None or name2 < name1:
+                differences.append(Difference(DIFF_ONLY_IN2, store2.rel_path(j), store2.is_dir(j)))
+                j += 1
+            else:
+                rel_path = store1.rel_path(i)
+                is_dir1, is_dir2 = store1.is_dir(i), store2.is_dir(j)
+                if is_dir1 != is_dir2:
+                    differences.append(Difference(DIFF_ONLY_IN1, rel_path, is_dir1))
+                    differences.append(Difference(DIFF_ONLY_IN2, rel_path, is_dir2))
+                elif is_dir1:
+                    subdirs.append(rel_path)
+                else:
+                    common[rel_path] = (store1.info(i), store2.info(j))
+                i += 1
+                j += 1
+        differences.extend(modified_files(common, mode, engine, progress=progress, algorithm=algorithm))
+        if differences and rel_dir:
+            parent = rel_dir
+            while parent and parent not in modified_dirs:
+                modified_dirs.add(parent)
+                parent = os.path.dirname(parent)
+        yield from differences
+        stack.extend(reversed(subdirs))
+    for path in sorted(modified_dirs):
+        yield Difference(DIFF_MODIFIED, path, True)
+
+def store_files(store, rel_path):
+    row = store.find(rel_path)
+    if row is None:
+        return
+    if not store.is_dir(row):
+        yield rel_path, store.info(row)
+        return
+    stack = [rel_path]
+    while stack:
+        for row in store.rows(stack.pop()):
+            if store.is_dir(row):
+                stack.append(store.rel_path(row))
+            else:
+                yield store.rel_path(row), store.info(row)
+
+def tree_files(tree, rel_path):
     try:
-        ads_instance = ADS(file_path)
-        if ads_instance.has_streams():
-            for stream in ads_instance:
-                stream_name = ads_instance.full_filename(stream)
-                stream_size = len(ads_instance.get_stream_content(stream))
-                ads_files.append((stream_name, stream_size))
-    except Exception as e:
-        print(f"Error accessing ADS: {e}")
-    return ads_files
-
-def calculate_file_hash(file_path, chunk_size=8192):
-    hash_sha256 = hashlib.sha256()
+        node = tree.find(rel_path)
+    except KeyError:
+        return
+    if not isinstance(node, DirNode):
+        yield rel_path, node
+        return
+    stack = [(rel_path, node)]
+    while stack:
+        prefix, node = stack.pop()
+        for name, child in node.children.items():
+            if isinstance(child, DirNode):
+                stack.append((os.path.join(prefix, name), child))
+            else:
+                yield os.path.join(prefix, name), child
+
+def disk_files(root, rel_path, ignore=None):
+    path = os.path.join(root, rel_path)
     try:
-        with open(file_path, 'rb') as f:
-            for chunk in iter(lambda: f.read(chunk_size), b''):
-                hash_sha256.update(chunk)
-    except Exception as e:
-        print(f"Error calculating hash: {e}")
-        return None
-    return hash_sha256.hexdigest()
-
-def compare_directories(dir1, dir2):
-    entries1 = {e.name: e for e in os.scandir(dir1)}
-    entries2 = {e.name: e for e in os.scandir(dir2)}
-
-    files1 = {f: {
-        'size': os.path.getsize(os.path.join(dir1, f)),
-        'attributes': get_file_attributes(os.path.join(dir1, f)),
-        'last_modified': get_last_modified(os.path.join(dir1, f)),
-        'ads': list_ads_files(os.path.join(dir1, f)),
-        'hash': calculate_file_hash(os.path.join(dir1, f))
-    } for f in entries1 if not entries1[f].is_dir()}
-
-    files2 = {f: {
-        'size': os.path.getsize(os.path.join(dir2, f)),
-        'attributes': get_file_attributes(os.path.join(dir2, f)),
-        'last_modified': get_last_modified(os.path.join(dir2, f)),
-        'ads': list_ads_files(os.path.join(dir2, f)),
-        'hash': calculate_file_hash(os.path.join(dir2, f))
-    } for f in entries2 if not entries2[f].is_dir()}
-
-    dirs1 = {d: calculate_directory_size(os.path.join(dir1, d)) for d in entries1 if entries1[d].is_dir()}
-    dirs2 = {d: calculate_directory_size(os.path.join(dir2, d)) for d in entries2 if entries2[d].is_dir()}
-
-    size_diff_files = {
-        f: {
-            'size': files1[f]['size'] != files2[f]['size'],
-            'attributes': files1[f]['attributes'] != files2[f]['attributes'],
-            'last_modified': files1[f]['last_modified'] != files2[f]['last_modified'],
-            'ads': files1[f]['ads'] != files2[f]['ads'],
-            'hash': files1[f]['hash'] != files2[f]['hash']
-        }
-        for f in files1 if f in files2 and (
-            files1[f]['size'] != files2[f]['size'] or
-            files1[f]['attributes'] != files2[f]['attributes'] or
-            files1[f]['last_modified'] != files2[f]['last_modified'] or
-            files1[f]['ads'] != files2[f]['ads'] or
-            files1[f]['hash'] != files2[f]['hash']
-        )
-    }
+        st = os.stat(path)
+    except OSError:
+        return
+    if not os.path.isdir(path):
+        yield rel_path, FileInfo.from_stat(os.path.basename(path), path, st)
+        return
+    # Пропущенное уже учтено при сравнении -> считаем по копии правил
+    store = build_record_store(path, ignore=ignore.copy() if ignore else None, rel_root=rel_path)
+    for row in store:
+        if not store.is_dir(row):
+            yield os.path.join(rel_path, store.rel_path(row)), store.info(row)
+
+def expand_side(differences, lookup):
+    files = {}
+    dirs = {}
+    for difference in differences:
+        entries = list(lookup(difference.path))
+        files.update(entries)
+        if not difference.is_dir:
+            continue
+        # Каталог мог переехать и внутри нового каталога -> учитываем все вложенные уровни
+        dirs.setdefault(difference.path, [])
+        for rel_path, info in entries:
+            parent = os.path.dirname(rel_path)
+            while len(parent) >= len(difference.path):
+                dirs.setdefault(parent, []).append(rel_path)
+                parent = os.path.dirname(parent)
+    for rel_files in dirs.values():
+        rel_files.sort()
+    return files, dirs
+
+def inside(path, dirs):
+    while path:
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+        if path in dirs:
+            return True
+    return False
+
+def move_digests(source, mode, algorithm, progress, resolution_ns):
+    if mode == COMPARE_QUICK:
+        # Быстрый режим ничего не читает: перенос узнаём по размеру и времени изменения
+        return lambda infos, sampled: {info.path: info.mtime_ns - info.mtime_ns % resolution_ns for info in infos}
+    return lambda infos, sampled: source.digests(infos, algorithm, sampled, progress)
+
+def iter_moves(differences, side1, side2, mode=COMPARE_FULL, algorithm=None, progress=None):
+    # Сторона - пара (функция, перечисляющая файлы по пути, источник хешей).
+    # Записи only_in копятся до конца сравнения: перенос может быть между любыми каталогами
+    (lookup1, source1), (lookup2, source2) = side1, side2
+    pending1, pending2 = [], []
+    for difference in differences:
+        if difference.status == DIFF_ONLY_IN1:
+            pending1.append(difference)
+        elif difference.status == DIFF_ONLY_IN2:
+            pending2.append(difference)
+        else:
+            yield difference
+
+    moves, moved_dirs = {}, {}
+    if pending1 and pending2:
+        mode = content_mode((source1, source2), mode)
+        algorithm = choose_algorithm((source1, source2), mode, algorithm)[0]
+        resolution_ns = max(source1.mtime_resolution_ns, source2.mtime_resolution_ns)
+        with metrics.phase('moves'):
+            files1, dirs1 = expand_side(pending1, lookup1)
+            files2, dirs2 = expand_side(pending2, lookup2)
+            try:
+                moves = match_moves(
+                    files1, files2,
+                    move_digests(source1, mode, algorithm, progress, resolution_ns),
+                    move_digests(source2, mode, algorithm, progress, resolution_ns),
+                    confirm=mode == COMPARE_FULL
+                )
+            except ValueError as e:
+                metrics.error('moves', "Move detection skipped: %s", e)
+            moved_dirs = match_moved_dirs(dirs1, dirs2, moves)
+        metrics.count('moved_files', len(moves))
+
+    moved_targets = set(moved_dirs.values())
+    for dir1, dir2 in sorted(moved_dirs.items(), key=lambda item: item[1]):
+        if not inside(dir1, moved_dirs):
+            yield Difference(DIFF_MOVED, dir2, True, source=dir1)
+    for rel1, rel2 in sorted(moves.items(), key=lambda item: item[1]):
+        if not inside(rel1, moved_dirs):
+            yield Difference(DIFF_MOVED, rel2, False, source=rel1)
+    matched2 = set(moves.values())
+    for difference in pending1:
+        if difference.path not in (moved_dirs if difference.is_dir else moves):
+            yield difference
+    for difference in pending2:
+        if difference.path not in (moved_targets if difference.is_dir else matched2):
+            yield difference
 
-    size_diff_dirs = {d for d in dirs1 if d in dirs2 and dirs1[d] != dirs2[d]}
-    only_in1_files = set(files1.keys()) - set(files2.keys())
-    only_in2_files = set(files2.keys()) - set(files1.keys())
-    only_in1_dirs = set(dirs1.keys()) - set(dirs2.keys())
-    only_in2_dirs = set(dirs2.keys()) - set(dirs1.keys())
+def load_side(path, engine=None, progress=None, ignore=None):
+    with metrics.phase('scan'):
+        if is_manifest(path):
+            tree = load_manifest_tree(path)[1]
+        elif is_snapshot_archive(path):
+            tree = ZipSnapshot(path, engine).tree
+        else:
+            return scan_tree(path, progress=progress, ignore=ignore)
+        return prune_tree(tree, ignore) if ignore else tree
+
+def iter_path_differences(path1, path2, mode=COMPARE_FULL, engine=None, progress=None, algorithm=None, ignore=None,
+                          detect_moves=False):
+    engine = engine or default_engine
+    if os.path.isdir(path1) and os.path.isdir(path2):
+        with metrics.phase('scan'):
+            store1 = build_record_store(path1, progress, ignore)
+            store2 = build_record_store(path2, progress, ignore)
+        differences = iter_store_differences(store1, store2, mode, engine, progress, algorithm)
+        if detect_moves:
+            side1 = (lambda rel_path: store_files(store1, rel_path), LiveSource(engine))
+            side2 = (lambda rel_path: store_files(store2, rel_path), LiveSource(engine))
+            differences = iter_moves(differences, side1, side2, mode, algorithm, progress)
+        yield from differences
+        return
+    trees = []
+    try:
+        trees.append(load_side(path1, engine, progress, ignore))
+        trees.append(load_side(path2, engine, progress, ignore))
+        tree1, tree2 = trees
+        differences = iter_tree_differences(tree1, tree2, mode, engine, progress, algorithm)
+        if detect_moves:
+            side1 = (lambda rel_path: tree_files(tree1, rel_path), tree1.source or LiveSource(engine))
+            side2 = (lambda rel_path: tree_files(tree2, rel_path), tree2.source or LiveSource(engine))
+            differences = iter_moves(differences, side1, side2, mode, algorithm, progress)
+        yield from differences
+    finally:
+        for tree in trees:
+            if isinstance(tree.source, ZipSnapshot):
+                tree.source.close()
 
-    return size_diff_files, only_in1_files, only_in2_files, only_in1_dirs, only_in2_dirs, size_diff_dirs
+def compare_paths(path1, path2, mode=COMPARE_FULL, engine=None, progress=None, algorithm=None, ignore=None,
+                  detect_moves=False):
+    return collect_differences(iter_path_differences(path1, path2, mode, engine, progress, algorithm, ignore,
+                                                     detect_moves), detect_moves)
+
+def iter_differences(dir1, dir2, mode=COMPARE_FULL, engine=None, recursive=False, index1=None, index2=None,
+                     progress=None, algorithm=None, ignore=None, detect_moves=False):
+    engine = engine or default_engine
+    if recursive or not os.path.isdir(dir1) or not os.path.isdir(dir2):
+        yield from iter_path_differences(dir1, dir2, mode, engine, progress, algorithm, ignore, detect_moves)
+        return
+    differences = iter_level_differences(dir1, dir2, mode, engine, index1, index2, progress, algorithm, ignore)
+    if detect_moves:
+        side1 = (lambda rel_path: disk_files(dir1, rel_path, ignore), LiveSource(engine))
+        side2 = (lambda rel_path: disk_files(dir2, rel_path, ignore), LiveSource(engine))
+        differences = iter_moves(differences, side1, side2, mode, algorithm, progress)
+    yield from differences
+
+def iter_level_differences(dir1, dir2, mode, engine, index1=None, index2=None, progress=None, algorithm=None,
+                           ignore=None):
+    with metrics.phase('scan'):
+        index1 = index1 or DirSizeIndex(dir1, progress, ignore)
+        index2 = index2 or DirSizeIndex(dir2, progress, ignore)
+        entries1 = scan_directory(dir1)
+        entries2 = scan_directory(dir2)
+        if ignore:
+            # Пропущенные записи уже учтены индексами
+            entries1 = {name: info for name, info in entries1.items() if not ignore.ignored(name, info.is_dir)}
+            entries2 = {name: info for name, info in entries2.items() if not ignore.ignored(name, info.is_dir)}
+
+    for name, info1 in entries1.items():
+        info2 = entries2.get(name)
+        if info2 is None:
+            yield Difference(DIFF_ONLY_IN1, name, info1.is_dir)
+        elif info1.is_dir and info2.is_dir and index1.size(info1.path) != index2.size(info2.path):
+            yield Difference(DIFF_MODIFIED, name, True)
+        elif info1.is_dir != info2.is_dir:
+            yield Difference(DIFF_ONLY_IN1, name, info1.is_dir)
+            yield Difference(DIFF_ONLY_IN2, name, info2.is_dir)
+    for name, info2 in entries2.items():
+        if name not in entries1:
+            yield Difference(DIFF_ONLY_IN2, name, info2.is_dir)
+
+    common = {
+        name: (info1, entries2[name]) for name, info1 in entries1.items()
+        if not info1.is_dir and name in entries2 and not entries2[name].is_dir
+    }
+    if progress is not None:
+        progress.set_total(2 * len(common), sum(info1.size + info2.size for info1, info2 in common.values()))
+    yield from modified_files(common, mode, engine, progress=progress, algorithm=resolve_algorithm(algorithm))
 
+def compare_directories(dir1, dir2, mode=COMPARE_FULL, engine=None, recursive=False, index1=None, index2=None,
+                        progress=None, algorithm=None, ignore=None, detect_moves=False):
+    return collect_differences(iter_differences(dir1, dir2, mode, engine, recursive, index1, index2, progress,
+                                                algorithm, ignore, detect_moves), detect_moves)
@@ -0,0 +1,155 @@
+import os
+from scanner import stat_entry, descends
+from jobs import check_progress
+
+class DirSizeIndex:
+    def __init__(self, root, progress=None, ignore=None):
+        self.root = os.path.normpath(root)
+        self.ignore = ignore
+        self.sizes = {}
+        self.children = {}
+        self._scan(self.root, progress)
+
+    def _scan(self, path, progress=None):
+        # Обход стеком; суммы считаются с конца порядка обхода - подкаталоги раньше родителей
+        order = []
+        stack = [path]
+        while stack:
+            dir_path = stack.pop()
+            check_progress(progress, path=dir_path)
+            size = file_count = 0
+            subdirs = []
+            try:
+                with os.scandir(dir_path) as it:
+                    for entry in it:
+                        info = stat_entry(entry)
+                        if info is None or self._ignored(info):
+                            continue
+                        if info.is_dir and not descends(info):
+                            self.sizes[info.path] = (0, 0)
+                        elif info.is_dir:
+                            subdirs.append(info.path)
+                        else:
+                            size += info.size
+                            file_count += 1
+            except OSError:
+                pass
+            order.append((dir_path, size, file_count))
+            self.children[dir_path] = subdirs
+            stack.extend(subdirs)
+        for dir_path, size, file_count in reversed(order):
+            for child in self.children[dir_path]:
+                child_size, child_count = self.sizes[child]
+                size += child_size
+                file_count += child_count
+            self.sizes[dir_path] = (size, file_count)
+        return self.sizes[path]
+
+    def _ignored(self, info):
+        # Исключённый каталог не открывается вовсе
+        return bool(self.ignore) and self.ignore.skip(os.path.relpath(info.path, self.root), info.is_dir)
+
+    def _ignored_path(self, path):
+        # Путь внутри исключённого каталога не обходится и при обновлении
+        if not self.ignore or path == self.root:
+            return False
+        parts = os.path.relpath(path, self.root).split(os.sep)
+        if parts[0] == os.pardir:
+            return False
+        return any(self.ignore.ignored('/'.join(parts[:i]), True) for i in range(1, len(parts) + 1))
+
+    def _forget(self, path):
+        stack = list(self.children.pop(path, ()))
+        while stack:
+            child = stack.pop()
+            stack.extend(self.children.pop(child, ()))
+            self.sizes.pop(child, None)
+        return self.sizes.pop(path, (0, 0))
+
+    def _parents(self, path):
+        while path != self.root:
+            parent = os.path.dirname(path)
+            if parent == path:
+                break
+            path = parent
+            yield path
+
+    def __contains__(self, path):
+        return os.path.normpath(path) in self.sizes
+
+    def size(self, path):
+        return self.get(path)[0]
+
+    def file_count(self, path):
+        return self.get(path)[1]
+
+    def get(self, path):
+        path = os.path.normpath(path)
+        if path not in self.sizes:
+            if self._ignored_path(path):
+                return 0, 0
+            self.refresh(path)
+        return self.sizes[path]
+
+    def refresh(self, path):
+        path = os.path.normpath(path)
+        old_size, old_count = self._forget(path)
+        if os.path.isdir(path) and not self._ignored_path(path):
+            new_size, new_count = self._scan(path)
+        else:
+            new_size = new_count = 0
+        self._propagate(path, new_size - old_size, new_count - old_count)
+        parent = os.path.dirname(path)
+        siblings = self.children.get(parent)
+        if siblings is not None and path != self.root:
+            if path in self.sizes and path not in siblings:
+                siblings.append(path)
+            elif path not in self.sizes and path in siblings:
+                siblings.remove(path)
+
+    def refresh_entries(self, path):
+        # Пересчитываем только непосредственное содержимое каталога, размеры известных подкаталогов берём из индекса
+        path = os.path.normpath(path)
+        if path not in self.sizes or not os.path.isdir(path):
+            return self.refresh(path)
+        old_size, old_count = self.sizes[path]
+        size = file_count = 0
+        subdirs = []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    info = stat_entry(entry)
+                    if info is None or self._ignored(info):
+                        continue
+                    if info.is_dir and not descends(info):
+                        self.sizes[info.path] = (0, 0)
+                    elif info.is_dir:
+                        subdirs.append(info.path)
+                        child_size, child_count = self.sizes.get(info.path) or self._scan(info.path)
+                        size += child_size
+                        file_count += child_count
+                    else:
+                        size += info.size
+                        file_count += 1
+        except OSError:
+            pass
+        for child in set(self.children.get(path, ())) - set(subdirs):
+            self._forget(child)
+        self.sizes[path] = (size, file_count)
+        self.children[path] = subdirs
+        self._propagate(path, size - old_size, file_count - old_count)
+
+    def adjust(self, path, size_delta, count_delta=0):
+        path = os.path.normpath(path)
+        if path in self.sizes:
+            size, count = self.sizes[path]
+            self.sizes[path] = (size + size_delta, count + count_delta)
+        self._propagate(path, size_delta, count_delta)
+
+    def _propagate(self, path, size_delta, count_delta):
+        if not size_delta and not count_delta:
+            return
+        for parent in self._parents(path):
+            if parent in self.sizes:
+                size, count = self.sizes[parent]
+                self.sizes[parent] = (size + size_delta, count + count_delta)
@@ -0,0 +1,115 @@
+import os
+import filecmp
+from collections import namedtuple, defaultdict
+from hasher import default_engine, resolve_algorithm, SAMPLE_SIZE
+from records import build_record_store, FLAG_DIR, FLAG_LINK
+import metrics
+
+# Кандидаты хешируются пачками, чтобы группы выдавались по мере подтверждения
+BATCH_FILES = 4096
+
+DuplicateGroup = namedtuple('DuplicateGroup', ('size', 'digest', 'paths'))
+
+def reclaimable(group):
+    return group.size * (len(group.paths) - 1)
+
+def size_buckets(stores, min_size=1):
+    # Два прохода по столбцам: сначала счётчики размеров, пути строятся только для повторяющихся
+    # Ссылки не учитываются: удаление ссылки места не освобождает
+    counts = defaultdict(int)
+    for store in stores:
+        for size, flags in zip(store.sizes, store.flags):
+            if not flags & (FLAG_DIR | FLAG_LINK) and size >= min_size:
+                counts[size] += 1
+    buckets = defaultdict(list)
+    for store in stores:
+        for row, (size, flags) in enumerate(zip(store.sizes, store.flags)):
+            if not flags & (FLAG_DIR | FLAG_LINK) and counts.get(size, 0) > 1:
+                buckets[size].append(os.path.join(store.root, store.rel_path(row)))
+    return buckets
+
+def distinct_files(paths):
+    # Жёсткие ссылки на один inode - один файл; так же схлопываются пути из пересекающихся корней.
+    # stat нужен только кандидатам с повторяющимся размером
+    seen = set()
+    files = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError as e:
+            metrics.error('duplicates', "Error reading %s: %s", path, e)
+            continue
+        if (st.st_dev, st.st_ino) not in seen:
+            seen.add((st.st_dev, st.st_ino))
+            files.append(path)
+    return files
+
+def split_by(paths, digests):
+    groups = defaultdict(list)
+    for path in paths:
+        digest = digests.get(path)
+        if digest is not None:
+            groups[digest].append(path)
+    return {digest: group for digest, group in groups.items() if len(group) > 1}
+
+def split_identical(paths):
+    # Побайтовая проверка: файл сравнивается с первым файлом каждой подгруппы
+    groups = []
+    for path in paths:
+        for group in groups:
+            try:
+                if filecmp.cmp(group[0], path, shallow=False):
+                    group.append(path)
+                    break
+            except OSError as e:
+                metrics.error('duplicates', "Error comparing %s: %s", path, e)
+                break
+        else:
+            groups.append([path])
+    return [group for group in groups if len(group) > 1]
+
+def confirm_batch(batch, engine, algorithm, verify=False, progress=None):
+    with metrics.phase('hash'):
+        samples = engine.hash_map([path for size, paths in batch for path in paths], True, algorithm, progress)
+        candidates = [(size, group) for size, paths in batch for group in split_by(paths, samples).values()]
+        # Выборка до 2 * SAMPLE_SIZE читает файл целиком: полный хеш нужен только крупным,
+        # у небольших хешируется один файл группы, чтобы вывести настоящий хеш содержимого
+        large = [path for size, group in candidates if size > 2 * SAMPLE_SIZE for path in group]
+        small = [group[0] for size, group in candidates if size <= 2 * SAMPLE_SIZE]
+        digests = engine.hash_map(large + small, False, algorithm, progress)
+    groups = []
+    for size, group in candidates:
+        if size <= 2 * SAMPLE_SIZE:
+            confirmed = {digests.get(group[0]): group} if digests.get(group[0]) else {}
+        else:
+            confirmed = split_by(group, digests)
+        for digest, paths in confirmed.items():
+            if verify:
+                with metrics.phase('verify'):
+                    groups.extend(DuplicateGroup(size, digest, sorted(same)) for same in split_identical(paths))
+            else:
+                groups.append(DuplicateGroup(size, digest, sorted(paths)))
+    return groups
+
+def iter_duplicates(roots, algorithm=None, engine=None, verify=False, min_size=1, progress=None, ignore=None):
+    # Размер -> выборка -> полный хеш -> (по желанию) побайтовое сравнение.
+    # Файлы с уникальным размером не читаются вовсе; крупные размеры обрабатываются первыми
+    engine = engine or default_engine
+    algorithm = resolve_algorithm(algorithm)
+    # 32-битному CRC совпадение не доказывает одинаковое содержимое -> только с побайтовой проверкой
+    verify = verify or algorithm == 'crc32'
+    with metrics.phase('scan'):
+        buckets = size_buckets([build_record_store(root, progress, ignore) for root in roots], min_size)
+    metrics.count('duplicate_candidates', sum(len(paths) for paths in buckets.values()))
+    batch, batch_files = [], 0
+    for size in sorted(buckets, reverse=True):
+        paths = distinct_files(buckets.pop(size))
+        if len(paths) < 2:
+            continue
+        batch.append((size, paths))
+        batch_files += len(paths)
+        if batch_files >= BATCH_FILES:
+            yield from confirm_batch(batch, engine, algorithm, verify, progress)
+            batch, batch_files = [], 0
+    if batch:
+        yield from confirm_batch(batch, engine, algorithm, verify, progress)
@@ -0,0 +1,212 @@
+import os
+import sys
+import csv
+import json
+import argparse
+import logging
+import metrics
+from hasher import default_cache, ALGORITHM_CHOICES
+from compare import iter_differences, COMPARE_MODES, COMPARE_FULL, DIFF_MODIFIED, DIFF_MOVED
+from snapshot import create_snapshot, COMPRESSION_TYPES, DEFAULT_COMPRESSION
+from manifest import write_manifest
+from shards import iter_sharded_differences
+from ignore import load_ignore, IGNORE_FILE
+from duplicates import iter_duplicates, reclaimable
+
+EXIT_IDENTICAL = 0
+EXIT_DIFFERENT = 1
+EXIT_ERROR = 2
+
+OUTPUT_FORMATS = ('ndjson', 'csv')
+CSV_FIELDS = ('status', 'type', 'path', 'from', 'changes')
+
+def difference_record(difference):
+    record = {
+        'status': difference.status,
+        'type': 'dir' if difference.is_dir else 'file',
+        'path': difference.path.replace('\\', '/')
+    }
+    if difference.status == DIFF_MODIFIED and difference.changes:
+        record['changes'] = [key for key, changed in difference.changes.items() if changed]
+    elif difference.status == DIFF_MOVED:
+        record['from'] = difference.source.replace('\\', '/')
+    return record
+
+class NdjsonWriter:
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, record):
+        self.stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.stream.flush()
+
+class CsvWriter:
+    def __init__(self, stream):
+        self.stream = stream
+        self.writer = csv.DictWriter(stream, CSV_FIELDS, lineterminator='\n')
+        self.writer.writeheader()
+
+    def write(self, record):
+        self.writer.writerow(dict(record, changes=';'.join(record.get('changes', ()))))
+        self.stream.flush()
+
+def build_ignore(args, *roots):
+    return load_ignore(*roots, patterns=args.exclude, use_ignore_files=not args.no_ignore_file)
+
+def report_ignored(ignore):
+    # Сводка о пропущенном идёт в stderr, чтобы не смешиваться с результатами
+    ignore.report()
+    if ignore.skipped_files or ignore.skipped_dirs:
+        print(f"folderwatcher: {ignore.summary()}", file=sys.stderr)
+
+def run_compare(args):
+    for path in (args.path1, args.path2):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"{path} does not exist")
+    ignore = build_ignore(args, args.path1, args.path2)
+    stream = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+    try:
+        writer = (CsvWriter if args.format == 'csv' else NdjsonWriter)(stream)
+        different = False
+        # Каждое различие выводится сразу, наборы результатов в памяти не копятся
+        if args.processes and args.recursive and os.path.isdir(args.path1) and os.path.isdir(args.path2):
+            # Поддеревья сравниваются в отдельных процессах, порядок вывода от этого не зависит
+            differences = iter_sharded_differences(args.path1, args.path2, args.mode, args.processes, args.algorithm,
+                                                   ignore=ignore, detect_moves=args.moves)
+        else:
+            differences = iter_differences(args.path1, args.path2, args.mode, recursive=args.recursive,
+                                           algorithm=args.algorithm, ignore=ignore, detect_moves=args.moves)
+        for difference in differences:
+            writer.write(difference_record(difference))
+            different = True
+    finally:
+        if stream is not sys.stdout:
+            stream.close()
+    report_ignored(ignore)
+    return EXIT_DIFFERENT if different else EXIT_IDENTICAL
+
+def run_snapshot(args):
+    ignore = build_ignore(args, args.directory)
+    print(create_snapshot(args.directory, args.ads, output=args.output, compression=args.compression,
+                          level=args.level, workers=args.workers, ignore=ignore))
+    report_ignored(ignore)
+    return EXIT_IDENTICAL
+
+def run_manifest(args):
+    ignore = build_ignore(args, args.directory)
+    print(write_manifest(args.directory, args.output, args.ads, hash_content=not args.no_hash, algorithm=args.algorithm,
+                         ignore=ignore))
+    report_ignored(ignore)
+    return EXIT_IDENTICAL
+
+def duplicate_record(group):
+    return {
+        'size': group.size,
+        'count': len(group.paths),
+        'reclaimable': reclaimable(group),
+        'hash': group.digest,
+        'paths': group.paths
+    }
+
+def run_duplicates(args):
+    for path in args.paths:
+        if not os.path.isdir(path):
+            raise FileNotFoundError(f"{path} is not a directory")
+    ignore = build_ignore(args, *args.paths)
+    stream = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+    groups = total = 0
+    try:
+        writer = NdjsonWriter(stream)
+        for group in iter_duplicates(args.paths, args.algorithm, verify=args.verify, min_size=args.min_size,
+                                     ignore=ignore):
+            writer.write(duplicate_record(group))
+            groups += 1
+            total += reclaimable(group)
+    finally:
+        if stream is not sys.stdout:
+            stream.close()
+    metrics.count('duplicate_groups', groups)
+    metrics.count('reclaimable_bytes', total)
+    report_ignored(ignore)
+    print(f"folderwatcher: {groups} duplicate groups, {total} bytes reclaimable", file=sys.stderr)
+    return EXIT_DIFFERENT if groups else EXIT_IDENTICAL
+
+def add_ignore_arguments(parser):
+    parser.add_argument('--exclude', '-x', action='append', default=[], metavar='PATTERN',
+                        help="gitignore-style pattern to skip, may be repeated; '!PATTERN' re-includes")
+    parser.add_argument('--no-ignore-file', action='store_true', help=f"do not read {IGNORE_FILE} from the roots")
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='folderwatcher', description="Compare directories, snapshots and manifests")
+    parser.add_argument('--metrics', action='store_true', help="print per-phase timings and counters to stderr as JSON")
+    parser.add_argument('--profile', metavar='FILE', help="run under cProfile and save the stats to FILE")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    compare_parser = commands.add_parser('compare', help="compare two directories, zip snapshots or manifests")
+    compare_parser.add_argument('path1')
+    compare_parser.add_argument('path2')
+    compare_parser.add_argument('--mode', choices=COMPARE_MODES, default=COMPARE_FULL)
+    compare_parser.add_argument('--algorithm', choices=ALGORITHM_CHOICES,
+                                help="hash algorithm for content comparison (default: sha256, or the one stored in a manifest)")
+    compare_parser.add_argument('--recursive', '-r', action='store_true', help="compare whole trees, not only the top level")
+    compare_parser.add_argument('--processes', '-j', type=int,
+                                help="split a recursive directory comparison into shards run in this many processes")
+    compare_parser.add_argument('--moves', action='store_true',
+                                help="report files and directories that were moved or renamed instead of only_in pairs")
+    compare_parser.add_argument('--format', choices=OUTPUT_FORMATS, default='ndjson')
+    compare_parser.add_argument('--output', '-o', help="write differences to a file instead of stdout")
+    add_ignore_arguments(compare_parser)
+    compare_parser.set_defaults(run=run_compare)
+
+    snapshot_parser = commands.add_parser('snapshot', help="write a zip snapshot of a directory")
+    snapshot_parser.add_argument('directory')
+    snapshot_parser.add_argument('output')
+    snapshot_parser.add_argument('--ads', action='store_true', help="include NTFS alternate data streams")
+    snapshot_parser.add_argument('--compression', choices=sorted(COMPRESSION_TYPES), default=DEFAULT_COMPRESSION)
+    snapshot_parser.add_argument('--level', type=int)
+    snapshot_parser.add_argument('--workers', type=int)
+    add_ignore_arguments(snapshot_parser)
+    snapshot_parser.set_defaults(run=run_snapshot)
+
+    manifest_parser = commands.add_parser('manifest', help="write a metadata manifest of a directory")
+    manifest_parser.add_argument('directory')
+    manifest_parser.add_argument('output')
+    manifest_parser.add_argument('--ads', action='store_true', help="record NTFS alternate data streams")
+    manifest_parser.add_argument('--algorithm', choices=ALGORITHM_CHOICES, default=ALGORITHM_CHOICES[0])
+    manifest_parser.add_argument('--no-hash', action='store_true', help="store metadata only, without content hashes")
+    add_ignore_arguments(manifest_parser)
+    manifest_parser.set_defaults(run=run_manifest)
+
+    duplicates_parser = commands.add_parser('duplicates', help="find files with identical content in one or more directories")
+    duplicates_parser.add_argument('paths', nargs='+', metavar='directory')
+    duplicates_parser.add_argument('--algorithm', choices=ALGORITHM_CHOICES, default=ALGORITHM_CHOICES[0])
+    duplicates_parser.add_argument('--min-size', type=int, default=1, help="skip files smaller than this many bytes")
+    duplicates_parser.add_argument('--verify', action='store_true', help="compare bytes of files with equal hashes (always on when 'fast' falls back to crc32)")
+    duplicates_parser.add_argument('--output', '-o', help="write duplicate groups to a file instead of stdout")
+    add_ignore_arguments(duplicates_parser)
+    duplicates_parser.set_defaults(run=run_duplicates)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(format='folderwatcher: %(message)s')
+    metrics.enable(args.metrics)
+    try:
+        with metrics.profiled(args.profile) if args.profile else metrics.NULL_PHASE:
+            return args.run(args)
+    except (OSError, ValueError) as e:
+        print(f"folderwatcher: {e}", file=sys.stderr)
+        return EXIT_ERROR
+    except KeyboardInterrupt:
+        return EXIT_ERROR
+    except Exception:
+        # Сбой (упавший процесс-обработчик, испорченный манифест) - тоже код ошибки,
+        # иначе с трассировкой выходит 1 и скрипт примет его за найденные различия
+        metrics.logger.exception("unexpected error")
+        return EXIT_ERROR
+    finally:
+        if args.metrics:
+            print(json.dumps(metrics.report(default_cache)), file=sys.stderr)
+
+if __name__ == "__main__":
+    sys.exit(main())
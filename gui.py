@@ -1,15 +1,22 @@
 import os
 import json
-import mimetypes
-import time
 import math
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-import tempfile
-from snapshot import create_snapshot, save_snapshot, load_snapshot
-from compare import compare_directories, get_file_attributes, calculate_file_hash
+from snapshot import create_snapshot
+from manifest import write_manifest, is_manifest, load_manifest_tree, MANIFEST_EXT
+from zipview import ZipSnapshot, is_snapshot_archive
+from compare import compare_directories, COMPARE_MODES, COMPARE_QUICK, COMPARE_SAMPLED, COMPARE_FULL
+from hasher import default_engine, resolve_algorithm, ALGORITHM_CHOICES
+from scanner import FileInfo
+from listing import build_listing, build_snapshot_listing, hash_listing, HashQueue, HASH_PLACEHOLDER
+from dirindex import DirSizeIndex
+from jobs import JobRunner
+from ignore import load_ignore
+import metrics
+from watcher import watch_directory
+from vtree import VirtualTreeview
 from about import about_fw
-from ads import list_ads_files
 
 class Window:
     def __init__(self, root):
@@ -24,6 +31,8 @@ class Window:
         self.create_widgets()
         self.create_menu()
         self.setup_traces()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.poll_jobs()
 
     def init_variables(self):
         self.use_ads = tk.BooleanVar(value=False)
@@ -32,12 +41,38 @@ class Window:
         self.show_attributes = tk.BooleanVar(value=True)
         self.show_last_modified = tk.BooleanVar(value=True)
         self.show_hash = tk.BooleanVar(value=False)
+        self.watch = tk.BooleanVar(value=False)
+        self.detect_moves = tk.BooleanVar(value=False)
+        # Сбор таймингов по фазам включается в меню, по умолчанию выключен
+        self.collect_metrics = tk.BooleanVar(value=False)
+        self.compare_mode = tk.StringVar(value=COMPARE_FULL)
+        self.compare_mode_labels = {
+            COMPARE_QUICK: "Size + Last Modified",
+            COMPARE_SAMPLED: "Sampled Content",
+            COMPARE_FULL: "Full Content"
+        }
+        self.hash_algorithm = tk.StringVar(value=ALGORITHM_CHOICES[0])
+        # Пока алгоритм не выбран явно, снимки сравниваются в своём: zip - по CRC, манифест - его хешами
+        self.algorithm_chosen = False
+        self.hash_algorithm_labels = {
+            'sha256': "SHA-256",
+            'blake2b': "BLAKE2b",
+            'fast': "Fast Hash"
+        }
         self.last_directory1 = tk.StringVar()
         self.last_directory2 = tk.StringVar()
         self.directory_label1 = tk.StringVar(value="Directory 1")
         self.directory_label2 = tk.StringVar(value="Directory 2")
         self.language = tk.StringVar(value="English")
         self.snapshot = None
+        self.hash_engine = default_engine
+        self.size_indexes = {}
+        self.pane_ignores = {}
+        self.snapshot_trees = {}
+        self.listings = {}
+        self.watched = {}
+        self.jobs = JobRunner()
+        self.status_text = tk.StringVar(value="")
         self.target_treeview = None
         self.translations = {}
         self.available_languages = self.load_available_languages()
@@ -67,69 +102,194 @@ class Window:
     def translate(self, text):
         return self.translations.get(text, text)
 
-    def create_snapshot_action(self, directory_var):
+    def create_snapshot_action(self, treeview, directory_var):
         if directory_var.get():
-            snapshot_zip = create_snapshot(directory_var.get(), self.use_ads.get())
             snapshot_file = filedialog.asksaveasfilename(
                 defaultextension=".zip",
-                filetypes=[("Zip files", "*.zip")]
+                filetypes=[("Zip files", "*.zip"), ("Manifest files", f"*{MANIFEST_EXT}")]
             )
             if snapshot_file:
-                save_snapshot(snapshot_zip, snapshot_file)
-                messagebox.showinfo("Snapshot Created", "Snapshot has been successfully created and saved.")
+                # Снимок занимает свою панель, как и остальные задачи
+                key = treeview
+                # Правила из .folderwatcherignore в корне каталога
+                ignore = load_ignore(directory_var.get())
+                on_done = lambda result: (ignore.report(), messagebox.showinfo("Snapshot Created", "Snapshot has been successfully created and saved."))
+                if snapshot_file.endswith(MANIFEST_EXT):
+                    # По умолчанию манифест хранит только метаданные; хеши содержимого - по явному согласию
+                    hash_content = messagebox.askyesno(
+                        self.translate("Manifest"),
+                        self.translate("Store content hashes in the manifest? This reads every file."),
+                        default=messagebox.NO
+                    )
+                    self.start_job(key, write_manifest, directory_var.get(), snapshot_file, self.use_ads.get(),
+                                   hash_content, algorithm=self.selected_algorithm(), ignore=ignore, on_done=on_done)
+                else:
+                    self.start_job(key, create_snapshot, directory_var.get(), self.use_ads.get(), output=snapshot_file,
+                                   ignore=ignore, on_done=on_done)
         else:
             messagebox.showerror(self.translate("No Directory Selected"), self.translate("Please select a directory first."))
 
     def load_snapshot_action(self, target_treeview):
         snapshot_file = filedialog.askopenfilename(
-            filetypes=[("Zip files", "*.zip")]
+            filetypes=[("Zip files", "*.zip"), ("Manifest files", f"*{MANIFEST_EXT} *{MANIFEST_EXT}.gz")]
         )
         if snapshot_file:
-            target_directory = tempfile.mkdtemp()
-            load_snapshot(snapshot_file, target_directory)
-            self.list_files(target_treeview, target_directory)
-            
+            self.list_files(target_treeview, snapshot_file)
+
             if target_treeview == self.file_tree1:
-                self.last_directory1.set(target_directory)
+                self.last_directory1.set(snapshot_file)
             elif target_treeview == self.file_tree2:
-                self.last_directory2.set(target_directory)
-
-    def update_comparison_results(self, only_in1_files, only_in2_files, modified_files, only_in1_dirs, only_in2_dirs, size_diff_dirs):
-        self.list_files(self.file_tree1, self.last_directory1.get())
-        for child in self.file_tree1.get_children():
-            item = self.file_tree1.item(child)
-            filename = item['values'][0]
-            self.apply_cell_tags(self.file_tree1, child, filename, modified_files, is_first_tree=True)
-            
-        self.list_files(self.file_tree2, self.last_directory2.get())
-        for child in self.file_tree2.get_children():
-            item = self.file_tree2.item(child)
-            filename = item['values'][0]
-            self.apply_cell_tags(self.file_tree2, child, filename, modified_files, is_first_tree=False)
-
-        self.define_cell_tags(self.file_tree1)
-        self.define_cell_tags(self.file_tree2)
-
-    def apply_cell_tags(self, treeview, item_id, filename, modified_files, is_first_tree):
-        if filename in modified_files:
-            file_info = modified_files[filename]
-            values = list(treeview.item(item_id)['values'])
-            
-            for i, col in enumerate(treeview['columns']):
-                if col == self.translate("Size") and file_info['size']:
-                    values[i] = f'**{values[i]}**'
-                    treeview.tag_configure('size_modified', background='lightgreen')
-                if col == self.translate("Attributes") and file_info['attributes']:
-                    values[i] = f'**{values[i]}**'
-                    treeview.tag_configure('attributes_modified', background='lightblue')
-                if col == self.translate("Last Modified") and file_info['last_modified']:
-                    values[i] = f'**{values[i]}**'
-                    treeview.tag_configure('last_modified', background='lightpink')
-                if col == self.translate("Hash") and file_info['hash']:
-                    values[i] = f'**{values[i]}**'
-                    treeview.tag_configure('hash_modified', background='lightyellow')
-
-            treeview.item(item_id, values=values, tags='highlighted')
+                self.last_directory2.set(snapshot_file)
+            self.update_watches()
+
+    def get_snapshot_tree(self, treeview, snapshot_file):
+        path, tree = self.snapshot_trees.get(treeview, (None, None))
+        if path != snapshot_file:
+            self.close_snapshot(treeview)
+            if is_manifest(snapshot_file):
+                tree = load_manifest_tree(snapshot_file)[1]
+            else:
+                tree = ZipSnapshot(snapshot_file, self.hash_engine).tree
+            self.snapshot_trees[treeview] = (snapshot_file, tree)
+        return tree
+
+    def close_snapshot(self, treeview):
+        path, tree = self.snapshot_trees.pop(treeview, (None, None))
+        if tree is not None and isinstance(tree.source, ZipSnapshot):
+            tree.source.close()
+
+    def start_job(self, keys, target, *args, on_done=None, measure=False, **kwargs):
+        if self.jobs.is_busy(*(keys if isinstance(keys, list) else [keys])):
+            messagebox.showinfo(self.translate("Busy"), self.translate("Please wait for the current operation to finish or cancel it."))
+            return None
+
+        def done(result):
+            if on_done:
+                on_done(result)
+            # В строке состояния - итог по фазам: где ушло время, сколько прочитано, попадания в кеш
+            if measure and self.collect_metrics.get():
+                summary = metrics.format_summary(metrics.report(self.hash_engine.cache))
+                self.status_text.set(f"{self.translate('Done')}: {summary}")
+            else:
+                self.status_text.set(self.translate('Done'))
+
+        # Счётчики общие для процесса: сбрасывает их только сравнение, запущенное пользователем,
+        # иначе обнулились бы цифры фоновых задач хеширования и наблюдения
+        if measure:
+            metrics.reset()
+        self.status_text.set(self.translate("Working..."))
+        self.cancel_btn.config(state=tk.NORMAL)
+        return self.jobs.start(
+            keys, target, *args, on_done=done, on_error=self.on_job_error,
+            on_progress=self.on_job_progress, on_cancel=lambda: self.status_text.set(self.translate("Cancelled")), **kwargs)
+
+    def poll_jobs(self):
+        self.jobs.poll()
+        if not any(not self.is_watch_key(key) for key in self.jobs.jobs):
+            self.cancel_btn.config(state=tk.DISABLED)
+        self.root.after(100, self.poll_jobs)
+
+    def cancel_jobs(self):
+        # Наблюдение за каталогами отключается своим флажком, а не кнопкой отмены
+        self.jobs.cancel(*[key for key in self.jobs.jobs if not self.is_watch_key(key)])
+        self.status_text.set(self.translate("Cancelling..."))
+
+    def is_watch_key(self, key):
+        return isinstance(key, tuple) and key[0] == 'watch'
+
+    def update_watches(self):
+        for treeview, directory in ((self.file_tree1, self.last_directory1), (self.file_tree2, self.last_directory2)):
+            directory = directory.get()
+            key = ('watch', treeview)
+            wanted = self.watch.get() and os.path.isdir(directory)
+            if self.watched.get(treeview) == directory and wanted:
+                continue
+            if treeview in self.watched:
+                self.jobs.cancel(key)
+                del self.watched[treeview]
+            if wanted:
+                self.start_watch(treeview, directory)
+
+    def start_watch(self, treeview, directory):
+        key = ('watch', treeview)
+        if self.jobs.is_busy(key):
+            # Прежнее наблюдение ещё не остановилось
+            self.root.after(100, self.update_watches)
+            return
+        self.watched[treeview] = directory
+        self.jobs.start(
+            key, watch_directory, directory,
+            on_result=lambda dirs: self.on_watch_changes(treeview, directory, dirs),
+            on_error=self.on_job_error)
+
+    def on_watch_changes(self, treeview, directory, dirs):
+        listing = self.listings.get(treeview)
+        index = self.size_indexes.get(treeview)
+        if listing is None or index is None or listing.directory != directory:
+            return
+        root = os.path.normpath(directory)
+        # Сначала глубокие каталоги, затем их родители
+        for path in sorted(dirs, key=len, reverse=True):
+            index.refresh_entries(path)
+
+        if root in dirs:
+            # Изменилось содержимое самой панели -> перечитываем один уровень, остальное из индекса
+            new_listing = build_listing(directory, index, listing.use_ads, self.get_pane_ignore(treeview, directory))
+            new_listing.carry_over(listing)
+            self.stop_hashing(treeview)
+            self.listings[treeview] = new_listing
+            self.render_listing(treeview, keep_position=True)
+            return
+        for i, entry in enumerate(listing.entries):
+            if entry.kind == "Folder":
+                size = index.size(entry.item.path)
+                if size != entry.size:
+                    entry.size = size
+                    values, tags = self.file_row(entry, None, listing.modified_files, listing.moved_files)
+                    treeview.update_row(i, values, tags)
+
+    def on_job_error(self, error):
+        self.status_text.set(self.translate("Error"))
+        messagebox.showerror(self.translate("Error"), str(error))
+
+    def on_job_progress(self, progress):
+        text = f"{self.translate('Files')}: {progress['files_done']}"
+        if progress['total_files']:
+            text += f"/{progress['total_files']}"
+        text += f"  {self.get_formated_size(progress['bytes_done'])}"
+        if progress['total_bytes']:
+            text += f"/{self.get_formated_size(progress['total_bytes'])}"
+        if progress['eta'] is not None:
+            text += f"  {self.translate('ETA')}: {int(progress['eta'])} s"
+        if progress['current_path']:
+            text += f"  {progress['current_path']}"
+        self.status_text.set(text)
+
+    def on_close(self):
+        self.jobs.cancel_all()
+        self.root.destroy()
+
+    def update_comparison_results(self, only_in1_files, only_in2_files, modified_files, only_in1_dirs, only_in2_dirs, size_diff_dirs,
+                                  moved=None):
+        # Подсветка применяется сразу при построении строк, без второго прохода по Treeview.
+        # Перемещённые: в левой панели "имя → новый путь", в правой "имя ← прежний путь"
+        moved = moved or {}
+        self.list_files(self.file_tree1, self.last_directory1.get(), modified_files,
+                        {old: f"\u2192 {new}" for new, old in moved.items()})
+        self.list_files(self.file_tree2, self.last_directory2.get(), modified_files,
+                        {new: f"\u2190 {old}" for new, old in moved.items()})
+
+    def apply_cell_tags(self, values, file_info):
+        columns = (
+            (1, 'size'),
+            (3, 'attributes'),
+            (4, 'last_modified'),
+            (5, 'hash')
+        )
+        for i, key in columns:
+            if file_info[key]:
+                values[i] = f'**{values[i]}**'
+        return values
 
     def define_cell_tags(self, treeview):
         treeview.tag_configure('highlighted', background='lightgreen')
@@ -137,6 +297,7 @@ class Window:
         treeview.tag_configure('attributes_modified', background='lightblue')
         treeview.tag_configure('last_modified', background='lightpink')
         treeview.tag_configure('hash_modified', background='lightyellow')
+        treeview.tag_configure('moved', background='lavender')
 
     def get_tags(self, filename, primary_files, secondary_files, modified_files):
         tags = ()
@@ -170,6 +331,11 @@ class Window:
         for lang in self.available_languages.keys():
             language_menu.add_command(label=lang, command=lambda l=lang: self.update_language(l))
 
+        options_menu = tk.Menu(menubar, tearoff=0)
+        options_menu.add_checkbutton(label=self.translate("Show Timings"), variable=self.collect_metrics,
+                                     command=lambda: metrics.enable(self.collect_metrics.get()))
+        menubar.add_cascade(label=self.translate("Options"), menu=options_menu)
+
     def btn_about_fw(self):
         about_fw(self.root, self.language, self.translations)
 
@@ -194,13 +360,21 @@ class Window:
         self.compare_btn = ttk.Button(self.root, text=self.translate("Compare"), command=self.btn1_click, style='Custom.TButton', takefocus=0)
         self.compare_btn.grid(row=3, column=1, columnspan=2, sticky='ew', padx=5, pady=(5, 0))
 
+        status_frame = tk.Frame(self.root, background='white')
+        status_frame.grid(row=4, column=1, columnspan=2, sticky='ew', padx=5, pady=5)
+        status_frame.grid_columnconfigure(0, weight=1)
+        self.status_label = ttk.Label(status_frame, textvariable=self.status_text, anchor='w')
+        self.status_label.grid(row=0, column=0, sticky='ew')
+        self.cancel_btn = ttk.Button(status_frame, text=self.translate("Cancel"), command=self.cancel_jobs, state=tk.DISABLED, takefocus=0)
+        self.cancel_btn.grid(row=0, column=1)
+
     def create_directory_widgets(self):
         frame1 = ttk.Frame(self.root)
         frame1.grid(row=0, column=1, sticky='ew', padx=5, pady=5)
         frame1.grid_columnconfigure(0, weight=1)
         snapshot_frame1 = tk.Frame(frame1, bg='white')
         snapshot_frame1.grid(row=0, column=0, columnspan=2, sticky='ew')
-        self.create_snapshot_btn1 = ttk.Button(snapshot_frame1, text=self.translate("Create Snapshot"), command=lambda: self.create_snapshot_action(self.last_directory1), style='Custom.TButton', takefocus=0)
+        self.create_snapshot_btn1 = ttk.Button(snapshot_frame1, text=self.translate("Create Snapshot"), command=lambda: self.create_snapshot_action(self.file_tree1, self.last_directory1), style='Custom.TButton', takefocus=0)
         self.create_snapshot_btn1.grid(row=0, column=0, sticky='ew', padx=5)
         self.load_snapshot_btn1 = ttk.Button(snapshot_frame1, text=self.translate("Load Snapshot"), command=lambda: self.load_snapshot_action(self.file_tree1), style='Custom.TButton', takefocus=0)
         self.load_snapshot_btn1.grid(row=0, column=1, sticky='ew', padx=5)
@@ -215,7 +389,7 @@ class Window:
         frame2.grid_columnconfigure(0, weight=1)
         snapshot_frame2 = tk.Frame(frame2, bg='white')
         snapshot_frame2.grid(row=0, column=0, columnspan=2, sticky='ew')
-        self.create_snapshot_btn2 = ttk.Button(snapshot_frame2, text=self.translate("Create Snapshot"), command=lambda: self.create_snapshot_action(self.last_directory2), style='Custom.TButton', takefocus=0)
+        self.create_snapshot_btn2 = ttk.Button(snapshot_frame2, text=self.translate("Create Snapshot"), command=lambda: self.create_snapshot_action(self.file_tree2, self.last_directory2), style='Custom.TButton', takefocus=0)
         self.create_snapshot_btn2.grid(row=0, column=0, sticky='ew', padx=5)
         self.load_snapshot_btn2 = ttk.Button(snapshot_frame2, text=self.translate("Load Snapshot"), command=lambda: self.load_snapshot_action(self.file_tree2), style='Custom.TButton', takefocus=0)
         self.load_snapshot_btn2.grid(row=0, column=1, sticky='ew', padx=5)
@@ -244,9 +418,53 @@ class Window:
         self.ads_check = tk.Checkbutton(checkbox_frame, text=self.translate("Ads"), variable=self.use_ads, background='white', takefocus=0)
         self.ads_check.pack(side=tk.LEFT, padx=5)
 
+        self.watch_check = tk.Checkbutton(checkbox_frame, text=self.translate("Watch"), variable=self.watch, background='white', takefocus=0)
+        self.watch_check.pack(side=tk.LEFT, padx=5)
+
+        self.moves_check = tk.Checkbutton(checkbox_frame, text=self.translate("Detect Moves"), variable=self.detect_moves, background='white', takefocus=0)
+        self.moves_check.pack(side=tk.LEFT, padx=5)
+
+        self.compare_mode_box = ttk.Combobox(checkbox_frame, state='readonly', width=18, takefocus=0)
+        self.compare_mode_box.bind('<<ComboboxSelected>>', lambda event: self.compare_mode.set(COMPARE_MODES[self.compare_mode_box.current()]))
+        self.update_compare_mode_box()
+        self.compare_mode_box.pack(side=tk.LEFT, padx=5)
+
+        self.hash_algorithm_box = ttk.Combobox(checkbox_frame, state='readonly', width=10, takefocus=0)
+        self.hash_algorithm_box.bind('<<ComboboxSelected>>', lambda event: self.choose_hash_algorithm(ALGORITHM_CHOICES[self.hash_algorithm_box.current()]))
+        self.update_hash_algorithm_box()
+        self.hash_algorithm_box.pack(side=tk.LEFT, padx=5)
+
+    def update_compare_mode_box(self):
+        self.compare_mode_box['values'] = [self.translate(self.compare_mode_labels[mode]) for mode in COMPARE_MODES]
+        self.compare_mode_box.current(COMPARE_MODES.index(self.compare_mode.get()))
+
+    def update_hash_algorithm_box(self):
+        self.hash_algorithm_box['values'] = [self.translate(self.hash_algorithm_labels[name]) for name in ALGORITHM_CHOICES]
+        self.hash_algorithm_box.current(ALGORITHM_CHOICES.index(self.hash_algorithm.get()))
+
+    def choose_hash_algorithm(self, algorithm):
+        self.algorithm_chosen = True
+        self.hash_algorithm.set(algorithm)
+
+    def selected_algorithm(self):
+        return resolve_algorithm(self.hash_algorithm.get()) if self.algorithm_chosen else None
+
+    def listing_algorithm(self, listing):
+        algorithm = self.selected_algorithm()
+        if algorithm is None and listing.source is not None:
+            algorithm = listing.source.native_algorithm
+        return algorithm or resolve_algorithm(self.hash_algorithm.get())
+
+    def change_hash_algorithm(self):
+        # Хеши другого алгоритма несравнимы -> колонку пересчитываем заново
+        for treeview, listing in self.listings.items():
+            self.stop_hashing(treeview)
+            listing.set_algorithm(self.listing_algorithm(listing))
+        self.render_listings()
+
     def update_directory(self, treeview, directory):
-        if os.path.isdir(directory):
-            self.list_files(treeview, directory)
+        if os.path.isdir(directory) or is_manifest(directory) or is_snapshot_archive(directory):
+            self.load_directory(treeview, directory)
         else:
             messagebox.showerror(self.translate("Error"), self.translate("Invalid directory path"))
 
@@ -259,8 +477,12 @@ class Window:
             self.translate("Last Modified"),
             self.translate("Hash")
         ]
-        self.file_tree1 = ttk.Treeview(self.root, columns=self.columns, show="headings")
-        self.file_tree2 = ttk.Treeview(self.root, columns=self.columns, show="headings")
+        self.file_tree1 = VirtualTreeview(self.root, columns=self.columns, show="headings")
+        self.file_tree2 = VirtualTreeview(self.root, columns=self.columns, show="headings")
+        self.define_cell_tags(self.file_tree1)
+        self.define_cell_tags(self.file_tree2)
+        self.file_tree1.on_view_change = lambda: self.prioritize_visible(self.file_tree1)
+        self.file_tree2.on_view_change = lambda: self.prioritize_visible(self.file_tree2)
         self.update_column_visibility()
         self.file_tree1.grid(row=2, column=1, sticky='nsew', padx=5, pady=5)
         self.file_tree2.grid(row=2, column=2, sticky='nsew', padx=5, pady=5)
@@ -273,34 +495,152 @@ class Window:
         if directory:
             if is_first:
                 self.last_directory1.set(directory)
-                self.list_files(self.file_tree1, directory)
+                self.load_directory(self.file_tree1, directory)
             else:
                 self.last_directory2.set(directory)
-                self.list_files(self.file_tree2, directory)
+                self.load_directory(self.file_tree2, directory)
+
+    def load_directory(self, treeview, directory):
+        self.invalidate_size_index(treeview)
+        self.invalidate_listing(treeview)
+        # Правила перечитываются при каждой загрузке каталога в панель
+        self.pane_ignores.pop(treeview, None)
+        if not os.path.isdir(directory):
+            self.list_files(treeview, directory)
+            return
 
-    def list_files(self, treeview, directory):
-        treeview.delete(*treeview.get_children())
-        if directory:
-            for item in os.scandir(directory):
-                if self.use_ads.get() and not item.is_dir():
-                    ads_files = list_ads_files(item.path)
-                    for ads_file, size in ads_files:
-                        self.insert_file_item(treeview, ads_file, size, "ADS")
-                if item.is_dir():
-                    folder_size = self.calculate_folder_size(item.path)
-                    self.insert_file_item(treeview, item, folder_size, "Folder")
+        # Размеры каталогов считаются в фоне, список выводим по готовности индекса
+        def done(index):
+            self.size_indexes[treeview] = index
+            self.list_files(treeview, directory)
+            self.update_watches()
+
+        self.start_job(treeview, DirSizeIndex, directory, ignore=self.get_pane_ignore(treeview, directory), on_done=done)
+
+    def list_files(self, treeview, directory, modified_files=None, moved_files=None):
+        if not directory:
+            self.invalidate_listing(treeview)
+            treeview.clear()
+            return
+        listing = self.get_listing(treeview, directory)
+        if modified_files is not None:
+            listing.modified_files = modified_files
+        if moved_files is not None:
+            listing.moved_files = moved_files
+        self.render_listing(treeview)
+
+    def get_listing(self, treeview, directory):
+        listing = self.listings.get(treeview)
+        if listing is None or not listing.is_current(directory, self.use_ads.get()):
+            with metrics.phase('listing'):
+                if is_manifest(directory) or is_snapshot_archive(directory):
+                    listing = build_snapshot_listing(directory, self.get_snapshot_tree(treeview, directory), self.use_ads.get())
                 else:
-                    file_size = os.path.getsize(item.path)
-                    self.insert_file_item(treeview, item, file_size, "File")
-
-    def calculate_folder_size(self, folder):
-        total_size = 0
-        for dirpath, dirnames, filenames in os.walk(folder):
-            for f in filenames:
-                fp = os.path.join(dirpath, f)
-                if not os.path.islink(fp):
-                    total_size += os.path.getsize(fp)
-        return total_size
+                    self.close_snapshot(treeview)
+                    listing = build_listing(directory, self.get_size_index(treeview, directory), self.use_ads.get(),
+                                            self.get_pane_ignore(treeview, directory))
+            listing.set_algorithm(self.listing_algorithm(listing))
+            self.stop_hashing(treeview)
+            self.listings[treeview] = listing
+        return listing
+
+    def invalidate_listing(self, treeview):
+        self.stop_hashing(treeview)
+        self.listings.pop(treeview, None)
+
+    def render_listing(self, treeview, keep_position=False):
+        listing = self.listings.get(treeview)
+        if listing is None:
+            treeview.clear()
+            return
+        show_hash = self.show_hash.get()
+        placeholder = HASH_PLACEHOLDER if show_hash else None
+        with metrics.phase('render'):
+            treeview.set_rows([
+                self.file_row(entry, listing.hashes.get(entry.item.path, placeholder) if entry.kind == "File" else None,
+                              listing.modified_files, listing.moved_files)
+                for entry in listing.entries
+            ], keep_position)
+        # Хеши считаются только при видимой колонке, в фоне и начиная с видимых строк
+        if show_hash:
+            self.start_hashing(treeview, listing)
+        else:
+            self.stop_hashing(treeview)
+
+    def start_hashing(self, treeview, listing):
+        key = ('hash', treeview)
+        if listing.hash_queue is not None:
+            self.prioritize_visible(treeview)
+            return
+        if self.jobs.is_busy(key):
+            # Предыдущая задача ещё завершается после отмены -> повторим позже
+            self.root.after(100, lambda: self.listings.get(treeview) is listing and self.show_hash.get()
+                            and self.start_hashing(treeview, listing))
+            return
+        missing = listing.missing_hashes()
+        if not missing:
+            return
+
+        def finished(*args):
+            if listing.hash_queue is queue:
+                listing.hash_queue = None
+
+        # Результаты, пришедшие после смены алгоритма, отбрасываются
+        algorithm = listing.algorithm
+        queue = listing.hash_queue = HashQueue(missing)
+        self.prioritize_visible(treeview)
+        self.cancel_btn.config(state=tk.NORMAL)
+        self.jobs.start(
+            key, hash_listing, listing, queue, self.hash_engine,
+            on_result=lambda batch: listing.algorithm == algorithm and self.on_hashes(treeview, listing, batch),
+            on_done=finished, on_error=finished, on_cancel=finished)
+
+    def stop_hashing(self, treeview):
+        listing = self.listings.get(treeview)
+        if listing is not None:
+            listing.hash_queue = None
+        self.jobs.cancel(('hash', treeview))
+
+    def prioritize_visible(self, treeview):
+        listing = self.listings.get(treeview)
+        if listing is None or listing.hash_queue is None:
+            return
+        start, end = treeview.visible_range()
+        listing.hash_queue.prioritize([
+            entry.item.path for entry in listing.entries[start:end] if entry.kind == "File"
+        ])
+
+    def on_hashes(self, treeview, listing, batch):
+        listing.hashes.update(batch)
+        if self.listings.get(treeview) is not listing:
+            return
+        for path, digest in batch:
+            index = listing.rows[path]
+            values, tags = self.file_row(listing.entries[index], digest, listing.modified_files, listing.moved_files)
+            treeview.update_row(index, values, tags)
+
+    def render_listings(self):
+        for treeview, directory in ((self.file_tree1, self.last_directory1), (self.file_tree2, self.last_directory2)):
+            if directory.get():
+                self.list_files(treeview, directory.get())
+
+    def get_size_index(self, treeview, directory):
+        index = self.size_indexes.get(treeview)
+        if index is None or index.root != os.path.normpath(directory):
+            index = self.size_indexes[treeview] = DirSizeIndex(directory, ignore=self.get_pane_ignore(treeview, directory))
+        return index
+
+    def get_pane_ignore(self, treeview, directory):
+        # Размеры каталогов в панели считаются с правилами её корня, один раз на каталог
+        directory = os.path.normpath(directory)
+        root, ignore = self.pane_ignores.get(treeview, (None, None))
+        if root != directory:
+            ignore = load_ignore(directory)
+            self.pane_ignores[treeview] = (directory, ignore)
+        return ignore
+
+    def invalidate_size_index(self, treeview):
+        self.size_indexes.pop(treeview, None)
 
     def get_formated_size(self, size):
         if size == 0:
@@ -313,20 +653,20 @@ class Window:
         
         return f'{formatted_size} {size_name[i]}'
 
-    def insert_file_item(self, treeview, item, item_size=None, item_type=""):
-        if isinstance(item, os.DirEntry):
+    def file_row(self, entry, file_hash=None, modified_files=None, moved_files=None):
+        item, item_size, item_type = entry.item, entry.size, entry.kind
+        if isinstance(item, FileInfo):
             display_text = item.name
             item_path = item.path
-            if item.is_dir():
+            if item.is_dir:
                 size_text = self.get_formated_size(item_size) if item_size is not None else ""
                 type_text = self.translate("Folder")
             else:
                 size_text = self.get_formated_size(item_size) if item_size is not None else ""
-                mime_type, _ = mimetypes.guess_type(item_path)
-                type_text = self.get_file_description(mime_type)
-            attributes_text = get_file_attributes(item_path)
-            last_modified_text = self.get_last_modified(item_path)
-            hash_text = calculate_file_hash(item_path) if self.show_hash else ""
+                type_text = self.get_file_description(entry.mime_type)
+            attributes_text = item.attributes_text()
+            last_modified_text = item.last_modified_text()
+            hash_text = file_hash or ""
         else:
             full_path = item
             if ':' in full_path:
@@ -343,7 +683,13 @@ class Window:
         tags = ()
         if 'ADS' in item_type:
             tags = ('ads_file_pre',)
-        treeview.insert("", 'end', values=values, tags=tags)
+        elif modified_files and display_text in modified_files:
+            values = self.apply_cell_tags(values, modified_files[display_text])
+            tags = ('highlighted',)
+        elif moved_files and display_text in moved_files:
+            values[0] = f"{display_text} {moved_files[display_text]}"
+            tags = ('moved',)
+        return values, tags
 
     def get_file_description(self, mime_type):
         descriptions = {
@@ -366,11 +712,6 @@ class Window:
                 return value
         return self.translate("Unknown")
 
-    def get_last_modified(self, path):
-        last_modified_timestamp = os.path.getmtime(path)
-        last_modified_time = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(last_modified_timestamp))
-        return last_modified_time
-
     def update_column_visibility(self):
         columns_to_display = [self.translate("File Name")]
 
@@ -399,25 +740,26 @@ class Window:
                     try:
                         tree.column(col, width=0, minwidth=0, stretch=tk.NO)
                     except tk.TclError as e:
-                        print(f"Error hiding column {col}: {e}")
-
-            if tree == self.file_tree1 and self.last_directory1.get():
-                self.list_files(self.file_tree1, self.last_directory1.get())
-            elif tree == self.file_tree2 and self.last_directory2.get():
-                self.list_files(self.file_tree2, self.last_directory2.get())
+                        metrics.error('gui', "Error hiding column %s: %s", col, e)
 
     def setup_traces(self):
         self.show_size.trace_add('write', lambda *args: self.update_column_visibility())
         self.show_type.trace_add('write', lambda *args: self.update_column_visibility())
         self.show_attributes.trace_add('write', lambda *args: self.update_column_visibility())
         self.show_last_modified.trace_add('write', lambda *args: self.update_column_visibility())
-        self.show_hash.trace_add('write', lambda *args: self.update_column_visibility())
+        self.show_hash.trace_add('write', lambda *args: (self.update_column_visibility(), self.render_listings()))
         self.language.trace_add('write', lambda *args: self.update_display())
         self.use_ads.trace_add('write', lambda *args: self.update_display())
+        self.watch.trace_add('write', lambda *args: self.update_watches())
+        self.hash_algorithm.trace_add('write', lambda *args: self.change_hash_algorithm())
 
     def update_display(self):
         self.compare_btn.config(text=self.translate("Compare"))
         self.ads_check.config(text=self.translate("Ads"))
+        self.watch_check.config(text=self.translate("Watch"))
+        self.moves_check.config(text=self.translate("Detect Moves"))
+        self.update_compare_mode_box()
+        self.update_hash_algorithm_box()
         self.create_snapshot_btn1.config(text=self.translate("Create Snapshot"))
         self.load_snapshot_btn1.config(text=self.translate("Load Snapshot"))
         self.create_snapshot_btn2.config(text=self.translate("Create Snapshot"))
@@ -427,15 +769,44 @@ class Window:
         self.show_attributes_btn.config(text=self.translate("Show Attributes"))
         self.show_last_modified_btn.config(text=self.translate("Show Last Modified"))
         self.show_hash_btn.config(text=self.translate("Show Hash"))
+        self.cancel_btn.config(text=self.translate("Cancel"))
 
         self.create_menu()
         self.update_column_visibility()
+        self.render_listings()
 
     def btn1_click(self):
         if self.last_directory1.get() or self.last_directory2.get():
-            size_diff_files, only_in1_files, only_in2_files, only_in1_dirs, only_in2_dirs, size_diff_dirs = compare_directories(
-                self.last_directory1.get(), self.last_directory2.get())
-            self.update_comparison_results(only_in1_files, only_in2_files, size_diff_files, only_in1_dirs, only_in2_dirs, size_diff_dirs)
+            dir1, dir2 = self.last_directory1.get(), self.last_directory2.get()
+            # Tk читается только в главном потоке: настройки берём до запуска задачи
+            mode = self.compare_mode.get()
+            detect_moves = self.detect_moves.get()
+            algorithm = self.selected_algorithm()
+            ignore = load_ignore(dir1, dir2)
+
+            def run(progress):
+                # Индексы пересобираются в фоновом потоке, чтобы учесть изменения на диске
+                index1 = DirSizeIndex(dir1, progress, ignore) if os.path.isdir(dir1) else None
+                index2 = DirSizeIndex(dir2, progress, ignore) if os.path.isdir(dir2) else None
+                result = compare_directories(dir1, dir2, mode, self.hash_engine,
+                                             index1=index1, index2=index2, progress=progress, algorithm=algorithm,
+                                             ignore=ignore, detect_moves=detect_moves)
+                ignore.report()
+                return index1, index2, result
+
+            def done(result):
+                index1, index2, differences = result
+                size_diff_files, only_in1_files, only_in2_files, only_in1_dirs, only_in2_dirs, size_diff_dirs = differences[:6]
+                moved = differences[6] if detect_moves else None
+                for treeview, index in ((self.file_tree1, index1), (self.file_tree2, index2)):
+                    # Свежий индекс сравнения заменяет индекс панели, только если правила те же
+                    if index is not None and ignore.patterns == self.get_pane_ignore(treeview, index.root).patterns:
+                        self.size_indexes[treeview] = index
+                    self.invalidate_listing(treeview)
+                self.update_comparison_results(only_in1_files, only_in2_files, size_diff_files, only_in1_dirs, only_in2_dirs, size_diff_dirs,
+                                               moved)
+
+            self.start_job([self.file_tree1, self.file_tree2], run, on_done=done, measure=True)
         else:
             messagebox.showinfo(self.translate("Error"), self.translate("At least one directory must be selected before comparing"))
 
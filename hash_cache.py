@@ -0,0 +1,161 @@
+import os
+import time
+import atexit
+import sqlite3
+import threading
+import metrics
+from contextlib import contextmanager
+
+MAX_ENTRIES = 1000000
+# Файлы, изменённые только что, не кешируем: mtime может не успеть измениться при повторной записи
+MIN_AGE_NS = 2 * 10**9
+# Отметки last_used при попаданиях копятся в памяти и пишутся одной транзакцией
+TOUCH_BATCH = 1000
+
+def default_cache_path():
+    base = os.environ.get('LOCALAPPDATA') or os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'FolderWatcher', 'hashes.db')
+
+class HashCache:
+    def __init__(self, path=None, max_entries=MAX_ENTRIES):
+        self.path = path or default_cache_path()
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._puts = 0
+        self._lock = threading.Lock()
+        self._pool = []
+        self._touched = {}
+        atexit.register(self.flush)
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS hashes ('
+            'dev INTEGER, ino INTEGER, algorithm TEXT, size INTEGER, mtime_ns INTEGER, '
+            'digest TEXT, last_used INTEGER, PRIMARY KEY (dev, ino, algorithm))'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS hashes_last_used ON hashes (last_used)')
+        conn.commit()
+        return conn
+
+    @contextmanager
+    def _connection(self):
+        with self._lock:
+            conn = self._pool.pop() if self._pool else None
+        if conn is None:
+            conn = self._connect()
+        try:
+            yield conn
+        finally:
+            with self._lock:
+                self._pool.append(conn)
+
+    def get(self, st, algorithm):
+        if not st.st_ino:
+            return None
+        try:
+            with self._connection() as conn:
+                row = conn.execute(
+                    'SELECT digest FROM hashes WHERE dev=? AND ino=? AND algorithm=? AND size=? AND mtime_ns=?',
+                    (st.st_dev, st.st_ino, algorithm, st.st_size, st.st_mtime_ns)
+                ).fetchone()
+        except (sqlite3.Error, OSError) as e:
+            metrics.error('cache', "Error reading hash cache: %s", e)
+            with self._lock:
+                self.errors += 1
+            return None
+        with self._lock:
+            if row:
+                self.hits += 1
+                # Попадание - только чтение; время использования попадёт в базу пачкой
+                self._touched[st.st_dev, st.st_ino, algorithm] = time.time_ns()
+                flush = len(self._touched) >= TOUCH_BATCH
+            else:
+                self.misses += 1
+                flush = False
+        if flush:
+            self.flush()
+        return row[0] if row else None
+
+    def flush(self):
+        with self._lock:
+            touched, self._touched = self._touched, {}
+        if not touched:
+            return
+        try:
+            with self._connection() as conn:
+                conn.executemany(
+                    'UPDATE hashes SET last_used=? WHERE dev=? AND ino=? AND algorithm=?',
+                    [(last_used, dev, ino, algorithm) for (dev, ino, algorithm), last_used in touched.items()]
+                )
+                conn.commit()
+        except (sqlite3.Error, OSError) as e:
+            metrics.error('cache', "Error writing hash cache: %s", e)
+            with self._lock:
+                self.errors += 1
+
+    def put(self, st, algorithm, digest):
+        now = time.time_ns()
+        if not st.st_ino or digest is None or now - st.st_mtime_ns < MIN_AGE_NS:
+            return
+        try:
+            with self._connection() as conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (st.st_dev, st.st_ino, algorithm, st.st_size, st.st_mtime_ns, digest, now)
+                )
+                conn.commit()
+            with self._lock:
+                self._puts += 1
+                evict = self._puts % 1000 == 0
+            if evict:
+                self.evict()
+        except (sqlite3.Error, OSError) as e:
+            metrics.error('cache', "Error writing hash cache: %s", e)
+            with self._lock:
+                self.errors += 1
+
+    def evict(self):
+        # Перед вытеснением сбрасываем отметки, иначе уйдут недавно использованные записи
+        self.flush()
+        with self._connection() as conn:
+            count = conn.execute('SELECT COUNT(*) FROM hashes').fetchone()[0]
+            if count > self.max_entries:
+                conn.execute(
+                    'DELETE FROM hashes WHERE rowid IN (SELECT rowid FROM hashes ORDER BY last_used LIMIT ?)',
+                    (count - self.max_entries,)
+                )
+                conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._touched.clear()
+        with self._connection() as conn:
+            conn.execute('DELETE FROM hashes')
+            conn.commit()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'errors': self.errors,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = self.misses = self.errors = 0
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            pool, self._pool = self._pool, []
+        for conn in pool:
+            conn.close()
@@ -0,0 +1,226 @@
+import os
+import zlib
+import hashlib
+import weakref
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from hash_cache import HashCache
+from jobs import JobCancelled, check_progress
+import metrics
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+BUFFER_SIZE = 1024 * 1024
+SAMPLE_SIZE = 64 * 1024
+# Файлы крупнее этого читаются большим буфером: меньше системных вызовов на гигабайт.
+# mmap не используем - файл, укороченный во время хеширования, роняет процесс по SIGBUS
+LARGE_FILE_THRESHOLD = 16 * 1024 * 1024
+LARGE_BUFFER_SIZE = 8 * 1024 * 1024
+ALGORITHM = 'sha256'
+# Для поиска изменений криптостойкость не нужна; без xxhash берём CRC-32 из zlib
+FAST_ALGORITHM = 'xxh3_128' if xxhash else 'crc32'
+ALGORITHM_CHOICES = ('sha256', 'blake2b', 'fast')
+
+class Crc32:
+    def __init__(self):
+        self.value = 0
+
+    def update(self, data):
+        self.value = zlib.crc32(data, self.value)
+
+    def hexdigest(self):
+        return f'{self.value:08x}'
+
+def resolve_algorithm(algorithm):
+    # В кеш и манифест записывается конкретный алгоритм, а не псевдоним 'fast'
+    if algorithm is None:
+        return ALGORITHM
+    return FAST_ALGORITHM if algorithm == 'fast' else algorithm
+
+def new_hash(algorithm):
+    if algorithm == 'crc32':
+        return Crc32()
+    if algorithm.startswith('xxh'):
+        if xxhash is None:
+            raise ValueError(f"{algorithm} needs the xxhash package")
+        return getattr(xxhash, algorithm)()
+    return hashlib.new(algorithm)
+
+_engines = weakref.WeakSet()
+
+def _forget_executors():
+    for engine in list(_engines):
+        engine._forget_executor()
+
+class HashEngine:
+    def __init__(self, workers=None, max_pending=None, buffer_size=BUFFER_SIZE, cache=None):
+        self.workers = workers or DEFAULT_WORKERS
+        self.max_pending = max_pending or self.workers * 2
+        self.buffer_size = buffer_size
+        self.cache = cache
+        self._local = threading.local()
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        _engines.add(self)
+
+    def _forget_executor(self):
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='hash')
+            return self._executor
+
+    def close(self):
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def _buffer(self, large=False):
+        name = 'large_buffer' if large else 'buffer'
+        buffer = getattr(self._local, name, None)
+        if buffer is None:
+            buffer = memoryview(bytearray(max(LARGE_BUFFER_SIZE, self.buffer_size) if large else self.buffer_size))
+            setattr(self._local, name, buffer)
+        return buffer
+
+    def _read_full(self, f, size, hash_object, progress=None, sample_object=None):
+        buffer = self._buffer(size >= LARGE_FILE_THRESHOLD)
+        if sample_object is not None:
+            sample_object.update(size.to_bytes(8, 'little'))
+        # Выборка по ходу чтения: те же байты и в том же порядке, что читает _read_sample
+        tail = max(SAMPLE_SIZE, size - SAMPLE_SIZE)
+        offset = 0
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            hash_object.update(buffer[:n])
+            if sample_object is not None:
+                if offset < SAMPLE_SIZE:
+                    sample_object.update(buffer[:min(n, SAMPLE_SIZE - offset)])
+                if offset + n > tail:
+                    sample_object.update(buffer[max(0, tail - offset):n])
+            offset += n
+            check_progress(progress, bytes=n)
+
+    def _read_sample(self, f, size, hash_object, progress=None):
+        check_progress(progress)
+        buffer = self._buffer()[:SAMPLE_SIZE]
+        hash_object.update(size.to_bytes(8, 'little'))
+        n = f.readinto(buffer)
+        hash_object.update(buffer[:n])
+        if size > 2 * SAMPLE_SIZE:
+            f.seek(-SAMPLE_SIZE, os.SEEK_END)
+        elif size > SAMPLE_SIZE:
+            f.seek(SAMPLE_SIZE)
+        else:
+            return
+        n = f.readinto(buffer)
+        hash_object.update(buffer[:n])
+
+    def hash_stream(self, f, size, algorithm=ALGORITHM, sampled=False, progress=None):
+        hash_object = new_hash(algorithm)
+        (self._read_sample if sampled else self._read_full)(f, size, hash_object, progress)
+        return hash_object.hexdigest()
+
+    def _digest(self, file_path, algorithm, sampled, progress=None):
+        cache_key = f'{algorithm}:sample' if sampled else algorithm
+        try:
+            with open(file_path, 'rb', buffering=0) as f:
+                st = os.fstat(f.fileno())
+                if self.cache:
+                    digest = self.cache.get(st, cache_key)
+                    if digest:
+                        check_progress(progress, files=1, path=file_path)
+                        return digest
+                digest = self.hash_stream(f, st.st_size, algorithm, sampled, progress)
+                check_progress(progress, files=1, path=file_path)
+                metrics.count('files_hashed')
+                metrics.count('bytes_read', min(st.st_size, 2 * SAMPLE_SIZE) if sampled else st.st_size)
+        except JobCancelled:
+            raise
+        except Exception as e:
+            metrics.error('hash', "Error calculating hash for %s: %s", file_path, e)
+            return None
+        if self.cache:
+            self.cache.put(st, cache_key, digest)
+        return digest
+
+    def _digest_pair(self, file_path, algorithm, progress=None):
+        sample_key = f'{algorithm}:sample'
+        try:
+            with open(file_path, 'rb', buffering=0) as f:
+                st = os.fstat(f.fileno())
+                if self.cache:
+                    digest, sample = self.cache.get(st, algorithm), self.cache.get(st, sample_key)
+                    if digest and sample:
+                        check_progress(progress, files=1, path=file_path)
+                        return digest, sample
+                hash_object, sample_object = new_hash(algorithm), new_hash(algorithm)
+                self._read_full(f, st.st_size, hash_object, progress, sample_object)
+                digest, sample = hash_object.hexdigest(), sample_object.hexdigest()
+                check_progress(progress, files=1, path=file_path)
+                metrics.count('files_hashed')
+                metrics.count('bytes_read', st.st_size)
+        except JobCancelled:
+            raise
+        except Exception as e:
+            metrics.error('hash', "Error calculating hash for %s: %s", file_path, e)
+            return None, None
+        if self.cache:
+            self.cache.put(st, algorithm, digest)
+            self.cache.put(st, sample_key, sample)
+        return digest, sample
+
+    def hash_file(self, file_path, algorithm=ALGORITHM):
+        return self._digest(file_path, algorithm, False)
+
+    def sample_file(self, file_path, algorithm=ALGORITHM):
+        return self._digest(file_path, algorithm, True)
+
+    def _map_bounded(self, function, paths, *args):
+        executor = self._get_executor()
+        pending = {}
+        try:
+            for path in paths:
+                if len(pending) >= self.max_pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield pending.pop(future), future.result()
+                pending[executor.submit(function, path, *args)] = path
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield pending.pop(future), future.result()
+        finally:
+            # Пул общий, поэтому при отмене или ошибке снимаем только свои задачи
+            for future in pending:
+                future.cancel()
+
+    def hash_files(self, paths, sampled=False, algorithm=ALGORITHM, progress=None):
+        return self._map_bounded(self._digest, paths, algorithm, sampled, progress)
+
+    def hash_pairs(self, paths, algorithm=ALGORITHM, progress=None):
+        # Полный хеш и выборка за одно чтение файла - для манифеста, где нужны оба
+        return self._map_bounded(self._digest_pair, paths, algorithm, progress)
+
+    def hash_map(self, paths, sampled=False, algorithm=ALGORITHM, progress=None):
+        return dict(self.hash_files(paths, sampled, algorithm, progress))
+
+    def cache_stats(self):
+        return self.cache.stats() if self.cache else None
+
+if hasattr(os, 'register_at_fork'):
+    # Потоки пула не переживают fork - дочернему процессу нужен свой пул
+    os.register_at_fork(after_in_child=_forget_executors)
+
+default_cache = HashCache()
+default_engine = HashEngine(cache=default_cache)
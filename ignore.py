@@ -0,0 +1,150 @@
+import os
+import re
+import metrics
+
+IGNORE_FILE = '.folderwatcherignore'
+
+def translate_glob(pattern):
+    parts = []
+    i = 0
+    while i < len(pattern):
+        ch = pattern[i]
+        if pattern.startswith('**/', i):
+            parts.append('(?:.*/)?')
+            i += 3
+            continue
+        if pattern.startswith('**', i):
+            parts.append('.*')
+            i += 2
+            continue
+        if ch == '*':
+            parts.append('[^/]*')
+        elif ch == '?':
+            parts.append('[^/]')
+        elif ch == '[':
+            end = pattern.find(']', i + 2)
+            if end < 0:
+                parts.append(re.escape(ch))
+            else:
+                body = pattern[i + 1:end]
+                if body.startswith('!'):
+                    body = '^' + body[1:]
+                parts.append('[' + body.replace('\\', '\\\\') + ']')
+                i = end
+        elif ch == '\\' and i + 1 < len(pattern):
+            i += 1
+            parts.append(re.escape(pattern[i]))
+        else:
+            parts.append(re.escape(ch))
+        i += 1
+    return ''.join(parts)
+
+def parse_rule(line):
+    if line.endswith('\n'):
+        line = line[:-1]
+    # Пробелы в конце значимы, только если экранированы
+    while line.endswith(' ') and not line.endswith('\\ '):
+        line = line[:-1]
+    if not line or line.startswith('#'):
+        return None
+    negate = line.startswith('!')
+    if negate or line.startswith('\\!') or line.startswith('\\#'):
+        line = line[1:]
+    dir_only = line.endswith('/')
+    line = line.rstrip('/')
+    if not line:
+        return None
+    # Шаблон со слешем привязан к корню, без слеша совпадает с именем на любой глубине
+    if '/' in line:
+        regex = translate_glob(line.lstrip('/'))
+    else:
+        regex = '(?:.*/)?' + translate_glob(line)
+    return regex, negate, dir_only
+
+class IgnoreRules:
+    # Правила в духе .gitignore: побеждает последнее совпавшее, '!' возвращает путь обратно.
+    # Все правила собраны в одно регулярное выражение, альтернативы идут от последнего правила к первому
+    def __init__(self, patterns=()):
+        self.patterns = []
+        self.rules = []
+        self.skipped_files = 0
+        self.skipped_dirs = 0
+        self.add(patterns)
+
+    def add(self, patterns):
+        for pattern in patterns:
+            rule = parse_rule(pattern)
+            if rule is not None:
+                self.patterns.append(pattern.rstrip('\n'))
+                self.rules.append(rule)
+        self.file_matcher = self.compile(rule for rule in self.rules if not rule[2])
+        self.dir_matcher = self.compile(self.rules)
+
+    @staticmethod
+    def compile(rules):
+        alternatives = [f'(?P<{"n" if negate else "i"}{index}>{regex})'
+                        for index, (regex, negate, dir_only) in reversed(list(enumerate(rules)))]
+        if not alternatives:
+            return None
+        return re.compile('(?:' + '|'.join(alternatives) + ')', re.DOTALL)
+
+    def __bool__(self):
+        return bool(self.rules)
+
+    def __getstate__(self):
+        # В процессы-обработчики передаются только шаблоны, выражения собираются там заново
+        return self.patterns
+
+    def __setstate__(self, patterns):
+        self.__init__(patterns)
+
+    def ignored(self, rel_path, is_dir=False):
+        matcher = self.dir_matcher if is_dir else self.file_matcher
+        if matcher is None:
+            return False
+        match = matcher.fullmatch(rel_path.replace('\\', '/'))
+        return match is not None and match.lastgroup.startswith('i')
+
+    def skip(self, rel_path, is_dir=False):
+        if self.ignored(rel_path, is_dir):
+            self.count(is_dir)
+            return True
+        return False
+
+    def filter(self, rel_dir, infos):
+        rel_dir = rel_dir.replace('\\', '/')
+        return [info for info in infos if not self.skip(f"{rel_dir}/{info.name}" if rel_dir else info.name, info.is_dir)]
+
+    def count(self, is_dir, value=1):
+        if is_dir:
+            self.skipped_dirs += value
+        else:
+            self.skipped_files += value
+
+    def copy(self):
+        # Те же правила с нулевыми счётчиками, например для предварительной оценки объёма
+        return IgnoreRules(self.patterns)
+
+    def report(self):
+        metrics.count('ignored_files', self.skipped_files)
+        metrics.count('ignored_dirs', self.skipped_dirs)
+
+    def summary(self):
+        return f"skipped {self.skipped_files} files and {self.skipped_dirs} directories by ignore rules"
+
+def read_ignore_file(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return f.readlines()
+    except FileNotFoundError:
+        return []
+
+def load_ignore(*roots, patterns=(), use_ignore_files=True):
+    # Правила из .folderwatcherignore каждого корня, затем заданные для запуска - они имеют приоритет
+    rules = IgnoreRules()
+    if use_ignore_files:
+        for root in roots:
+            if root and os.path.isdir(root):
+                rules.add(read_ignore_file(os.path.join(root, IGNORE_FILE)))
+    rules.add(patterns)
+    return rules
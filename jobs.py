@@ -0,0 +1,178 @@
+import time
+import queue
+import threading
+
+class JobCancelled(Exception):
+    pass
+
+class Progress:
+    def __init__(self, job=None, interval=0.1):
+        self.job = job
+        self.interval = interval
+        self.files_done = 0
+        self.bytes_done = 0
+        self.total_files = None
+        self.total_bytes = None
+        self.current_path = ''
+        self.started = time.monotonic()
+        self.cancel_event = threading.Event()
+        self._lock = threading.Lock()
+        self._last_report = 0
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def check(self):
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+
+    def set_total(self, files=None, bytes=None):
+        with self._lock:
+            self.total_files = files
+            self.total_bytes = bytes
+
+    def advance(self, files=0, bytes=0, path=None):
+        self.check()
+        with self._lock:
+            self.files_done += files
+            self.bytes_done += bytes
+            if path is not None:
+                self.current_path = path
+            now = time.monotonic()
+            report = now - self._last_report >= self.interval
+            if report:
+                self._last_report = now
+        if report and self.job:
+            self.job.post('progress', self.snapshot())
+
+    def emit(self, payload):
+        # Частичный результат (например, готовые хеши) до завершения задачи
+        self.check()
+        if self.job:
+            self.job.post('result', payload)
+
+    def eta(self):
+        elapsed = time.monotonic() - self.started
+        if self.total_bytes and self.bytes_done:
+            return elapsed * (self.total_bytes - self.bytes_done) / self.bytes_done
+        if self.total_files and self.files_done:
+            return elapsed * (self.total_files - self.files_done) / self.files_done
+        return None
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'files_done': self.files_done,
+                'bytes_done': self.bytes_done,
+                'total_files': self.total_files,
+                'total_bytes': self.total_bytes,
+                'current_path': self.current_path,
+                'elapsed': time.monotonic() - self.started,
+                'eta': self.eta()
+            }
+
+def check_progress(progress, files=0, bytes=0, path=None):
+    if progress is not None:
+        progress.advance(files, bytes, path)
+
+class Job:
+    def __init__(self, runner, keys, target, args, kwargs, on_done=None, on_error=None, on_progress=None, on_cancel=None,
+                 on_result=None):
+        self.runner = runner
+        self.keys = keys
+        self.target = target
+        self.args = args
+        self.kwargs = kwargs
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self.on_cancel = on_cancel
+        self.on_result = on_result
+        self.progress = Progress(self)
+        self.result = None
+        self.error = None
+        self.status = 'pending'
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def post(self, kind, payload=None):
+        self.runner.messages.put((self, kind, payload))
+
+    def run(self):
+        try:
+            self.result = self.target(*self.args, progress=self.progress, **self.kwargs)
+        except JobCancelled:
+            self.post('cancelled')
+        except Exception as e:
+            self.error = e
+            self.post('error', e)
+        else:
+            self.post('done', self.result)
+
+    def cancel(self):
+        self.progress.cancel_event.set()
+
+    def wait(self, timeout=None):
+        self.thread.join(timeout)
+        return not self.thread.is_alive()
+
+class JobRunner:
+    def __init__(self):
+        self.messages = queue.Queue()
+        self.jobs = {}
+
+    def is_busy(self, *keys):
+        return any(key in self.jobs for key in keys)
+
+    def start(self, keys, target, *args, on_done=None, on_error=None, on_progress=None, on_cancel=None, on_result=None,
+              **kwargs):
+        # Несколько ключей (панелей) передаются списком, кортеж - один составной ключ вроде ('hash', treeview)
+        keys = tuple(keys) if isinstance(keys, list) else (keys,)
+        if self.is_busy(*keys):
+            raise RuntimeError("A job is already running for this pane")
+        job = Job(self, keys, target, args, kwargs, on_done, on_error, on_progress, on_cancel, on_result)
+        for key in keys:
+            self.jobs[key] = job
+        job.status = 'running'
+        job.thread.start()
+        return job
+
+    def cancel(self, *keys):
+        for key in keys:
+            job = self.jobs.get(key)
+            if job:
+                job.cancel()
+
+    def cancel_all(self):
+        for job in set(self.jobs.values()):
+            job.cancel()
+
+    def poll(self):
+        while True:
+            try:
+                job, kind, payload = self.messages.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'progress':
+                if job.on_progress and job.status == 'running':
+                    job.on_progress(payload)
+                continue
+            if kind == 'result':
+                if job.on_result and job.status == 'running':
+                    job.on_result(payload)
+                continue
+            job.status = kind
+            for key in job.keys:
+                if self.jobs.get(key) is job:
+                    del self.jobs[key]
+            if kind == 'done' and job.on_done:
+                job.on_done(payload)
+            elif kind == 'error' and job.on_error:
+                job.on_error(payload)
+            elif kind == 'cancelled' and job.on_cancel:
+                job.on_cancel()
+
+    def wait(self, job, timeout=None):
+        finished = job.wait(timeout)
+        self.poll()
+        return finished
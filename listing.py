@@ -0,0 +1,127 @@
+import time
+import mimetypes
+import threading
+from collections import deque
+from hasher import ALGORITHM
+from scanner import scan_directory
+from tree import DirNode
+from ads import list_ads_files
+
+HASH_PLACEHOLDER = "…"
+HASH_BATCH_INTERVAL = 0.1
+
+class ListingEntry:
+    __slots__ = ('kind', 'item', 'size', 'mime_type')
+
+    def __init__(self, kind, item, size, mime_type=None):
+        self.kind = kind
+        self.item = item
+        self.size = size
+        self.mime_type = mime_type
+
+class Listing:
+    # Результат одного сканирования панели; вид перерисовывается из него без обращения к диску
+    def __init__(self, directory, entries, use_ads=False, source=None, algorithm=ALGORITHM):
+        self.directory = directory
+        self.entries = entries
+        self.use_ads = use_ads
+        self.source = source
+        self.algorithm = algorithm
+        self.hashes = {}
+        self.hash_queue = None
+        self.modified_files = None
+        self.moved_files = None
+        self.rows = {entry.item.path: i for i, entry in enumerate(entries) if entry.kind == "File"}
+
+    def files(self):
+        return [entry.item for entry in self.entries if entry.kind == "File"]
+
+    def carry_over(self, old):
+        # Хеши и подсветку переносим только для файлов с прежними размером и временем изменения
+        old_files = {info.path: info for info in old.files()}
+        self.algorithm = old.algorithm
+        for info in self.files():
+            previous = old_files.get(info.path)
+            if previous and previous.size == info.size and previous.mtime_ns == info.mtime_ns \
+                    and info.path in old.hashes:
+                self.hashes[info.path] = old.hashes[info.path]
+        self.modified_files = old.modified_files
+        self.moved_files = old.moved_files
+
+    def set_algorithm(self, algorithm):
+        if algorithm != self.algorithm:
+            self.algorithm = algorithm
+            self.hashes.clear()
+
+    def missing_hashes(self):
+        return [info.path for info in self.files() if info.path not in self.hashes]
+
+    def is_current(self, directory, use_ads):
+        return self.directory == directory and self.use_ads == use_ads
+
+class HashQueue:
+    # Очередь путей на хеширование; видимые строки можно в любой момент поставить вперёд
+    def __init__(self, paths):
+        self.pending = deque(paths)
+        self.started = set()
+        self._lock = threading.Lock()
+
+    def prioritize(self, paths):
+        with self._lock:
+            self.pending.extendleft(reversed([path for path in paths if path not in self.started]))
+
+    def __iter__(self):
+        while True:
+            with self._lock:
+                if not self.pending:
+                    return
+                path = self.pending.popleft()
+                if path in self.started:
+                    continue
+                self.started.add(path)
+            yield path
+
+def hash_listing(listing, queue, engine, progress):
+    if listing.source is not None:
+        files = {info.path: info for info in listing.files()}
+        results = ((path, listing.source.digests([files[path]], listing.algorithm, progress=progress)[path])
+                   for path in queue)
+    else:
+        results = engine.hash_files(queue, algorithm=listing.algorithm, progress=progress)
+    batch = []
+    last_emit = time.monotonic()
+    for path, digest in results:
+        batch.append((path, digest))
+        if time.monotonic() - last_emit >= HASH_BATCH_INTERVAL:
+            progress.emit(batch)
+            batch = []
+            last_emit = time.monotonic()
+    if batch:
+        progress.emit(batch)
+
+def file_entry(info):
+    return ListingEntry("File", info, info.size, mimetypes.guess_type(info.path)[0])
+
+def build_listing(directory, size_index, use_ads=False, ignore=None):
+    entries = []
+    for info in scan_directory(directory).values():
+        # Исключённое правилами панели не показываем и не обходим ради размера
+        if ignore and ignore.ignored(info.name, info.is_dir):
+            continue
+        if use_ads and not info.is_dir:
+            for ads_file, size in list_ads_files(info.path):
+                entries.append(ListingEntry("ADS", ads_file, size))
+        if info.is_dir:
+            entries.append(ListingEntry("Folder", info, size_index.size(info.path)))
+        else:
+            entries.append(file_entry(info))
+    return Listing(directory, entries, use_ads)
+
+def build_snapshot_listing(snapshot_file, tree, use_ads=False):
+    entries = []
+    for child in tree.children.values():
+        if isinstance(child, DirNode):
+            entries.append(ListingEntry("Folder", child.info, child.size))
+        else:
+            entries.append(file_entry(child))
+    return Listing(snapshot_file, entries, use_ads, tree.source)
@@ -1,8 +1,10 @@
 import os
+import logging
 from tkinter import Tk
 from gui import Window
 
 def main():
+    logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s')
     root = Tk()
     
     script_dir = os.path.dirname(os.path.abspath(__file__))
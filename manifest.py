@@ -0,0 +1,169 @@
+import os
+import gzip
+import json
+import time
+from hasher import default_engine, resolve_algorithm
+from scanner import FileInfo, FILE_FIELDS, scan_directory, descends
+from tree import DirNode
+import streams
+from jobs import check_progress
+import metrics
+
+MANIFEST_FORMAT = 'folderwatcher-manifest'
+MANIFEST_VERSION = 1
+MANIFEST_EXT = '.fwm'
+
+class ManifestSource:
+    mtime_resolution_ns = 1
+
+    def __init__(self, filepath, header):
+        self.filepath = filepath
+        self.header = header
+        self.native_algorithm = header.get('algorithm')
+        # Манифест, записанный без хешей, сравнивается только по метаданным
+        self.has_content = self.native_algorithm is not None
+        self.has_samples = self.has_content
+        self.fields = FILE_FIELDS if header.get('ads') else FILE_FIELDS - {'ads'}
+
+    def stored_digest(self, info):
+        return info.digest
+
+    def digests(self, infos, algorithm, sampled=False, progress=None):
+        if algorithm != self.native_algorithm:
+            raise ValueError(f"Manifest {self.filepath} has no {algorithm} hashes, use the size_mtime mode to compare it")
+        return {info.path: info.sample if sampled else info.digest for info in infos}
+
+def is_manifest(path):
+    return os.path.isfile(path) and (path.endswith(MANIFEST_EXT) or path.endswith(MANIFEST_EXT + '.gz'))
+
+def open_manifest(filepath, mode):
+    if filepath.endswith('.gz'):
+        return gzip.open(filepath, mode + 't', encoding='utf-8', newline='\n')
+    return open(filepath, mode, encoding='utf-8', newline='\n')
+
+def stream_names(file_path):
+    return [[name, size] for name, size in streams.list_streams(file_path)]
+
+def make_record(rel_path, info, use_ads=False, digest=None, sample=None):
+    record = {
+        'path': rel_path,
+        'type': 'd' if info.is_dir else 'f',
+        'size': info.size,
+        'mtime_ns': info.mtime_ns,
+        'attributes': info.attributes
+    }
+    if not info.is_dir:
+        if use_ads:
+            record['streams'] = stream_names(info.path)
+        if digest is not None:
+            record['hash'] = digest
+        if sample is not None:
+            record['sample'] = sample
+    return record
+
+def iter_records(directory, use_ads=False, hash_content=True, engine=None, progress=None, algorithm=None, ignore=None):
+    engine = engine or default_engine
+    algorithm = resolve_algorithm(algorithm)
+    stack = ['']
+    while stack:
+        prefix = stack.pop()
+        path = os.path.join(directory, prefix) if prefix else directory
+        check_progress(progress, path=path)
+        infos = scan_directory(path)
+        if ignore:
+            infos = {info.name: info for info in ignore.filter(prefix, infos.values())}
+        files = [info.path for info in infos.values() if not info.is_dir]
+        pairs = dict(engine.hash_pairs(files, algorithm, progress)) if hash_content else {}
+        for name in sorted(infos):
+            info = infos[name]
+            rel_path = f"{prefix}/{name}" if prefix else name
+            yield make_record(rel_path, info, use_ads, *pairs.get(info.path, (None, None)))
+            if descends(info):
+                stack.append(rel_path)
+
+def manifest_header(directory, use_ads=False, hash_content=True, algorithm=None, ignore=None):
+    header = {
+        'format': MANIFEST_FORMAT,
+        'version': MANIFEST_VERSION,
+        'root': os.path.abspath(directory),
+        'created': time.time(),
+        'algorithm': resolve_algorithm(algorithm) if hash_content else None,
+        'ads': use_ads
+    }
+    if ignore:
+        header['ignore'] = ignore.patterns
+    return header
+
+def write_records(filepath, header, records):
+    with open_manifest(filepath, 'w') as f:
+        f.write(json.dumps(header, ensure_ascii=False) + '\n')
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+    return filepath
+
+def write_manifest(directory, filepath, use_ads=False, hash_content=True, engine=None, progress=None, algorithm=None,
+                   ignore=None):
+    header = manifest_header(directory, use_ads, hash_content, algorithm, ignore)
+    try:
+        with metrics.phase('manifest'):
+            return write_records(filepath, header, iter_records(directory, use_ads, hash_content, engine, progress,
+                                                                   algorithm, ignore))
+    except BaseException:
+        if os.path.exists(filepath):
+            os.remove(filepath)
+        raise
+
+def read_manifest(filepath):
+    f = open_manifest(filepath, 'r')
+    header = json.loads(f.readline())
+    if header.get('format') != MANIFEST_FORMAT:
+        f.close()
+        raise ValueError(f"{filepath} is not a FolderWatcher manifest")
+
+    def records():
+        with f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    return header, records()
+
+def record_info(filepath, record):
+    parts = record['path'].split('/')
+    is_dir = record['type'] == 'd'
+    info = FileInfo(
+        parts[-1], os.path.join(filepath, *parts), is_dir, record['size'],
+        record['mtime_ns'] / 1e9, record['mtime_ns'], record.get('attributes', 0)
+    )
+    info.digest = record.get('hash')
+    info.sample = record.get('sample')
+    if 'streams' in record:
+        info.streams = [tuple(stream) for stream in record['streams']]
+    return info
+
+def load_manifest_tree(filepath):
+    header, records = read_manifest(filepath)
+    root = {}
+    dirs = {'': (None, root)}
+    for record in records:
+        info = record_info(filepath, record)
+        parent, _, name = record['path'].rpartition('/')
+        if parent not in dirs:
+            raise ValueError(f"Manifest {filepath} lists {record['path']} before its directory")
+        if info.is_dir:
+            dirs[record['path']] = (info, {})
+            dirs[parent][1][name] = record['path']
+        else:
+            dirs[parent][1][name] = info
+
+    # Каталог записан раньше своих подкаталогов -> узлы строятся с конца, без рекурсии
+    nodes = {}
+    for key in reversed(list(dirs)):
+        info, children = dirs[key]
+        nodes[key] = DirNode(info, {
+            name: nodes.pop(child) if isinstance(child, str) else child
+            for name, child in children.items()
+        })
+    root = nodes['']
+    root.source = ManifestSource(filepath, header)
+    return header, root
@@ -0,0 +1,123 @@
+import time
+import pstats
+import logging
+import cProfile
+import threading
+from contextlib import contextmanager, nullcontext
+
+logger = logging.getLogger('folderwatcher')
+
+enabled = False
+NULL_PHASE = nullcontext()
+
+class Phase:
+    __slots__ = ('metrics', 'name', 'started')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.add_time(self.name, time.perf_counter() - self.started)
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.phases = {}
+            self.counters = {}
+            self.errors = {}
+            self.started = time.perf_counter()
+
+    def add_time(self, name, seconds):
+        with self._lock:
+            total, calls = self.phases.get(name, (0.0, 0))
+            self.phases[name] = (total + seconds, calls + 1)
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def error(self, kind):
+        with self._lock:
+            self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    def report(self):
+        with self._lock:
+            return {
+                'elapsed': round(time.perf_counter() - self.started, 6),
+                'phases': {
+                    name: {'seconds': round(total, 6), 'calls': calls}
+                    for name, (total, calls) in self.phases.items()
+                },
+                'counters': dict(self.counters),
+                'errors': dict(self.errors)
+            }
+
+metrics = Metrics()
+
+def enable(flag=True):
+    global enabled
+    enabled = flag
+
+# Пока сбор выключен, phase и count сводятся к одной проверке флага
+def phase(name):
+    return Phase(metrics, name) if enabled else NULL_PHASE
+
+def count(name, value=1):
+    if enabled:
+        metrics.count(name, value)
+
+def error(kind, message, *args):
+    # Ошибки учитываются всегда и уходят в журнал вместо print
+    metrics.error(kind)
+    logger.warning(message, *args)
+
+def report(cache=None):
+    result = metrics.report()
+    if cache is not None:
+        result['cache'] = cache.stats()
+    return result
+
+def reset():
+    metrics.reset()
+
+@contextmanager
+def profiled(output=None, sort='cumulative', limit=30):
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        if output:
+            profiler.dump_stats(output)
+        else:
+            pstats.Stats(profiler).sort_stats(sort).print_stats(limit)
+
+def format_summary(result):
+    parts = [f"{result['elapsed']:.2f} s"]
+    phases = sorted(result['phases'].items(), key=lambda item: -item[1]['seconds'])
+    parts.extend(f"{name} {data['seconds']:.2f} s" for name, data in phases)
+    counters = result['counters']
+    if 'files_hashed' in counters:
+        parts.append(f"{counters['files_hashed']} files hashed")
+    if 'bytes_read' in counters:
+        parts.append(f"{counters['bytes_read'] / 2**20:.1f} MB read")
+    ignored = counters.get('ignored_files', 0) + counters.get('ignored_dirs', 0)
+    if ignored:
+        parts.append(f"{ignored} ignored")
+    cache = result.get('cache')
+    if cache and cache['hits'] + cache['misses']:
+        parts.append(f"cache {cache['hit_rate']:.0%}")
+    errors = sum(result['errors'].values())
+    if errors:
+        parts.append(f"{errors} errors")
+    return ", ".join(parts)
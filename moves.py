@@ -0,0 +1,85 @@
+import os
+from collections import defaultdict
+from hasher import SAMPLE_SIZE
+
+def bucket_by_size(files):
+    buckets = defaultdict(list)
+    for rel_path, info in files.items():
+        # Пустые файлы совпадают с любыми пустыми -> переносом не считаем
+        if info.size:
+            buckets[info.size].append((rel_path, info))
+    return buckets
+
+def regroup(groups, digests1, digests2):
+    result = defaultdict(lambda: ([], []))
+    for key, (files1, files2) in groups.items():
+        for side, files, digests in ((0, files1, digests1), (1, files2, digests2)):
+            for rel_path, info in files:
+                digest = digests.get(info.path)
+                if digest is not None:
+                    result[key + (digest,)][side].append((rel_path, info))
+    return {key: sides for key, sides in result.items() if sides[0] and sides[1]}
+
+def pair_group(files1, files2):
+    # Сначала пары с одинаковым именем (перемещение), затем остальные по порядку путей (переименование)
+    pairs = {}
+    paths2 = sorted(rel_path for rel_path, info in files2)
+    by_name = defaultdict(list)
+    for rel_path in reversed(paths2):
+        by_name[os.path.basename(rel_path)].append(rel_path)
+    rest1 = []
+    for rel_path in sorted(rel_path for rel_path, info in files1):
+        candidates = by_name.get(os.path.basename(rel_path))
+        if candidates:
+            pairs[rel_path] = candidates.pop()
+        else:
+            rest1.append(rel_path)
+    matched = set(pairs.values())
+    pairs.update(zip(rest1, (rel_path for rel_path in paths2 if rel_path not in matched)))
+    return pairs
+
+def match_moves(files1, files2, digests1, digests2, confirm=True):
+    # Размер -> выборка -> полный хеш; хешируются только файлы, у которых есть пара того же размера.
+    # confirm=False - без полного хеша, как в выборочном режиме сравнения
+    buckets1, buckets2 = bucket_by_size(files1), bucket_by_size(files2)
+    groups = {(size,): (buckets1[size], buckets2[size]) for size in buckets1.keys() & buckets2.keys()}
+    if not groups:
+        return {}
+    candidates1 = [info for files, _ in groups.values() for rel_path, info in files]
+    candidates2 = [info for _, files in groups.values() for rel_path, info in files]
+    groups = regroup(groups, digests1(candidates1, True), digests2(candidates2, True))
+
+    # Выборка покрывает файл до 2 * SAMPLE_SIZE целиком, полный хеш нужен только крупным
+    large = {key: sides for key, sides in groups.items() if key[0] > 2 * SAMPLE_SIZE} if confirm else {}
+    if large:
+        confirmed = regroup(
+            large,
+            digests1([info for files, _ in large.values() for rel_path, info in files], False),
+            digests2([info for _, files in large.values() for rel_path, info in files], False)
+        )
+        groups = {key: sides for key, sides in groups.items() if key[0] <= 2 * SAMPLE_SIZE}
+        groups.update(confirmed)
+
+    moves = {}
+    for files1, files2 in groups.values():
+        moves.update(pair_group(files1, files2))
+    return moves
+
+def match_moved_dirs(dirs1, dirs2, moves):
+    # Каталог перенесён целиком, если все его файлы переехали в один каталог с той же структурой
+    moved_dirs = {}
+    targets = set(dirs2)
+    for dir1, files in dirs1.items():
+        if not files or files[0] not in moves:
+            continue
+        suffix = os.path.relpath(files[0], dir1)
+        target = moves[files[0]]
+        if not target.endswith(os.sep + suffix):
+            continue
+        dir2 = target[:-len(suffix) - 1]
+        if dir2 not in targets or len(dirs2[dir2]) != len(files):
+            continue
+        if all(moves.get(rel_path) == os.path.join(dir2, os.path.relpath(rel_path, dir1)) for rel_path in files):
+            moved_dirs[dir1] = dir2
+            targets.discard(dir2)
+    return moved_dirs
@@ -0,0 +1,124 @@
+import os
+from array import array
+from scanner import FileInfo, scan_directory
+from jobs import check_progress
+
+FLAG_DIR = 1
+FLAG_LINK = 2
+
+def encode_name(name):
+    return name.encode('utf-8', 'surrogateescape')
+
+class RecordStore:
+    # Записи дерева хранятся по столбцам: около 35 байт на запись плюс имя в UTF-8.
+    # Каталог хранится один раз, его записи лежат подряд и отсортированы по имени
+    def __init__(self, root):
+        self.root = os.path.normpath(root)
+        self.dir_paths = []
+        self.dir_ids = {}
+        self.dir_start = array('q')
+        self.dir_end = array('q')
+        self.names = bytearray()
+        self.name_end = array('q')
+        self.parents = array('i')
+        self.sizes = array('q')
+        self.mtimes = array('q')
+        self.attributes = array('I')
+        self.flags = array('B')
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def nbytes(self):
+        columns = (self.name_end, self.parents, self.sizes, self.mtimes, self.attributes, self.flags,
+                   self.dir_start, self.dir_end)
+        return len(self.names) + sum(column.itemsize * len(column) for column in columns)
+
+    def add_directory(self, rel_dir, infos):
+        dir_id = len(self.dir_paths)
+        self.dir_paths.append(rel_dir)
+        self.dir_ids[rel_dir] = dir_id
+        self.dir_start.append(len(self))
+        for encoded, info in sorted((encode_name(info.name), info) for info in infos):
+            self.names += encoded
+            self.name_end.append(len(self.names))
+            self.parents.append(dir_id)
+            self.sizes.append(info.size)
+            self.mtimes.append(info.mtime_ns)
+            self.attributes.append(info.attributes)
+            self.flags.append((FLAG_DIR if info.is_dir else 0) | (FLAG_LINK if info.is_link else 0))
+        self.dir_end.append(len(self))
+        return dir_id
+
+    def name_bytes(self, row):
+        return bytes(self.names[self.name_end[row - 1] if row else 0:self.name_end[row]])
+
+    def name(self, row):
+        return self.name_bytes(row).decode('utf-8', 'surrogateescape')
+
+    def rel_path(self, row):
+        rel_dir = self.dir_paths[self.parents[row]]
+        return os.path.join(rel_dir, self.name(row)) if rel_dir else self.name(row)
+
+    def is_dir(self, row):
+        return bool(self.flags[row] & FLAG_DIR)
+
+    def is_link(self, row):
+        return bool(self.flags[row] & FLAG_LINK)
+
+    def rows(self, rel_dir=''):
+        dir_id = self.dir_ids.get(rel_dir)
+        if dir_id is None:
+            return range(0)
+        return range(self.dir_start[dir_id], self.dir_end[dir_id])
+
+    def find(self, rel_path):
+        rel_dir, name = os.path.split(os.path.normpath(rel_path))
+        rows = self.rows(rel_dir)
+        target = encode_name(name)
+        low, high = rows.start, rows.stop
+        while low < high:
+            middle = (low + high) // 2
+            if self.name_bytes(middle) < target:
+                low = middle + 1
+            else:
+                high = middle
+        if low < rows.stop and self.name_bytes(low) == target:
+            return low
+        return None
+
+    def info(self, row):
+        # FileInfo создаётся только по запросу, например для хеширования или вывода
+        rel_path = self.rel_path(row)
+        mtime_ns = self.mtimes[row]
+        return FileInfo(os.path.basename(rel_path), os.path.join(self.root, rel_path), self.is_dir(row),
+                        self.sizes[row], mtime_ns / 1e9, mtime_ns, self.attributes[row], is_link=self.is_link(row))
+
+    def __iter__(self):
+        return iter(range(len(self)))
+
+    def iter_infos(self):
+        for row in self:
+            yield self.info(row)
+
+def build_record_store(root, progress=None, ignore=None, rel_root=''):
+    store = RecordStore(root)
+    stack = ['']
+    while stack:
+        rel_dir = stack.pop()
+        path = os.path.join(store.root, rel_dir) if rel_dir else store.root
+        check_progress(progress, path=path)
+        try:
+            infos = scan_directory(path).values()
+        except OSError:
+            # Недоступный корень - ошибка, недоступный подкаталог считаем пустым
+            if not rel_dir:
+                raise
+            infos = ()
+        if ignore:
+            # Правила заданы относительно корня сравнения, а хранилище может начинаться глубже
+            infos = ignore.filter(os.path.join(rel_root, rel_dir) if rel_root else rel_dir, infos)
+        store.add_directory(rel_dir, infos)
+        rows = store.rows(rel_dir)
+        stack.extend(store.rel_path(row) for row in reversed(rows) if store.is_dir(row) and not store.is_link(row))
+    return store
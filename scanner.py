@@ -0,0 +1,87 @@
+import os
+import stat
+import time
+
+stat_calls = 0
+
+FIELD_ORDER = ('size', 'attributes', 'last_modified', 'ads')
+FILE_FIELDS = frozenset(FIELD_ORDER)
+
+ATTRIBUTES_TO_TEST = [
+    (getattr(stat, 'FILE_ATTRIBUTE_ARCHIVE', 0x20), 'a'), # Архивный файл
+    (getattr(stat, 'FILE_ATTRIBUTE_READONLY', 0x1), 'r'), # Файл только для чтения
+    (getattr(stat, 'FILE_ATTRIBUTE_SYSTEM', 0x4), 's'), # Системный файл
+    (getattr(stat, 'FILE_ATTRIBUTE_HIDDEN', 0x2), 'h'), # Скрытый файл
+    (getattr(stat, 'FILE_ATTRIBUTE_NOT_CONTENT_INDEXED', 0x2000), 'i') # Файл не индексируется для поиска
+]
+
+class FileInfo:
+    __slots__ = ('name', 'path', 'is_dir', 'size', 'mtime', 'mtime_ns', 'attributes', 'dev', 'ino', 'is_link', 'digest',
+                 'sample', 'streams')
+
+    def __init__(self, name, path, is_dir, size, mtime, mtime_ns, attributes=0, dev=0, ino=0, is_link=False):
+        self.name = name
+        self.path = path
+        self.is_dir = is_dir
+        self.size = size
+        self.mtime = mtime
+        self.mtime_ns = mtime_ns
+        self.attributes = attributes
+        self.dev = dev
+        self.ino = ino
+        self.is_link = is_link
+        # Заполняются, когда запись прочитана из манифеста, а не с диска
+        self.digest = None
+        self.sample = None
+        self.streams = None
+
+    @classmethod
+    def from_stat(cls, name, path, st, is_link=False):
+        return cls(
+            name, path, stat.S_ISDIR(st.st_mode), st.st_size, st.st_mtime, st.st_mtime_ns,
+            getattr(st, 'st_file_attributes', 0), st.st_dev, st.st_ino, is_link
+        )
+
+    def attributes_text(self):
+        return format_attributes(self.attributes)
+
+    def last_modified_text(self):
+        return format_mtime(self.mtime)
+
+    def __repr__(self):
+        return f"FileInfo({self.path!r}, size={self.size}, is_dir={self.is_dir})"
+
+def format_attributes(attrs):
+    return ''.join([ch if attrs & attr else "-" for attr, ch in ATTRIBUTES_TO_TEST])
+
+def format_mtime(timestamp):
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))
+
+def stat_entry(entry):
+    # Ссылка описывается своей целью, как в entry.is_dir(); битая ссылка пропускается (None)
+    global stat_calls
+    stat_calls += 1
+    try:
+        st = entry.stat()
+    except OSError:
+        if entry.is_symlink():
+            return None
+        raise
+    return FileInfo.from_stat(entry.name, entry.path, st, entry.is_symlink())
+
+def descends(info):
+    # В каталоги-ссылки обходы не заходят: ни циклов, ни повторного учёта одного содержимого
+    return info.is_dir and not info.is_link
+
+def scan_directory(path):
+    infos = {}
+    with os.scandir(path) as it:
+        for entry in it:
+            info = stat_entry(entry)
+            if info is not None:
+                infos[entry.name] = info
+    return infos
+
+def reset_stat_calls():
+    global stat_calls
+    stat_calls = 0
@@ -0,0 +1,146 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from hasher import HashEngine, resolve_algorithm, default_cache, default_engine
+from hash_cache import HashCache
+from scanner import scan_directory, FIELD_ORDER
+from records import build_record_store
+from dirindex import DirSizeIndex
+from compare import iter_store_differences, iter_moves, disk_files, modified_files, LiveSource, Difference, \
+    COMPARE_FULL, COMPARE_QUICK, DIFF_MODIFIED, DIFF_ONLY_IN1, DIFF_ONLY_IN2
+from jobs import check_progress
+from ignore import IgnoreRules
+import metrics
+
+DEFAULT_PROCESSES = os.cpu_count() or 1
+# Единиц работы больше, чем процессов, чтобы быстрые процессы забирали остаток
+UNITS_PER_PROCESS = 4
+THREADS_PER_PROCESS = 4
+# При сравнении содержимого каждые BYTES_PER_FILE байт весят как один файл
+BYTES_PER_FILE = 256 * 1024
+CHANGE_KEYS = FIELD_ORDER + ('hash',)
+
+_engine = None
+
+def init_worker(cache_path, threads):
+    # После fork соединения SQLite родителя использовать нельзя -> свой кеш в каждом процессе
+    global _engine
+    _engine = HashEngine(threads, cache=HashCache(cache_path) if cache_path else None)
+
+def join(prefix, name):
+    return os.path.join(prefix, name) if prefix else name
+
+def plan_units(dir1, dir2, mode, processes, index1, index2):
+    def weight(rel):
+        path1, path2 = os.path.join(dir1, rel), os.path.join(dir2, rel)
+        files = index1.file_count(path1) + index2.file_count(path2)
+        if mode == COMPARE_QUICK:
+            return files
+        return files + (index1.size(path1) + index2.size(path2)) // BYTES_PER_FILE
+
+    target = weight('') / (processes * UNITS_PER_PROCESS)
+    units = []
+    stack = ['']
+    while stack:
+        rel = stack.pop()
+        unit_weight = weight(rel)
+        names1 = {os.path.basename(path) for path in index1.children.get(os.path.normpath(os.path.join(dir1, rel)), ())}
+        names2 = {os.path.basename(path) for path in index2.children.get(os.path.normpath(os.path.join(dir2, rel)), ())}
+        common = sorted(names1 & names2)
+        if unit_weight <= target or not common:
+            units.append((rel, True, unit_weight))
+            continue
+        # Крупный каталог: его собственный уровень - отдельная единица, общие подкаталоги делим дальше
+        sub_weight = sum(weight(join(rel, name)) for name in common)
+        units.append((rel, False, unit_weight - sub_weight))
+        stack.extend(join(rel, name) for name in common)
+    return units
+
+def compact(difference, prefix):
+    changed = tuple(key for key in CHANGE_KEYS if difference.changes and difference.changes.get(key))
+    return difference.status, join(prefix, difference.path), difference.is_dir, changed
+
+def compare_unit(dir1, dir2, rel, recursive, mode, algorithm, ignore=None):
+    ignore = ignore or IgnoreRules()
+    path1 = os.path.join(dir1, rel) if rel else dir1
+    path2 = os.path.join(dir2, rel) if rel else dir2
+    if recursive:
+        store1 = build_record_store(path1, ignore=ignore, rel_root=rel)
+        store2 = build_record_store(path2, ignore=ignore, rel_root=rel)
+        differences = iter_store_differences(store1, store2, mode, _engine, algorithm=algorithm)
+        # Изменённые каталоги восстанавливаются при слиянии по найденным различиям
+        results = [compact(d, rel) for d in differences if not (d.is_dir and d.status == DIFF_MODIFIED)]
+    else:
+        entries1 = {info.name: info for info in ignore.filter(rel, scan_directory(path1).values())}
+        entries2 = {info.name: info for info in ignore.filter(rel, scan_directory(path2).values())}
+        results = []
+        for name, info1 in entries1.items():
+            info2 = entries2.get(name)
+            if info2 is None:
+                results.append((DIFF_ONLY_IN1, join(rel, name), info1.is_dir, ()))
+            elif info1.is_dir != info2.is_dir:
+                results.append((DIFF_ONLY_IN1, join(rel, name), info1.is_dir, ()))
+                results.append((DIFF_ONLY_IN2, join(rel, name), info2.is_dir, ()))
+        for name, info2 in entries2.items():
+            if name not in entries1:
+                results.append((DIFF_ONLY_IN2, join(rel, name), info2.is_dir, ()))
+        common = {
+            name: (info1, entries2[name]) for name, info1 in entries1.items()
+            if not info1.is_dir and name in entries2 and not entries2[name].is_dir
+        }
+        results.extend(compact(d, rel) for d in modified_files(common, mode, _engine, algorithm=algorithm))
+    results.sort(key=lambda result: (result[1], result[0]))
+    return results
+
+def expand(result):
+    status, path, is_dir, changed = result
+    if status != DIFF_MODIFIED:
+        return Difference(status, path, is_dir)
+    return Difference(status, path, is_dir, {key: key in changed for key in CHANGE_KEYS})
+
+def iter_sharded_differences(dir1, dir2, mode=COMPARE_FULL, processes=None, algorithm=None, index1=None, index2=None,
+                             cache=default_cache, progress=None, ignore=None, detect_moves=False):
+    differences = iter_shard_results(dir1, dir2, mode, processes, algorithm, index1, index2, cache, progress, ignore)
+    if detect_moves:
+        # Перенос может пересекать границы единиц -> ищется в родительском процессе по итогам всех единиц
+        side1 = (lambda rel_path: disk_files(dir1, rel_path, ignore), LiveSource(default_engine))
+        side2 = (lambda rel_path: disk_files(dir2, rel_path, ignore), LiveSource(default_engine))
+        differences = iter_moves(differences, side1, side2, mode, algorithm, progress)
+    return differences
+
+def iter_shard_results(dir1, dir2, mode, processes, algorithm, index1, index2, cache, progress, ignore):
+    processes = processes or DEFAULT_PROCESSES
+    algorithm = resolve_algorithm(algorithm)
+    # Пропущенное считают индексы: они обходят оба дерева целиком с теми же правилами, что и процессы
+    with metrics.phase('scan'):
+        index1 = index1 or DirSizeIndex(dir1, progress, ignore)
+        index2 = index2 or DirSizeIndex(dir2, progress, ignore)
+    units = plan_units(dir1, dir2, mode, processes, index1, index2)
+    metrics.count('shards', len(units))
+    if progress is not None:
+        progress.set_total(sum(unit[2] for unit in units))
+
+    modified_dirs = set()
+    executor = ProcessPoolExecutor(processes, initializer=init_worker,
+                                   initargs=(cache.path if cache else None, THREADS_PER_PROCESS))
+    try:
+        # Тяжёлые единицы запускаются первыми, а результаты выдаются в порядке путей
+        futures = {}
+        for rel, recursive, unit_weight in sorted(units, key=lambda unit: -unit[2]):
+            futures[rel, recursive] = executor.submit(compare_unit, dir1, dir2, rel, recursive, mode, algorithm,
+                                                     ignore)
+        for rel, recursive, unit_weight in sorted(units, key=lambda unit: (unit[0], unit[1])):
+            future = futures[rel, recursive]
+            while not future.done():
+                check_progress(progress)
+                wait([future], timeout=0.1, return_when=FIRST_COMPLETED)
+            for result in future.result():
+                parent = os.path.dirname(result[1])
+                while parent and parent not in modified_dirs:
+                    modified_dirs.add(parent)
+                    parent = os.path.dirname(parent)
+                yield expand(result)
+            check_progress(progress, files=unit_weight, path=rel)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+    for path in sorted(modified_dirs):
+        yield Difference(DIFF_MODIFIED, path, True)
@@ -1,50 +1,282 @@
 import os
+import time
+import zlib
 import shutil
+import struct
 import tempfile
 import zipfile
-from ads import list_ads_files
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from streams import list_streams, open_stream
+from hasher import DEFAULT_WORKERS, BUFFER_SIZE
+from dirindex import DirSizeIndex
+from jobs import check_progress
+import metrics
 
-def create_snapshot(directory, use_ads):
-    snapshot_dir = tempfile.mkdtemp()
+COMPRESSION_TYPES = {
+    'store': zipfile.ZIP_STORED,
+    'deflate': zipfile.ZIP_DEFLATED,
+    'bzip2': zipfile.ZIP_BZIP2,
+    'xz': zipfile.ZIP_LZMA
+}
+if hasattr(zipfile, 'ZIP_ZSTANDARD'):
+    COMPRESSION_TYPES['zstd'] = zipfile.ZIP_ZSTANDARD
 
+DEFAULT_COMPRESSION = 'deflate'
+# Эти методы сжимаются в пуле потоков и дописываются в архив готовыми; остальные - через zipfile по одному
+PARALLEL_TYPES = (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED)
+# Сжатый член держится в памяти до этого размера, больше - уходит во временный файл
+SPOOL_LIMIT = 1024 * 1024
+# Файлы до этого размера читаются заранее в пуле потоков; крупные пишутся потоком без буфера в памяти
+PREFETCH_LIMIT = 1024 * 1024
+# Как в zipfile: с этого размера или смещения нужны записи ZIP64
+ZIP64_LIMIT = (1 << 31) - 1
+
+def iter_snapshot_members(directory, use_ads, ignore=None):
     for root, dirs, files in os.walk(directory):
+        if ignore:
+            rel_root = os.path.relpath(root, directory)
+            rel_root = '' if rel_root == os.curdir else rel_root.replace(os.sep, '/')
+            # Исключённые каталоги убираются из dirs, и os.walk в них не заходит
+            dirs[:] = [name for name in dirs if not ignore.skip(f"{rel_root}/{name}" if rel_root else name, True)]
+            files = [name for name in files if not ignore.skip(f"{rel_root}/{name}" if rel_root else name)]
         for dir_name in dirs:
             src_dir = os.path.join(root, dir_name)
-            rel_path = os.path.relpath(src_dir, directory)
-            dest_dir = os.path.join(snapshot_dir, rel_path)
-            os.makedirs(dest_dir, exist_ok=True)
+            yield src_dir, os.path.relpath(src_dir, directory), None
 
         for file_name in files:
             src_file = os.path.join(root, file_name)
+            if os.path.islink(src_file) and not os.path.exists(src_file):
+                # Битая ссылка: читать нечего
+                continue
             rel_path = os.path.relpath(src_file, directory)
-            dest_file = os.path.join(snapshot_dir, rel_path)
-            shutil.copy2(src_file, dest_file)
-            
+            yield src_file, rel_path, None
+
             if use_ads:
-                ads_files = list_ads_files(src_file)
-                for ads_file, ads_size in ads_files:
-                    try:
-                        base_file_name, stream_name = ads_file.rsplit(':', 1)
-                        ads_file_name = f"{os.path.basename(base_file_name)}.{stream_name}.ads"
-                        ads_rel_path = os.path.join(os.path.relpath(root, directory), ads_file_name)
-                        ads_dest_file = os.path.join(snapshot_dir, ads_rel_path)
-                        os.makedirs(os.path.dirname(ads_dest_file), exist_ok=True)
-                        
-                        with open(f"{base_file_name}:{stream_name}", 'rb') as src, open(ads_dest_file, 'wb') as dest:
-                            shutil.copyfileobj(src, dest)
-                    except Exception as e:
-                        pass
-
-    snapshot_zip = tempfile.mktemp(suffix='.zip')
-    shutil.make_archive(snapshot_zip.replace('.zip', ''), 'zip', snapshot_dir)
-
-    shutil.rmtree(snapshot_dir)
-
-    return snapshot_zip
+                for stream_name, ads_size in list_streams(src_file):
+                    ads_file_name = f"{file_name}.{stream_name}.ads"
+                    ads_rel_path = os.path.normpath(os.path.join(os.path.relpath(root, directory), ads_file_name))
+                    yield stream_name, ads_rel_path, src_file
+
+def open_member(src, ads_owner=None):
+    # Для альтернативного потока src - имя потока, читается через бэкенд платформы
+    return open_stream(ads_owner, src) if ads_owner is not None else open(src, 'rb')
+
+def read_member(src, ads_owner=None):
+    with open_member(src, ads_owner) as f:
+        return f.read()
+
+class CompressedMember:
+    __slots__ = ('crc', 'file_size', 'compress_size', 'data')
+
+    def __init__(self, crc, file_size, compress_size, data):
+        self.crc = crc
+        self.file_size = file_size
+        self.compress_size = compress_size
+        self.data = data
+
+def compress_member(src, ads_owner, compress_type, level):
+    # Выполняется в пуле: чтение, CRC и сжатие в raw deflate (wbits=-15), как его хранит zip
+    if compress_type == zipfile.ZIP_DEFLATED:
+        compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION if level is None else level, zlib.DEFLATED, -15)
+    else:
+        compressor = None
+    data = tempfile.SpooledTemporaryFile(SPOOL_LIMIT)
+    crc = file_size = 0
+    try:
+        with open_member(src, ads_owner) as f:
+            for chunk in iter(lambda: f.read(BUFFER_SIZE), b''):
+                crc = zlib.crc32(chunk, crc)
+                file_size += len(chunk)
+                data.write(compressor.compress(chunk) if compressor else chunk)
+        if compressor:
+            data.write(compressor.flush())
+        compress_size = data.tell()
+        data.seek(0)
+    except BaseException:
+        data.close()
+        raise
+    return CompressedMember(crc, file_size, compress_size, data)
+
+def dos_date_time(date_time):
+    year, month, day, hour, minute, second = date_time
+    return (year - 1980) << 9 | month << 5 | day, hour << 11 | minute << 5 | second // 2
+
+class ZipWriter:
+    # Члены приходят уже сжатыми: здесь только заголовки, копирование данных и центральный каталог.
+    # Формат по спецификации PKWARE APPNOTE, включая ZIP64 для крупных файлов и архивов
+    def __init__(self, f):
+        self.f = f
+        self.entries = []
+
+    def add(self, zinfo, member):
+        offset = self.f.tell()
+        name = zinfo.filename.encode('utf-8')
+        flags = 0 if zinfo.filename.isascii() else 0x800
+        zip64 = member.file_size >= ZIP64_LIMIT or member.compress_size >= ZIP64_LIMIT
+        extra = struct.pack('<HHQQ', 1, 16, member.file_size, member.compress_size) if zip64 else b''
+        version = 45 if zip64 else 20
+        dosdate, dostime = dos_date_time(zinfo.date_time)
+        self.f.write(struct.pack(
+            '<4sHHHHHIIIHH', b'PK\x03\x04', version, flags, zinfo.compress_type, dostime, dosdate, member.crc,
+            0xFFFFFFFF if zip64 else member.compress_size, 0xFFFFFFFF if zip64 else member.file_size,
+            len(name), len(extra)
+        ))
+        self.f.write(name)
+        self.f.write(extra)
+        if member.data is not None:
+            with member.data:
+                shutil.copyfileobj(member.data, self.f, BUFFER_SIZE)
+        self.entries.append((zinfo, name, flags, member, offset))
+
+    def central_entry(self, zinfo, name, flags, member, offset):
+        # В ZIP64-дополнении только поля, не поместившиеся в заголовок, в порядке спецификации
+        sizes = [member.file_size, member.compress_size, offset]
+        large = [value for value in sizes if value >= ZIP64_LIMIT]
+        extra = struct.pack(f'<HH{len(large)}Q', 1, 8 * len(large), *large) if large else b''
+        file_size, compress_size, offset = (0xFFFFFFFF if value >= ZIP64_LIMIT else value for value in sizes)
+        version = 45 if large else 20
+        dosdate, dostime = dos_date_time(zinfo.date_time)
+        return struct.pack(
+            '<4sBBHHHHHIIIHHHHHII', b'PK\x01\x02', version, zinfo.create_system, version, flags,
+            zinfo.compress_type, dostime, dosdate, member.crc, compress_size, file_size, len(name), len(extra), 0, 0, 0,
+            zinfo.external_attr, offset
+        ) + name + extra
+
+    def close(self):
+        start = self.f.tell()
+        for entry in self.entries:
+            self.f.write(self.central_entry(*entry))
+        size = self.f.tell() - start
+        count = len(self.entries)
+        if count >= 0xFFFF or start >= ZIP64_LIMIT or size >= ZIP64_LIMIT:
+            end64 = self.f.tell()
+            self.f.write(struct.pack('<4sQHHIIQQQQ', b'PK\x06\x06', 44, 45, 45, 0, 0, count, count, size, start))
+            self.f.write(struct.pack('<4sIQI', b'PK\x06\x07', 0, end64, 1))
+        self.f.write(struct.pack(
+            '<4sHHHHIIH', b'PK\x05\x06', 0, 0, min(count, 0xFFFF), min(count, 0xFFFF),
+            min(size, 0xFFFFFFFF), min(start, 0xFFFFFFFF), 0
+        ))
+
+def create_snapshot(directory, use_ads, output=None, compression=DEFAULT_COMPRESSION, level=None, workers=None,
+                    progress=None, ignore=None):
+    compress_type = COMPRESSION_TYPES[compression]
+    workers = workers or DEFAULT_WORKERS
+    if progress is not None:
+        # Индекс размеров даёт общий объём заранее -> можно показать оставшееся время
+        index = DirSizeIndex(directory, progress, ignore.copy() if ignore else None)
+        progress.set_total(index.file_count(directory), index.size(directory))
+    if output is None:
+        fd, output = tempfile.mkstemp(suffix='.zip')
+        os.close(fd)
+
+    try:
+        with metrics.phase('snapshot'):
+            write_snapshot(directory, use_ads, output, compress_type, level, workers, progress, ignore)
+    except BaseException:
+        if os.path.exists(output):
+            os.remove(output)
+        raise
+    return output
+
+def snapshot_zinfo(src, arcname, ads_owner):
+    if ads_owner is not None:
+        zinfo = zipfile.ZipInfo(arcname, time.localtime(os.path.getmtime(ads_owner))[:6])
+        # Как writestr: без прав доступа файл после распаковки был бы недоступен
+        zinfo.external_attr = 0o600 << 16
+        return zinfo
+    return zipfile.ZipInfo.from_file(src, arcname)
+
+def write_snapshot(directory, use_ads, output, compress_type, level, workers, progress=None, ignore=None):
+    if compress_type not in PARALLEL_TYPES:
+        return write_zipfile(directory, use_ads, output, compress_type, level, workers, progress, ignore)
+    empty = CompressedMember(0, 0, 0, None)
+    with open(output, 'wb') as f, ThreadPoolExecutor(max_workers=workers) as executor:
+        writer = ZipWriter(f)
+        pending = deque()
+
+        # Сжатие в пуле, запись в этом потоке в исходном порядке; в очереди не больше workers * 2 членов,
+        # у каждого в памяти не больше SPOOL_LIMIT
+        def flush(limit):
+            while len(pending) > limit:
+                zinfo, future, is_ads = pending.popleft()
+                try:
+                    member = future.result() if future else empty
+                except OSError:
+                    # Недоступный альтернативный поток не должен прерывать снимок
+                    if not is_ads:
+                        raise
+                    continue
+                writer.add(zinfo, member)
+                if not is_ads and not zinfo.is_dir():
+                    check_progress(progress, files=1, bytes=member.file_size, path=zinfo.filename)
+                metrics.count('files_archived')
+                metrics.count('bytes_read', member.file_size)
+
+        try:
+            for src, arcname, ads_owner in iter_snapshot_members(directory, use_ads, ignore):
+                check_progress(progress)
+                zinfo = snapshot_zinfo(src, arcname, ads_owner)
+                if zinfo.is_dir():
+                    pending.append((zinfo, None, False))
+                else:
+                    zinfo.compress_type = compress_type
+                    pending.append((zinfo, executor.submit(compress_member, src, ads_owner, compress_type, level),
+                                    ads_owner is not None))
+                flush(workers * 2)
+            flush(0)
+        finally:
+            # При отмене или ошибке закрываем временные файлы уже сжатых членов
+            for zinfo, future, is_ads in pending:
+                if future and not future.cancel() and future.exception() is None:
+                    future.result().data.close()
+        writer.close()
+
+def write_zipfile(directory, use_ads, output, compress_type, level, workers, progress=None, ignore=None):
+    with zipfile.ZipFile(output, 'w', compress_type, compresslevel=level) as zf, \
+            ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+
+        # Только открытый API zipfile: пул читает небольшие файлы заранее, сжатие и запись идут
+        # в этом потоке в исходном порядке через writestr/write
+        def flush(limit):
+            while len(pending) > limit:
+                zinfo, future, is_ads = pending.popleft()
+                try:
+                    data = future.result()
+                except OSError:
+                    # Недоступный альтернативный поток не должен прерывать снимок
+                    if not is_ads:
+                        raise
+                    continue
+                zf.writestr(zinfo, data, compress_type, level)
+                if not is_ads:
+                    check_progress(progress, files=1, bytes=len(data), path=zinfo.filename)
+                metrics.count('files_archived')
+                metrics.count('bytes_read', len(data))
+
+        for src, arcname, ads_owner in iter_snapshot_members(directory, use_ads, ignore):
+            check_progress(progress)
+            is_ads = ads_owner is not None
+            zinfo = snapshot_zinfo(src, arcname, ads_owner)
+            if zinfo.is_dir():
+                flush(0)
+                zf.write(src, arcname)
+                continue
+            if zinfo.file_size > PREFETCH_LIMIT:
+                flush(0)
+                zf.write(src, arcname)
+                check_progress(progress, files=1, bytes=zinfo.file_size, path=arcname)
+                metrics.count('files_archived')
+                metrics.count('bytes_read', zinfo.file_size)
+            else:
+                pending.append((zinfo, executor.submit(read_member, src, ads_owner), is_ads))
+                flush(workers * 2)
+        flush(0)
 
 def save_snapshot(snapshot_zip, filepath):
     shutil.move(snapshot_zip, filepath)
 
 def load_snapshot(filepath, target_directory):
     with zipfile.ZipFile(filepath, 'r') as zip_ref:
-        zip_ref.extractall(target_directory)
\ No newline at end of file
+        zip_ref.extractall(target_directory)
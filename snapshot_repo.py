@@ -0,0 +1,199 @@
+import os
+import time
+import zlib
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, Future, FIRST_COMPLETED, wait
+from collections import defaultdict
+from hasher import default_engine, new_hash, resolve_algorithm, DEFAULT_WORKERS, BUFFER_SIZE, SAMPLE_SIZE
+from scanner import scan_directory, descends
+from compare import compare_directories, COMPARE_FULL
+from manifest import MANIFEST_EXT, manifest_header, make_record, write_records, read_manifest
+
+class SnapshotRepository:
+    def __init__(self, path, workers=None, engine=None):
+        self.path = path
+        self.objects_dir = os.path.join(path, 'objects')
+        self.snapshots_dir = os.path.join(path, 'snapshots')
+        self.workers = workers or DEFAULT_WORKERS
+        self.max_pending = self.workers * 2
+        self.engine = engine or default_engine
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.snapshots_dir, exist_ok=True)
+
+    def list_snapshots(self):
+        suffix = MANIFEST_EXT + '.gz'
+        return sorted(f[:-len(suffix)] for f in os.listdir(self.snapshots_dir) if f.endswith(suffix))
+
+    def latest(self):
+        snapshots = self.list_snapshots()
+        return snapshots[-1] if snapshots else None
+
+    def manifest_path(self, snapshot_id):
+        return os.path.join(self.snapshots_dir, snapshot_id + MANIFEST_EXT + '.gz')
+
+    def object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def has_object(self, digest):
+        return os.path.exists(self.object_path(digest))
+
+    def store_file(self, file_path, algorithm):
+        hash_object = new_hash(algorithm)
+        compressor = zlib.compressobj(6)
+        fd, tmp_path = tempfile.mkstemp(dir=self.objects_dir, suffix='.tmp')
+        try:
+            with open(file_path, 'rb') as src, os.fdopen(fd, 'wb') as dest:
+                for chunk in iter(lambda: src.read(BUFFER_SIZE), b''):
+                    hash_object.update(chunk)
+                    dest.write(compressor.compress(chunk))
+                dest.write(compressor.flush())
+            digest = hash_object.hexdigest()
+            object_path = self.object_path(digest)
+            if os.path.exists(object_path):
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(object_path), exist_ok=True)
+                os.replace(tmp_path, object_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return digest
+
+    def previous_records(self):
+        latest = self.latest()
+        if latest is None:
+            return None, {}
+        header, records = read_manifest(self.manifest_path(latest))
+        return header.get('algorithm'), {record['path']: record for record in records if record['type'] == 'f'}
+
+    def submit(self, executor, pending, function, *args):
+        # Как в HashEngine.hash_files: в очереди пула не больше max_pending задач
+        if len(pending) >= self.max_pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            pending -= done
+        future = executor.submit(function, *args)
+        pending.add(future)
+        return future
+
+    def reuse_moved(self, info, candidates, algorithm):
+        # Файл по новому пути: ищем то же содержимое среди прежних файлов того же размера.
+        # Выборка покрывает файл до 2 * SAMPLE_SIZE целиком, для крупных совпадение подтверждает полный хеш
+        sample = self.engine.sample_file(info.path, algorithm)
+        digest = None
+        for old in candidates:
+            if old.get('sample') != sample or not self.has_object(old['hash']):
+                continue
+            if info.size <= 2 * SAMPLE_SIZE:
+                return old['hash'], sample, True
+            digest = digest or self.engine.hash_file(info.path, algorithm)
+            if digest == old['hash']:
+                return digest, sample, True
+        return self.store_file(info.path, algorithm), sample, False
+
+    def iter_records(self, directory, use_ads, previous, stats, algorithm):
+        by_size = defaultdict(list)
+        for old in previous.values():
+            if old.get('hash') and old.get('sample') and old['size']:
+                by_size[old['size']].append(old)
+        pending = set()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            stack = ['']
+            while stack:
+                prefix = stack.pop()
+                infos = scan_directory(os.path.join(directory, prefix) if prefix else directory)
+                stored = {}
+                for name, info in infos.items():
+                    if info.is_dir:
+                        continue
+                    rel_path = f"{prefix}/{name}" if prefix else name
+                    old = previous.get(rel_path)
+                    # Размер и mtime не изменились -> файл не читаем, берём хеш из прошлого снимка
+                    if old and old.get('hash') and old['size'] == info.size and old['mtime_ns'] == info.mtime_ns \
+                            and self.has_object(old['hash']):
+                        stored[name] = (old['hash'], old.get('sample'))
+                        stats['reused'] += 1
+                    elif info.size in by_size:
+                        # Прежний файл того же размера -> возможно перемещение, объект не пишем повторно
+                        stored[name] = self.submit(executor, pending, self.reuse_moved, info, by_size[info.size],
+                                                   algorithm)
+                    else:
+                        stored[name] = (
+                            self.submit(executor, pending, self.store_file, info.path, algorithm),
+                            self.submit(executor, pending, self.engine.sample_file, info.path, algorithm)
+                        )
+                        stats['stored'] += 1
+                        stats['bytes_read'] += info.size
+                for name in sorted(infos):
+                    info = infos[name]
+                    rel_path = f"{prefix}/{name}" if prefix else name
+                    if info.is_dir:
+                        yield make_record(rel_path, info, use_ads)
+                        if descends(info):
+                            stack.append(rel_path)
+                    else:
+                        if isinstance(stored[name], Future):
+                            digest, sample, moved = stored[name].result()
+                            stats['moved' if moved else 'stored'] += 1
+                            if not moved:
+                                stats['bytes_read'] += info.size
+                            yield make_record(rel_path, info, use_ads, digest, sample)
+                            continue
+                        digest, sample = stored[name]
+                        if not isinstance(digest, str):
+                            digest, sample = digest.result(), sample.result()
+                        yield make_record(rel_path, info, use_ads, digest, sample)
+
+    def create(self, directory, use_ads=False, algorithm=None):
+        snapshot_id = time.strftime('%Y%m%d-%H%M%S')
+        existing = set(self.list_snapshots())
+        suffix = 1
+        base_id = snapshot_id
+        while snapshot_id in existing:
+            snapshot_id = f"{base_id}-{suffix}"
+            suffix += 1
+
+        stats = {'stored': 0, 'reused': 0, 'moved': 0, 'bytes_read': 0}
+        previous_algorithm, previous = self.previous_records()
+        # Алгоритм берётся из прошлого снимка, чтобы его хеши можно было переиспользовать
+        algorithm = resolve_algorithm(algorithm or previous_algorithm)
+        if algorithm == 'crc32':
+            raise ValueError("Snapshot objects are addressed by their hash, crc32 is too weak for that")
+        if algorithm != previous_algorithm:
+            previous = {}
+        header = manifest_header(directory, use_ads, algorithm=algorithm)
+        header['snapshot'] = snapshot_id
+        tmp_path = os.path.join(self.snapshots_dir, snapshot_id + '.tmp.gz')
+        write_records(tmp_path, header, self.iter_records(directory, use_ads, previous, stats, algorithm))
+        os.replace(tmp_path, self.manifest_path(snapshot_id))
+        return snapshot_id, stats
+
+    def open_object(self, digest):
+        decompressor = zlib.decompressobj()
+        with open(self.object_path(digest), 'rb') as f:
+            for chunk in iter(lambda: f.read(BUFFER_SIZE), b''):
+                yield decompressor.decompress(chunk)
+        yield decompressor.flush()
+
+    def restore(self, snapshot_id, target_directory):
+        _, records = read_manifest(self.manifest_path(snapshot_id))
+        os.makedirs(target_directory, exist_ok=True)
+        dirs = []
+        for record in records:
+            target = os.path.join(target_directory, *record['path'].split('/'))
+            if record['type'] == 'd':
+                os.makedirs(target, exist_ok=True)
+                dirs.append((target, record['mtime_ns']))
+                continue
+            with open(target, 'wb') as f:
+                for chunk in self.open_object(record['hash']):
+                    f.write(chunk)
+            os.utime(target, ns=(record['mtime_ns'], record['mtime_ns']))
+        # Время каталогов выставляем в конце, иначе запись файлов его изменит
+        for target, mtime_ns in reversed(dirs):
+            os.utime(target, ns=(mtime_ns, mtime_ns))
+
+    def compare(self, snapshot_id, other, mode=COMPARE_FULL):
+        if other in self.list_snapshots():
+            other = self.manifest_path(other)
+        return compare_directories(other, self.manifest_path(snapshot_id), mode)
@@ -0,0 +1,139 @@
+import io
+import os
+import sys
+import ctypes
+import ctypes.util
+import threading
+from collections import OrderedDict
+import metrics
+
+MAX_CACHED_FILES = 100000
+
+class NullStreamBackend:
+    name = 'none'
+
+    def list_streams(self, path):
+        return []
+
+    def open_stream(self, path, stream):
+        raise FileNotFoundError(f"{path} has no stream {stream}")
+
+class NtfsStreamBackend:
+    # Имена и размеры берутся из FindFirstStreamW/FindNextStreamW, содержимое потоков не читается
+    name = 'ntfs'
+
+    def __init__(self):
+        from pyads import WIN32_FIND_STREAM_DATA
+        self.find_data = WIN32_FIND_STREAM_DATA
+        self.kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+        self.kernel32.FindFirstStreamW.restype = ctypes.c_void_p
+        self.kernel32.FindFirstStreamW.argtypes = (ctypes.c_wchar_p, ctypes.c_int, ctypes.c_void_p, ctypes.c_ulong)
+        self.kernel32.FindNextStreamW.argtypes = (ctypes.c_void_p, ctypes.c_void_p)
+        self.kernel32.FindClose.argtypes = (ctypes.c_void_p,)
+
+    def list_streams(self, path):
+        data = self.find_data()
+        handle = self.kernel32.FindFirstStreamW(path, 0, ctypes.byref(data), 0)
+        if handle is None or handle == ctypes.c_void_p(-1).value:
+            return []
+        streams = []
+        try:
+            while True:
+                # Имя вида ':name:$DATA', основной поток - '::$DATA'
+                stream = data.cStreamName.split(':')[1]
+                if stream:
+                    streams.append((stream, data.StreamSize.QuadPart))
+                if not self.kernel32.FindNextStreamW(handle, ctypes.byref(data)):
+                    break
+        finally:
+            self.kernel32.FindClose(handle)
+        return streams
+
+    def open_stream(self, path, stream):
+        return open(f"{path}:{stream}", 'rb')
+
+class XattrStreamBackend:
+    # Расширенные атрибуты Linux; размер узнаём вызовом lgetxattr с пустым буфером
+    name = 'xattr'
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.lgetxattr = libc.lgetxattr
+        self.lgetxattr.restype = ctypes.c_ssize_t
+        self.lgetxattr.argtypes = (ctypes.c_char_p, ctypes.c_char_p, ctypes.c_void_p, ctypes.c_size_t)
+
+    def stream_size(self, path, stream):
+        size = self.lgetxattr(os.fsencode(path), os.fsencode(stream), None, 0)
+        if size < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error), path)
+        return size
+
+    def list_streams(self, path):
+        return [(stream, self.stream_size(path, stream)) for stream in os.listxattr(path, follow_symlinks=False)]
+
+    def open_stream(self, path, stream):
+        return io.BytesIO(os.getxattr(path, stream, follow_symlinks=False))
+
+def open_backend():
+    try:
+        if sys.platform == 'win32':
+            return NtfsStreamBackend()
+        if hasattr(os, 'listxattr'):
+            return XattrStreamBackend()
+    except (OSError, AttributeError, ImportError):
+        pass
+    return NullStreamBackend()
+
+class StreamCache:
+    # Изменение потока или xattr меняет mtime или ctime файла -> они входят в ключ проверки
+    def __init__(self, backend, max_entries=MAX_CACHED_FILES):
+        self.backend = backend
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def list_streams(self, path, st=None):
+        try:
+            st = st or os.stat(path, follow_symlinks=False)
+        except OSError as e:
+            metrics.error('ads', "Error accessing streams of %s: %s", path, e)
+            return []
+        key = (st.st_dev, st.st_ino) if st.st_ino else path
+        stamp = (st.st_mtime_ns, st.st_ctime_ns, st.st_size)
+        with self._lock:
+            cached = self.entries.get(key)
+            if cached and cached[0] == stamp:
+                self.entries.move_to_end(key)
+                metrics.count('stream_cache_hits')
+                return cached[1]
+        with metrics.phase('ads'):
+            try:
+                streams = self.backend.list_streams(path)
+            except OSError as e:
+                metrics.error('ads', "Error accessing streams of %s: %s", path, e)
+                return []
+        with self._lock:
+            self.entries[key] = (stamp, streams)
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return streams
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+
+backend = open_backend()
+default_cache = StreamCache(backend)
+
+def list_streams(path, st=None):
+    return default_cache.list_streams(path, st)
+
+def open_stream(path, stream):
+    return backend.open_stream(path, stream)
+
+def stream_digest(path, stream, size, algorithm=None, engine=None):
+    from hasher import default_engine, ALGORITHM
+    engine = engine or default_engine
+    with open_stream(path, stream) as f:
+        return engine.hash_stream(f, size, algorithm or ALGORITHM)
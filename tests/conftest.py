@@ -0,0 +1,36 @@
+import os
+import sys
+import atexit
+import shutil
+import tempfile
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# hasher создаёт default_cache при импорте: до импорта уводим кеш из профиля пользователя
+# (LOCALAPPDATA, XDG_CACHE_HOME или ~/.cache) во временный каталог
+CACHE_HOME = tempfile.mkdtemp(prefix='folderwatcher-tests-')
+atexit.register(shutil.rmtree, CACHE_HOME, ignore_errors=True)
+os.environ.pop('LOCALAPPDATA', None)
+os.environ['XDG_CACHE_HOME'] = CACHE_HOME
+
+import hasher
+from hasher import HashEngine
+
+assert hasher.default_cache.path.startswith(CACHE_HOME)
+
+MTIME_NS = 1_600_000_000 * 10**9
+
+def write(path, data, mtime_ns=MTIME_NS):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+    return path
+
+@pytest.fixture
+def engine():
+    # Без кеша, чтобы тесты не зависели друг от друга
+    engine = HashEngine(workers=2, cache=None)
+    yield engine
+    engine.close()
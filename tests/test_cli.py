@@ -0,0 +1,51 @@
+import os
+import csv
+import json
+import folderwatcher
+from folderwatcher import main, EXIT_IDENTICAL, EXIT_DIFFERENT, EXIT_ERROR
+from conftest import write
+
+def make_trees(tmp_path):
+    dir1, dir2 = str(tmp_path / 'one'), str(tmp_path / 'two')
+    for root in (dir1, dir2):
+        write(os.path.join(root, 'same.txt'), b'same')
+        write(os.path.join(root, 'sub', 'changed.txt'), b'before' if root == dir1 else b'after!')
+    write(os.path.join(dir1, 'only1.txt'), b'1')
+    return dir1, dir2
+
+def test_exit_codes(tmp_path, capsys):
+    dir1, dir2 = make_trees(tmp_path)
+    assert main(['compare', dir1, dir1, '-r']) == EXIT_IDENTICAL
+    assert main(['compare', dir1, dir2, '-r']) == EXIT_DIFFERENT
+    assert main(['compare', dir1, str(tmp_path / 'missing')]) == EXIT_ERROR
+    assert 'does not exist' in capsys.readouterr().err
+
+def test_ndjson_output(tmp_path, capsys):
+    dir1, dir2 = make_trees(tmp_path)
+    main(['compare', dir1, dir2, '-r'])
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    by_path = {record['path']: record for record in records}
+    assert by_path['only1.txt'] == {'status': 'only_in1', 'type': 'file', 'path': 'only1.txt'}
+    assert by_path['sub/changed.txt']['changes'] == ['hash']
+    assert by_path['sub'] == {'status': 'modified', 'type': 'dir', 'path': 'sub'}
+
+def test_csv_output_to_file(tmp_path):
+    dir1, dir2 = make_trees(tmp_path)
+    output = str(tmp_path / 'out.csv')
+    assert main(['compare', dir1, dir2, '-r', '--format', 'csv', '-o', output]) == EXIT_DIFFERENT
+    with open(output, newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    assert {row['path']: row['changes'] for row in rows if row['type'] == 'file'} == \
+        {'only1.txt': '', 'sub/changed.txt': 'hash'}
+
+def test_unexpected_errors_exit_with_error_code(tmp_path, monkeypatch):
+    dir1, dir2 = make_trees(tmp_path)
+    manifest = str(tmp_path / 'bad.fwm')
+    with open(manifest, 'w', encoding='utf-8') as f:
+        f.write('{"format": "folderwatcher-manifest", "version": 1}\n{"path": "x"}\n')
+    assert main(['compare', dir1, manifest]) == EXIT_ERROR
+
+    def crash(*args, **kwargs):
+        raise RuntimeError("worker died")
+    monkeypatch.setattr(folderwatcher, 'iter_sharded_differences', crash)
+    assert main(['compare', dir1, dir2, '-r', '-j', '2']) == EXIT_ERROR
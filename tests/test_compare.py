@@ -0,0 +1,49 @@
+import os
+from compare import compare_directories, digests_differ, COMPARE_QUICK, COMPARE_SAMPLED, COMPARE_FULL
+from hasher import HashEngine, SAMPLE_SIZE
+from conftest import write
+
+def make_pair(tmp_path, data1, data2, name='f.bin'):
+    dir1, dir2 = str(tmp_path / 'one'), str(tmp_path / 'two')
+    write(os.path.join(dir1, name), data1)
+    write(os.path.join(dir2, name), data2)
+    return dir1, dir2
+
+def changes(dir1, dir2, mode, engine):
+    return compare_directories(dir1, dir2, mode, engine)[0]
+
+def test_digests_differ_treats_missing_digest_as_difference():
+    assert digests_differ(None, None)
+    assert digests_differ('a', None)
+    assert not digests_differ('a', 'a')
+
+def test_tiers_on_same_size_change_in_the_middle(tmp_path, engine):
+    data = bytearray(4 * SAMPLE_SIZE)
+    changed = bytearray(data)
+    changed[2 * SAMPLE_SIZE] = 1
+    dir1, dir2 = make_pair(tmp_path, bytes(data), bytes(changed))
+    # Середина файла в выборку не попадает: её видит только полный хеш
+    assert changes(dir1, dir2, COMPARE_QUICK, engine) == {}
+    assert changes(dir1, dir2, COMPARE_SAMPLED, engine) == {}
+    assert changes(dir1, dir2, COMPARE_FULL, engine)['f.bin']['hash']
+
+def test_small_files_are_decided_by_sample(tmp_path, engine):
+    dir1, dir2 = make_pair(tmp_path, b'x' * 100, b'y' * 100)
+    assert changes(dir1, dir2, COMPARE_SAMPLED, engine)['f.bin']['hash']
+    assert changes(dir1, dir2, COMPARE_FULL, engine)['f.bin']['hash']
+
+def test_quick_mode_never_sets_hash_flag(tmp_path, engine):
+    dir1, dir2 = make_pair(tmp_path, b'same', b'diff')
+    os.utime(os.path.join(dir2, 'f.bin'), ns=(1, 1))
+    diff = changes(dir1, dir2, COMPARE_QUICK, engine)['f.bin']
+    assert diff['last_modified'] and not diff['hash']
+
+class BrokenEngine(HashEngine):
+    def hash_stream(self, f, size, algorithm='sha256', sampled=False, progress=None):
+        raise OSError("read error")
+
+def test_read_errors_are_reported_as_differences(tmp_path):
+    dir1, dir2 = make_pair(tmp_path, b'same' * 100000, b'same' * 100000)
+    engine = BrokenEngine(workers=2, cache=None)
+    for mode in (COMPARE_SAMPLED, COMPARE_FULL):
+        assert changes(dir1, dir2, mode, engine)['f.bin']['hash']
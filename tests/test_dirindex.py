@@ -0,0 +1,36 @@
+import os
+import shutil
+from conftest import write
+from dirindex import DirSizeIndex
+
+def test_refresh_entries_updates_parents_without_rescanning_siblings(tmp_path):
+    root = str(tmp_path)
+    write(os.path.join(root, 'a', 'one.bin'), b'x' * 10)
+    write(os.path.join(root, 'a', 'deep', 'two.bin'), b'x' * 20)
+    write(os.path.join(root, 'b', 'three.bin'), b'x' * 30)
+    index = DirSizeIndex(root)
+    assert index.get(root) == (60, 3)
+    assert index.get(os.path.join(root, 'a')) == (30, 2)
+
+    # Изменение в соседнем каталоге без обновления: индекс должен взять старое значение
+    write(os.path.join(root, 'a', 'deep', 'unseen.bin'), b'x' * 100)
+    write(os.path.join(root, 'b', 'four.bin'), b'x' * 5)
+    index.refresh_entries(os.path.join(root, 'b'))
+    assert index.get(os.path.join(root, 'b')) == (35, 2)
+    assert index.get(os.path.join(root, 'a', 'deep')) == (20, 1)
+    assert index.get(root) == (65, 4)
+
+    shutil.rmtree(os.path.join(root, 'a', 'deep'))
+    index.refresh_entries(os.path.join(root, 'a'))
+    assert os.path.join(root, 'a', 'deep') not in index
+    assert index.get(os.path.join(root, 'a')) == (10, 1)
+    assert index.get(root) == (45, 3)
+
+def test_adjust_propagates_to_parents(tmp_path):
+    root = str(tmp_path)
+    write(os.path.join(root, 'a', 'b', 'file.bin'), b'x' * 8)
+    index = DirSizeIndex(root)
+    index.adjust(os.path.join(root, 'a', 'b'), 4, 1)
+    assert index.get(os.path.join(root, 'a', 'b')) == (12, 2)
+    assert index.get(os.path.join(root, 'a')) == (12, 2)
+    assert index.get(root) == (12, 2)
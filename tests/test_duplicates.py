@@ -0,0 +1,32 @@
+import os
+from duplicates import iter_duplicates
+from hasher import SAMPLE_SIZE
+from conftest import write
+
+def test_hard_links_and_symlinks_are_not_duplicates(tmp_path, engine):
+    root = str(tmp_path)
+    data = os.urandom(1000)
+    original = write(os.path.join(root, 'original.bin'), data)
+    copy = write(os.path.join(root, 'sub', 'copy.bin'), data)
+    os.link(original, os.path.join(root, 'hardlink.bin'))
+    os.symlink(original, os.path.join(root, 'symlink.bin'))
+    write(os.path.join(root, 'unique.bin'), os.urandom(1000))
+    # Крупные файлы с одинаковой выборкой и разной серединой
+    large = bytearray(3 * SAMPLE_SIZE)
+    write(os.path.join(root, 'large1.bin'), bytes(large))
+    large[SAMPLE_SIZE + 1] = 1
+    write(os.path.join(root, 'large2.bin'), bytes(large))
+
+    for roots in ([root], [root, os.path.join(root, 'sub')]):
+        groups = list(iter_duplicates(roots, engine=engine))
+        assert len(groups) == 1
+        group = groups[0]
+        assert group.size == 1000 and len(group.paths) == 2
+        assert copy in group.paths
+        assert group.digest == engine.hash_file(copy)
+
+def test_verify_splits_by_bytes(tmp_path, engine):
+    data = os.urandom(5000)
+    paths = [write(str(tmp_path / f'{i}.bin'), data) for i in range(3)]
+    groups = list(iter_duplicates([str(tmp_path)], engine=engine, verify=True))
+    assert [sorted(group.paths) for group in groups] == [sorted(paths)]
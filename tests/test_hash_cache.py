@@ -0,0 +1,40 @@
+import os
+from types import SimpleNamespace
+from hash_cache import HashCache
+from hasher import HashEngine
+from conftest import write
+
+def fake_stat(ino, size=10, mtime_ns=1):
+    return SimpleNamespace(st_dev=1, st_ino=ino, st_size=size, st_mtime_ns=mtime_ns)
+
+def test_hit_and_miss(tmp_path):
+    cache = HashCache(str(tmp_path / 'hashes.db'))
+    st = fake_stat(1)
+    assert cache.get(st, 'sha256') is None
+    cache.put(st, 'sha256', 'abc')
+    assert cache.get(st, 'sha256') == 'abc'
+    assert cache.get(st, 'blake2b') is None
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 2
+    cache.close()
+
+def test_changed_file_is_not_served_from_cache(tmp_path):
+    cache = HashCache(str(tmp_path / 'hashes.db'))
+    engine = HashEngine(workers=1, cache=cache)
+    path = write(str(tmp_path / 'f.txt'), b'first')
+    assert engine.hash_file(path) == engine.hash_file(path)
+    assert cache.stats()['hits'] == 1
+    # Тот же inode и размер, другое время изменения -> хеш считается заново
+    write(path, b'other', mtime_ns=1_700_000_000 * 10**9)
+    assert engine.hash_file(path) == HashEngine(workers=1).hash_file(path)
+    assert cache.stats()['hits'] == 1
+    cache.close()
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = HashCache(str(tmp_path / 'hashes.db'), max_entries=2)
+    stats = [fake_stat(ino) for ino in (1, 2, 3)]
+    for st in stats:
+        cache.put(st, 'sha256', f'digest{st.st_ino}')
+    assert cache.get(stats[0], 'sha256') == 'digest1'
+    cache.evict()
+    assert [cache.get(st, 'sha256') for st in stats] == ['digest1', None, 'digest3']
+    cache.close()
@@ -0,0 +1,35 @@
+import hashlib
+from conftest import write
+from hasher import HashEngine
+
+def test_map_bounded_limits_pending_work(tmp_path):
+    paths = [write(str(tmp_path / f'{index}.bin'), bytes([index]) * 100) for index in range(50)]
+    engine = HashEngine(workers=2, max_pending=3, cache=None)
+    counts = {'taken': 0, 'consumed': 0, 'peak': 0}
+
+    def source():
+        for path in paths:
+            counts['taken'] += 1
+            counts['peak'] = max(counts['peak'], counts['taken'] - counts['consumed'])
+            yield path
+
+    try:
+        results = {}
+        for path, digest in engine.hash_files(source(), algorithm='sha256'):
+            counts['consumed'] += 1
+            results[path] = digest
+    finally:
+        engine.close()
+    # Следующий путь берётся из генератора до ожидания результатов, отсюда +1
+    assert counts['peak'] <= engine.max_pending + 1
+    assert results == {path: hashlib.sha256(open(path, 'rb').read()).hexdigest() for path in paths}
+
+def test_engine_reuses_one_executor(tmp_path, engine):
+    path = write(str(tmp_path / 'a.bin'), b'data')
+    engine.hash_map([path])
+    executor = engine._executor
+    engine.hash_map([path] * 4)
+    assert executor is not None and engine._executor is executor
+    engine.close()
+    assert engine._executor is None
+    assert engine.hash_map([path]) == {path: hashlib.sha256(b'data').hexdigest()}
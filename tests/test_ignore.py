@@ -0,0 +1,48 @@
+import os
+from ignore import IgnoreRules
+from dirindex import DirSizeIndex
+from listing import build_listing
+from records import build_record_store
+from conftest import write
+
+def test_last_matching_rule_wins():
+    rules = IgnoreRules(['*.log', '!keep.log', '# comment', ''])
+    assert rules.ignored('a.log')
+    assert rules.ignored('deep/dir/b.log')
+    assert not rules.ignored('keep.log')
+    assert not rules.ignored('a.txt')
+    assert rules.patterns == ['*.log', '!keep.log']
+
+def test_directory_and_anchored_rules():
+    rules = IgnoreRules(['build/', '/top.txt', 'docs/**/*.tmp'])
+    assert rules.ignored('build', True)
+    assert rules.ignored('src/build', True)
+    assert not rules.ignored('build', False)
+    assert rules.ignored('top.txt')
+    assert not rules.ignored('sub/top.txt')
+    assert rules.ignored('docs/a/b/c.tmp')
+    assert rules.ignored('docs/c.tmp')
+
+def test_ignored_directories_are_not_walked(tmp_path):
+    write(str(tmp_path / 'keep.txt'), b'1')
+    write(str(tmp_path / 'build' / 'out.o'), b'2')
+    write(str(tmp_path / 'src' / 'build' / 'out.o'), b'3')
+    rules = IgnoreRules(['build/'])
+    store = build_record_store(str(tmp_path), ignore=rules)
+    paths = {store.rel_path(row) for row in range(len(store.sizes))}
+    assert paths == {'keep.txt', 'src'}
+    assert rules.skipped_dirs == 2
+
+def test_pane_listing_skips_ignored_directories(tmp_path):
+    root = str(tmp_path)
+    write(os.path.join(root, 'node_modules', 'pkg', 'index.js'), b'x' * 100)
+    write(os.path.join(root, 'src', 'main.js'), b'y' * 10)
+    rules = IgnoreRules(['node_modules/'])
+    index = DirSizeIndex(root, ignore=rules)
+    listing = build_listing(root, index, ignore=rules)
+    assert sorted(entry.item.name for entry in listing.entries) == ['src']
+    assert os.path.join(root, 'node_modules') not in index
+    assert index.size(os.path.join(root, 'node_modules')) == 0
+    index.refresh(os.path.join(root, 'node_modules', 'pkg'))
+    assert os.path.join(root, 'node_modules', 'pkg') not in index
+    assert index.size(root) == 10
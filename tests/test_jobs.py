@@ -0,0 +1,43 @@
+import os
+import threading
+import pytest
+from conftest import write
+from compare import compare_directories, COMPARE_FULL
+from jobs import JobRunner, check_progress
+
+def test_compare_runs_headless_with_progress(tmp_path, engine):
+    for name in ('one', 'two'):
+        write(str(tmp_path / name / 'same.txt'), b'same')
+        write(str(tmp_path / name / 'sub' / 'diff.txt'), name.encode() * 3)
+    runner = JobRunner()
+    results = []
+    job = runner.start('compare', compare_directories, str(tmp_path / 'one'), str(tmp_path / 'two'), COMPARE_FULL,
+                       engine, recursive=True, on_done=results.append)
+    assert runner.is_busy('compare')
+    assert runner.wait(job, 10)
+    assert job.status == 'done' and not runner.is_busy('compare')
+    assert set(results[0][0]) == {os.path.join('sub', 'diff.txt')}
+    assert job.progress.files_done >= 2 and job.progress.snapshot()['current_path']
+
+def test_cancel_stops_job_and_releases_key():
+    started = threading.Event()
+    reports = []
+    cancelled = []
+
+    def endless(progress=None):
+        progress.interval = 0
+        while True:
+            check_progress(progress, files=1, bytes=10, path='file')
+            started.set()
+
+    runner = JobRunner()
+    job = runner.start(['left', 'right'], endless, on_progress=reports.append, on_cancel=lambda: cancelled.append(True),
+                       on_done=lambda result: pytest.fail("cancelled job finished"))
+    assert started.wait(10)
+    with pytest.raises(RuntimeError):
+        runner.start('left', endless)
+    runner.cancel('right')
+    assert runner.wait(job, 10)
+    assert job.status == 'cancelled' and cancelled == [True]
+    assert not runner.is_busy('left', 'right')
+    assert reports and reports[0]['files_done'] >= 1 and reports[0]['bytes_done'] >= 10
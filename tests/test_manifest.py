@@ -0,0 +1,53 @@
+import os
+from compare import compare_paths, COMPARE_FULL, COMPARE_QUICK
+from manifest import write_manifest, read_manifest, load_manifest_tree
+from hasher import SAMPLE_SIZE
+from conftest import write
+
+def build_tree(root):
+    write(os.path.join(root, 'small.txt'), b'hello')
+    write(os.path.join(root, 'sub', 'large.bin'), os.urandom(3 * SAMPLE_SIZE + 5))
+    write(os.path.join(root, 'sub', 'empty'), b'')
+    os.makedirs(os.path.join(root, 'empty_dir'))
+
+def test_manifest_round_trip(tmp_path, engine):
+    root = str(tmp_path / 'tree')
+    build_tree(root)
+    manifest = write_manifest(root, str(tmp_path / 'tree.fwm'), engine=engine)
+
+    header, records = read_manifest(manifest)
+    records = {record['path']: record for record in records}
+    assert header['algorithm'] == 'sha256'
+    assert set(records) == {'small.txt', 'sub', 'sub/large.bin', 'sub/empty', 'empty_dir'}
+    large = os.path.join(root, 'sub', 'large.bin')
+    assert records['sub/large.bin']['hash'] == engine.hash_file(large)
+    assert records['sub/large.bin']['sample'] == engine.sample_file(large)
+
+    _, tree = load_manifest_tree(manifest)
+    assert tree.children['sub'].children['large.bin'].size == 3 * SAMPLE_SIZE + 5
+    differences = compare_paths(root, manifest, COMPARE_FULL, engine)
+    assert not any(differences)
+
+    write(os.path.join(root, 'small.txt'), b'hello, world')
+    os.remove(os.path.join(root, 'sub', 'empty'))
+    size_diff_files, only_in1, only_in2 = compare_paths(root, manifest, COMPARE_FULL, engine)[:3]
+    assert set(size_diff_files) == {'small.txt'} and size_diff_files['small.txt']['hash']
+    assert only_in2 == {os.path.join('sub', 'empty')} and not only_in1
+
+def test_metadata_only_manifest(tmp_path, engine):
+    root = str(tmp_path / 'tree')
+    build_tree(root)
+    manifest = write_manifest(root, str(tmp_path / 'tree.fwm'), hash_content=False, engine=engine)
+    header, records = read_manifest(manifest)
+    assert header['algorithm'] is None
+    assert not any('hash' in record or 'sample' in record for record in records)
+    assert not any(compare_paths(root, manifest, COMPARE_QUICK, engine))
+
+def test_metadata_only_manifest_falls_back_to_size_and_mtime(tmp_path, engine):
+    root = str(tmp_path / 'tree')
+    build_tree(root)
+    manifest = write_manifest(root, str(tmp_path / 'tree.fwm'), hash_content=False, engine=engine)
+    path = os.path.join(root, 'small.txt')
+    write(path, b'HELLO', mtime_ns=1_700_000_000 * 10**9)
+    size_diff_files = compare_paths(root, manifest, COMPARE_FULL, engine, detect_moves=True)[0]
+    assert size_diff_files['small.txt']['last_modified'] and not size_diff_files['small.txt']['hash']
@@ -0,0 +1,37 @@
+import os
+from compare import compare_directories, COMPARE_FULL
+from hasher import SAMPLE_SIZE
+from conftest import write
+
+def test_moves_are_confirmed_by_content(tmp_path, engine):
+    dir1, dir2 = str(tmp_path / 'one'), str(tmp_path / 'two')
+    large = os.urandom(3 * SAMPLE_SIZE)
+    decoy = bytearray(large)
+    decoy[SAMPLE_SIZE + 10] ^= 0xff
+    for root in (dir1, dir2):
+        write(os.path.join(root, 'a', 'keep.txt'), b'keep')
+    write(os.path.join(dir1, 'a', 'large.bin'), large)
+    write(os.path.join(dir2, 'c', 'large.bin'), large)
+    write(os.path.join(dir1, 'a', 'old.txt'), b'renamed')
+    write(os.path.join(dir2, 'a', 'new.txt'), b'renamed')
+    # Та же выборка и размер, но другая середина: переносом не считается
+    write(os.path.join(dir1, 'a', 'decoy.bin'), bytes(decoy))
+    write(os.path.join(dir2, 'b', 'decoy.bin'), large)
+
+    result = compare_directories(dir1, dir2, COMPARE_FULL, engine, recursive=True, detect_moves=True)
+    only_in1, only_in2_dirs, moved = result[1], result[4], result[6]
+    assert moved == {
+        os.path.join('c', 'large.bin'): os.path.join('a', 'large.bin'),
+        os.path.join('a', 'new.txt'): os.path.join('a', 'old.txt'),
+    }
+    assert only_in1 == {os.path.join('a', 'decoy.bin')}
+    assert 'b' in only_in2_dirs
+
+def test_result_shape_depends_on_detect_moves(tmp_path, engine):
+    dir1, dir2 = str(tmp_path / 'one'), str(tmp_path / 'two')
+    write(os.path.join(dir1, 'old.txt'), b'moved')
+    write(os.path.join(dir2, 'new.txt'), b'moved')
+    result = compare_directories(dir1, dir2, COMPARE_FULL, engine)
+    assert len(result) == 6 and result[1] == {'old.txt'} and result[2] == {'new.txt'}
+    result = compare_directories(dir1, dir2, COMPARE_FULL, engine, detect_moves=True)
+    assert len(result) == 7 and result[6] == {'new.txt': 'old.txt'} and not result[1]
@@ -0,0 +1,24 @@
+import os
+from conftest import write, MTIME_NS
+from records import build_record_store
+
+def test_record_store_stays_under_100_bytes_per_entry(tmp_path):
+    for index in range(40):
+        for number in range(50):
+            write(str(tmp_path / f'dir{index:02}' / f'file{number:03}.txt'), b'x' * number)
+    store = build_record_store(str(tmp_path))
+    assert len(store) == 40 * 50 + 40
+    assert store.nbytes() / len(store) < 100
+
+def test_record_store_lookup_and_streaming(tmp_path):
+    write(str(tmp_path / 'b' / 'inner.bin'), b'abc')
+    write(str(tmp_path / 'a.txt'), b'hello')
+    store = build_record_store(str(tmp_path))
+    row = store.find(os.path.join('b', 'inner.bin'))
+    assert store.rel_path(row) == os.path.join('b', 'inner.bin') and not store.is_dir(row)
+    assert store.find('missing.txt') is None
+    infos = {info.path: info for info in store.iter_infos()}
+    assert set(infos) == {str(tmp_path / 'a.txt'), str(tmp_path / 'b'), str(tmp_path / 'b' / 'inner.bin')}
+    assert infos[str(tmp_path / 'a.txt')].size == 5
+    assert infos[str(tmp_path / 'a.txt')].mtime_ns == MTIME_NS
+    assert infos[str(tmp_path / 'b')].is_dir
@@ -0,0 +1,25 @@
+import os
+import scanner
+from scanner import scan_directory, descends
+from conftest import write
+
+def test_scan_directory_stats_each_entry_once(tmp_path):
+    write(str(tmp_path / 'a.txt'), b'abc')
+    write(str(tmp_path / 'b.txt'), b'abcdef')
+    (tmp_path / 'sub').mkdir()
+    scanner.reset_stat_calls()
+    infos = scan_directory(str(tmp_path))
+    assert scanner.stat_calls == 3
+    assert infos['a.txt'].size == 3 and infos['b.txt'].size == 6
+    assert infos['sub'].is_dir and not infos['a.txt'].is_dir
+
+def test_symlinks_are_classified_by_target(tmp_path):
+    write(str(tmp_path / 'target' / 'f.txt'), b'data')
+    os.symlink(str(tmp_path / 'target'), str(tmp_path / 'dir_link'))
+    os.symlink(str(tmp_path / 'target' / 'f.txt'), str(tmp_path / 'file_link'))
+    os.symlink(str(tmp_path / 'missing'), str(tmp_path / 'dangling'))
+    infos = scan_directory(str(tmp_path))
+    assert 'dangling' not in infos
+    assert infos['dir_link'].is_dir and infos['dir_link'].is_link and not descends(infos['dir_link'])
+    assert infos['file_link'].size == 4 and infos['file_link'].is_link
+    assert descends(infos['target'])
@@ -0,0 +1,28 @@
+import os
+from compare import iter_differences, COMPARE_QUICK, COMPARE_FULL
+from shards import iter_sharded_differences
+from conftest import write
+
+def build_trees(tmp_path):
+    dir1, dir2 = str(tmp_path / 'one'), str(tmp_path / 'two')
+    for i in range(4):
+        for j in range(5):
+            rel = os.path.join(f'd{i}', f's{j}', f'f{j}.bin')
+            write(os.path.join(dir1, rel), b'%d-%d' % (i, j) * 50)
+            write(os.path.join(dir2, rel), b'%d-%d' % (i, j) * 50)
+    write(os.path.join(dir2, 'd0', 's1', 'f1.bin'), b'changed' * 50)
+    write(os.path.join(dir2, 'd1', 's2', 'f2.bin'), b'x' * 150, 1)
+    write(os.path.join(dir1, 'd2', 'only1.txt'), b'1')
+    write(os.path.join(dir2, 'd3', 's0', 'new', 'only2.txt'), b'2')
+    return dir1, dir2
+
+def normalized(differences):
+    return sorted((d.status, d.path, d.is_dir, tuple(sorted((d.changes or {}).items()))) for d in differences)
+
+def test_sharded_compare_matches_single_process(tmp_path, engine):
+    dir1, dir2 = build_trees(tmp_path)
+    for mode in (COMPARE_QUICK, COMPARE_FULL):
+        expected = normalized(iter_differences(dir1, dir2, mode, engine, recursive=True))
+        sharded = normalized(iter_sharded_differences(dir1, dir2, mode, processes=2, cache=None))
+        assert sharded == expected
+        assert expected
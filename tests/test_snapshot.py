@@ -0,0 +1,44 @@
+import os
+import zipfile
+import pytest
+import snapshot
+from snapshot import create_snapshot, load_snapshot, COMPRESSION_TYPES
+from compare import compare_paths, COMPARE_FULL
+from hasher import SAMPLE_SIZE
+from conftest import write
+
+def build_tree(root):
+    write(os.path.join(root, 'text.txt'), b'hello ' * 5000)
+    write(os.path.join(root, 'sub', 'random.bin'), os.urandom(snapshot.SPOOL_LIMIT + 3 * SAMPLE_SIZE))
+    write(os.path.join(root, 'sub', 'empty.txt'), b'')
+    write(os.path.join(root, 'имя.txt'), b'unicode')
+    os.makedirs(os.path.join(root, 'empty_dir'))
+
+def read_tree(root):
+    files = {}
+    for dirpath, dirs, names in os.walk(root):
+        for name in dirs + names:
+            path = os.path.join(dirpath, name)
+            files[os.path.relpath(path, root)] = None if os.path.isdir(path) else open(path, 'rb').read()
+    return files
+
+@pytest.mark.parametrize('compression', sorted(COMPRESSION_TYPES))
+def test_parallel_snapshot_round_trip(tmp_path, engine, compression):
+    root = str(tmp_path / 'tree')
+    build_tree(root)
+    archive = create_snapshot(root, False, str(tmp_path / 'snap.zip'), compression, workers=3)
+    with zipfile.ZipFile(archive) as zf:
+        assert zf.testzip() is None
+    load_snapshot(archive, str(tmp_path / 'restored'))
+    assert read_tree(str(tmp_path / 'restored')) == read_tree(root)
+    assert not any(compare_paths(root, archive, COMPARE_FULL, engine))
+
+def test_zip64_records(tmp_path, monkeypatch):
+    # Порог ZIP64 занижен, чтобы проверить дополнительные поля без многогигабайтных файлов
+    monkeypatch.setattr(snapshot, 'ZIP64_LIMIT', 100)
+    root = str(tmp_path / 'tree')
+    build_tree(root)
+    archive = create_snapshot(root, False, str(tmp_path / 'snap.zip'), 'deflate', workers=2)
+    with zipfile.ZipFile(archive) as zf:
+        assert zf.testzip() is None
+        assert zf.read('sub/random.bin') == open(os.path.join(root, 'sub', 'random.bin'), 'rb').read()
@@ -0,0 +1,38 @@
+import os
+from conftest import write, MTIME_NS
+from snapshot_repo import SnapshotRepository
+
+def count_objects(repo):
+    return sum(len(files) for _, _, files in os.walk(repo.objects_dir))
+
+def test_incremental_snapshot_reuses_unchanged_and_moved_files(tmp_path, engine):
+    source = str(tmp_path / 'source')
+    write(os.path.join(source, 'keep.txt'), b'unchanged')
+    write(os.path.join(source, 'sub', 'move.bin'), b'moved content' * 100)
+    write(os.path.join(source, 'edit.txt'), b'before')
+    repo = SnapshotRepository(str(tmp_path / 'repo'), workers=2, engine=engine)
+
+    first, stats = repo.create(source)
+    assert stats['stored'] == 3 and stats['reused'] == 0
+    objects = count_objects(repo)
+
+    os.rename(os.path.join(source, 'sub', 'move.bin'), os.path.join(source, 'moved.bin'))
+    write(os.path.join(source, 'edit.txt'), b'after!', MTIME_NS + 10**9)
+    second, stats = repo.create(source)
+    assert second != first and repo.latest() == second
+    assert stats == {'stored': 1, 'reused': 1, 'moved': 1, 'bytes_read': len(b'after!')}
+    # Новый объект только для изменённого файла
+    assert count_objects(repo) == objects + 1
+
+    target = str(tmp_path / 'restored')
+    repo.restore(second, target)
+    expected = {'keep.txt': b'unchanged', 'moved.bin': b'moved content' * 100, 'edit.txt': b'after!'}
+    for rel_path, data in expected.items():
+        with open(os.path.join(target, rel_path), 'rb') as f:
+            assert f.read() == data
+    assert os.stat(os.path.join(target, 'keep.txt')).st_mtime_ns == MTIME_NS
+    assert os.listdir(os.path.join(target, 'sub')) == []
+
+    repo.restore(first, str(tmp_path / 'first'))
+    with open(str(tmp_path / 'first' / 'sub' / 'move.bin'), 'rb') as f:
+        assert f.read() == b'moved content' * 100
@@ -0,0 +1,45 @@
+import os
+import time
+import hashlib
+import pytest
+from conftest import write
+from streams import XattrStreamBackend, StreamCache, stream_digest
+
+@pytest.fixture
+def tagged_file(tmp_path):
+    if not hasattr(os, 'setxattr'):
+        pytest.skip("no extended attributes on this platform")
+    path = write(str(tmp_path / 'tagged.txt'), b'main content')
+    try:
+        os.setxattr(path, 'user.small', b'abc')
+        os.setxattr(path, 'user.large', b'x' * 2000)
+    except OSError:
+        pytest.skip("filesystem does not support user xattrs")
+    return path
+
+def test_xattr_backend_lists_sizes_without_reading_values(tagged_file, monkeypatch):
+    backend = XattrStreamBackend()
+    monkeypatch.setattr(os, 'getxattr', lambda *args, **kwargs: pytest.fail("value read"))
+    assert sorted(backend.list_streams(tagged_file)) == [('user.large', 2000), ('user.small', 3)]
+
+def test_stream_digest_reads_the_attribute(tagged_file):
+    assert stream_digest(tagged_file, 'user.small', 3, 'sha256') == hashlib.sha256(b'abc').hexdigest()
+
+class CountingBackend(XattrStreamBackend):
+    calls = 0
+
+    def list_streams(self, path):
+        self.calls += 1
+        return super().list_streams(path)
+
+def test_stream_cache_is_invalidated_by_attribute_changes(tagged_file):
+    backend = CountingBackend()
+    cache = StreamCache(backend)
+    assert len(cache.list_streams(tagged_file)) == 2
+    assert len(cache.list_streams(tagged_file)) == 2
+    assert backend.calls == 1
+    # Запись xattr меняет ctime файла; ядро ведёт ctime по грубым часам, поэтому ждём тик
+    time.sleep(0.05)
+    os.setxattr(tagged_file, 'user.small', b'abcdef')
+    assert ('user.small', 6) in cache.list_streams(tagged_file)
+    assert backend.calls == 2
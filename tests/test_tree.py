@@ -0,0 +1,74 @@
+import os
+import zipfile
+from compare import compare_paths, COMPARE_QUICK, COMPARE_FULL
+from manifest import write_manifest, load_manifest_tree
+from zipview import ZipSnapshot
+from dirindex import DirSizeIndex
+from hasher import SAMPLE_SIZE
+from conftest import write, MTIME_NS
+
+def build_tree(root):
+    for i in range(3):
+        write(os.path.join(root, f'd{i}', 'sub', 'f.bin'), bytes([i]) * (3 * SAMPLE_SIZE))
+        write(os.path.join(root, f'd{i}', 'g.txt'), b'same')
+
+def edit_in_place(path):
+    # Тот же размер и то же время изменения, другое содержимое
+    with open(path, 'r+b') as f:
+        f.seek(SAMPLE_SIZE + 1)
+        f.write(b'\xff')
+    os.utime(path, ns=(MTIME_NS, MTIME_NS))
+
+def test_full_compare_against_manifest_sees_edits_with_same_metadata(tmp_path, engine):
+    root = str(tmp_path / 'tree')
+    build_tree(root)
+    manifest = write_manifest(root, str(tmp_path / 'tree.fwm'), engine=engine)
+    edit_in_place(os.path.join(root, 'd1', 'sub', 'f.bin'))
+    size_diff_files = compare_paths(root, manifest, COMPARE_FULL, engine)[0]
+    assert size_diff_files == {os.path.join('d1', 'sub', 'f.bin'): {
+        'size': False, 'attributes': False, 'last_modified': False, 'ads': False, 'hash': True}}
+    assert not any(compare_paths(root, manifest, COMPARE_QUICK, engine))
+
+def test_manifest_digests_include_stored_hashes(tmp_path, engine):
+    root = str(tmp_path / 'tree')
+    build_tree(root)
+    before = write_manifest(root, str(tmp_path / 'before.fwm'), engine=engine)
+    edit_in_place(os.path.join(root, 'd2', 'sub', 'f.bin'))
+    after = write_manifest(root, str(tmp_path / 'after.fwm'), engine=engine)
+    result = compare_paths(before, after, COMPARE_FULL, engine)
+    assert set(result[0]) == {os.path.join('d2', 'sub', 'f.bin')}
+    assert result[5] == {'d2', os.path.join('d2', 'sub')}
+    assert not any(compare_paths(before, before, COMPARE_FULL, engine))
+
+def test_deep_trees_do_not_recurse(tmp_path, engine):
+    depth = 1200
+    path = root = str(tmp_path / 'deep')
+    dirs = [root]
+    os.mkdir(root)
+    for _ in range(depth):
+        path = os.path.join(path, 'a')
+        os.mkdir(path)
+        dirs.append(path)
+    leaf = write(os.path.join(path, 'f.txt'), b'leaf')
+    try:
+        check_deep_tree(tmp_path, root, depth, engine)
+    finally:
+        # shutil.rmtree при очистке tmp_path рекурсивен -> удаляем снизу вверх сами
+        os.remove(leaf)
+        for path in reversed(dirs):
+            os.rmdir(path)
+
+def check_deep_tree(tmp_path, root, depth, engine):
+    index = DirSizeIndex(root)
+    assert index.size(root) == 4 and index.file_count(root) == 1
+    index.refresh(os.path.join(root, 'a'))
+    assert index.size(root) == 4
+
+    manifest = write_manifest(root, str(tmp_path / 'deep.fwm'), engine=engine)
+    assert load_manifest_tree(manifest)[1].file_count == 1
+
+    archive = str(tmp_path / 'deep.zip')
+    with zipfile.ZipFile(archive, 'w') as zf:
+        zf.writestr('a/' * depth + 'f.txt', b'leaf')
+    with ZipSnapshot(archive, engine) as snapshot:
+        assert snapshot.tree.size == 4
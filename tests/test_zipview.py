@@ -0,0 +1,40 @@
+import os
+import zipfile
+import tempfile
+import pytest
+from conftest import write
+from compare import compare_paths, COMPARE_FULL
+from snapshot import create_snapshot
+from zipview import ZipSnapshot
+
+@pytest.fixture
+def no_extraction(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("snapshot must be read in place")
+    monkeypatch.setattr(zipfile.ZipFile, 'extract', fail)
+    monkeypatch.setattr(zipfile.ZipFile, 'extractall', fail)
+    monkeypatch.setattr(tempfile, 'mkdtemp', fail)
+    monkeypatch.setattr(tempfile, 'TemporaryDirectory', fail)
+
+def make_snapshot(tmp_path):
+    root = str(tmp_path / 'tree')
+    write(os.path.join(root, 'a.txt'), b'first')
+    write(os.path.join(root, 'sub', 'b.txt'), b'second')
+    return root, create_snapshot(root, False, str(tmp_path / 'snap.zip'), 'deflate', workers=1)
+
+def test_compare_with_snapshot_reads_members_in_place(tmp_path, engine, no_extraction):
+    root, archive = make_snapshot(tmp_path)
+    assert not any(compare_paths(root, archive, COMPARE_FULL, engine))
+    # Тот же размер и время, другое содержимое
+    write(os.path.join(root, 'sub', 'b.txt'), b'SECOND')
+    differences = compare_paths(root, archive, COMPARE_FULL, engine)
+    assert set(differences[0]) == {os.path.join('sub', 'b.txt')}
+    assert not any(differences[1:5])
+
+def test_crc32_digest_comes_from_the_central_directory(tmp_path, engine, monkeypatch):
+    _, archive = make_snapshot(tmp_path)
+    with ZipSnapshot(archive, engine) as snapshot_view:
+        info = snapshot_view.tree.children['a.txt']
+        monkeypatch.setattr(ZipSnapshot, 'open', lambda self, info: pytest.fail("member opened"))
+        assert snapshot_view.member_digest(info, 'crc32') == f'{zipfile.crc32(b"first"):08x}'
+        assert snapshot_view.stored_digest(info) == f'{zipfile.crc32(b"first"):08x}'
@@ -0,0 +1,118 @@
+import hashlib
+from scanner import scan_directory, descends
+from jobs import check_progress
+
+def metadata_key(info):
+    return f"{info.size}\0{info.mtime_ns}\0{info.attributes}"
+
+class DirNode:
+    __slots__ = ('info', 'children', 'size', 'file_count', 'digest', 'source')
+
+    def __init__(self, info, children):
+        self.info = info
+        self.children = children
+        self.size = 0
+        self.file_count = 0
+        self.digest = None
+        self.source = None
+        for child in children.values():
+            self.size += child.size
+            self.file_count += child.file_count if isinstance(child, DirNode) else 1
+
+    def update_digest(self, hashes=None, recursive=False, key=None):
+        if recursive:
+            # Без рекурсии: узлы в порядке обхода, дайджесты считаются с конца - дети раньше родителей
+            for node in reversed(list(self.iter_nodes())):
+                node.update_digest(hashes, False, key)
+            return
+        key = key or metadata_key
+        digest = hashlib.sha256()
+        for name in sorted(self.children):
+            child = self.children[name]
+            if isinstance(child, DirNode):
+                digest.update(f"d\0{name}\0".encode('utf-8', 'surrogateescape'))
+                digest.update(child.digest)
+            else:
+                content = hashes.get(child.path) if hashes is not None else ''
+                digest.update(f"f\0{name}\0{key(child)}\0{content}\0".encode('utf-8', 'surrogateescape'))
+        self.digest = digest.digest()
+
+    def iter_nodes(self):
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(child for child in node.children.values() if isinstance(child, DirNode))
+
+    def iter_files(self):
+        for node in self.iter_nodes():
+            for child in node.children.values():
+                if not isinstance(child, DirNode):
+                    yield child
+
+    @property
+    def name(self):
+        return self.info.name if self.info else ''
+
+    def find(self, rel_path):
+        node = self
+        for part in rel_path.replace('\\', '/').split('/'):
+            if part:
+                node = node.children[part]
+        return node
+
+def build_nodes(order):
+    # order - каталоги в порядке обхода (info, children, родительский children, имя);
+    # DirNode считает размер по готовым детям, поэтому узлы создаются с конца
+    root = None
+    for info, children, parent, name in reversed(order):
+        node = DirNode(info, children)
+        if parent is None:
+            root = node
+        else:
+            parent[name] = node
+    return root
+
+def scan_tree(path, info=None, progress=None, ignore=None, rel_dir=''):
+    # Обход стеком, а не рекурсией: глубина дерева не ограничена лимитом рекурсии
+    order = []
+    stack = [(path, info, rel_dir, None)]
+    while stack:
+        dir_path, dir_info, dir_rel, parent = stack.pop()
+        check_progress(progress, path=dir_path)
+        entries = scan_directory(dir_path).values()
+        if ignore:
+            entries = ignore.filter(dir_rel, entries)
+        children = {}
+        order.append((dir_info, children, parent, dir_info.name if dir_info else ''))
+        for child in entries:
+            if descends(child):
+                child_rel = f"{dir_rel}/{child.name}" if dir_rel else child.name
+                stack.append((child.path, child, child_rel, children))
+            elif child.is_dir:
+                # Каталог-ссылка остаётся пустым узлом
+                children[child.name] = DirNode(child, {})
+            else:
+                children[child.name] = child
+    return build_nodes(order)
+
+def prune_tree(node, ignore, rel_dir=''):
+    # Для деревьев из манифеста или zip, которые уже построены целиком
+    order = []
+    stack = [(node, rel_dir, None)]
+    while stack:
+        current, current_rel, parent = stack.pop()
+        children = {}
+        order.append((current.info, children, parent, current.name))
+        for name, child in current.children.items():
+            rel_path = f"{current_rel}/{name}" if current_rel else name
+            is_dir = isinstance(child, DirNode)
+            if ignore.skip(rel_path, is_dir):
+                continue
+            if is_dir:
+                stack.append((child, rel_path, children))
+            else:
+                children[name] = child
+    pruned = build_nodes(order)
+    pruned.source = node.source
+    return pruned
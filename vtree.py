@@ -0,0 +1,157 @@
+import tkinter as tk
+from tkinter import ttk
+
+DEFAULT_ROW_HEIGHT = 20
+MARGIN = 50
+
+class VirtualTreeview:
+    # В Treeview живут только видимые строки плюс запас, остальные хранятся списком
+    def __init__(self, master, columns, margin=MARGIN, **kwargs):
+        self.frame = ttk.Frame(master)
+        self.frame.grid_columnconfigure(0, weight=1)
+        self.frame.grid_rowconfigure(0, weight=1)
+        self.tree = ttk.Treeview(self.frame, columns=columns, yscrollcommand=self._on_tree_scroll, **kwargs)
+        self.tree.grid(row=0, column=0, sticky='nsew')
+        self.scrollbar = ttk.Scrollbar(self.frame, orient=tk.VERTICAL, command=self.yview)
+        self.scrollbar.grid(row=0, column=1, sticky='ns')
+        self.margin = margin
+        self.rows = []
+        self.top = 0
+        self.rendered_top = 0
+        self.items = []
+        self.rendering = False
+        self.on_view_change = None
+
+        self.tree.bind('<Configure>', lambda event: self.render())
+        self.tree.bind('<MouseWheel>', self._on_wheel)
+        self.tree.bind('<Button-4>', lambda event: self.scroll(-3))
+        self.tree.bind('<Button-5>', lambda event: self.scroll(3))
+        self.tree.bind('<Up>', lambda event: self._on_key_up(1))
+        self.tree.bind('<Prior>', lambda event: self._on_key_up(self.visible_count()))
+
+    def grid(self, **kwargs):
+        self.frame.grid(**kwargs)
+
+    def heading(self, *args, **kwargs):
+        return self.tree.heading(*args, **kwargs)
+
+    def column(self, *args, **kwargs):
+        return self.tree.column(*args, **kwargs)
+
+    def tag_configure(self, *args, **kwargs):
+        return self.tree.tag_configure(*args, **kwargs)
+
+    def __getitem__(self, key):
+        return self.tree[key]
+
+    def __setitem__(self, key, value):
+        self.tree[key] = value
+
+    def row_height(self):
+        height = ttk.Style().lookup('Treeview', 'rowheight')
+        try:
+            return int(height) or DEFAULT_ROW_HEIGHT
+        except (TypeError, ValueError):
+            return DEFAULT_ROW_HEIGHT
+
+    def visible_count(self):
+        height = self.tree.winfo_height()
+        if height <= 1:
+            return int(self.tree['height'])
+        return max(1, height // self.row_height())
+
+    def set_rows(self, rows, keep_position=False):
+        self.rows = list(rows)
+        if not keep_position:
+            self.top = 0
+            self.tree.selection_set(())
+        self.render()
+
+    def clear(self):
+        self.set_rows([])
+
+    def row_values(self, index):
+        return self.rows[index][0]
+
+    def visible_range(self):
+        return self.top, min(len(self.rows), self.top + self.visible_count())
+
+    def update_row(self, index, values, tags=()):
+        self.rows[index] = (values, tags)
+        offset = index - self.rendered_top
+        if 0 <= offset < len(self.items):
+            self.tree.item(self.items[offset], values=values, tags=tags)
+
+    def selection_indexes(self):
+        return [self.rendered_top + self.items.index(iid) for iid in self.tree.selection() if iid in self.items]
+
+    def render(self):
+        if self.rendering:
+            return
+        self.rendering = True
+        try:
+            visible = self.visible_count()
+            self.top = max(0, min(self.top, len(self.rows) - visible))
+            window = self.rows[self.top:self.top + visible + self.margin]
+            selected = self.selection_indexes()
+            focus = self.tree.focus()
+            focus = self.rendered_top + self.items.index(focus) if focus in self.items else None
+
+            # Существующие строки переиспользуем, лишние удаляем, недостающие добавляем одной пачкой
+            for iid, (values, tags) in zip(self.items, window):
+                self.tree.item(iid, values=values, tags=tags)
+            if len(self.items) > len(window):
+                self.tree.delete(*self.items[len(window):])
+                del self.items[len(window):]
+            for values, tags in window[len(self.items):]:
+                self.items.append(self.tree.insert('', 'end', values=values, tags=tags))
+
+            self.tree.yview_moveto(0)
+            self.rendered_top = self.top
+            self.tree.selection_set([self.items[i - self.top] for i in selected if 0 <= i - self.top < len(self.items)])
+            if focus is not None and 0 <= focus - self.top < len(self.items):
+                self.tree.focus(self.items[focus - self.top])
+            self.update_scrollbar(visible)
+        finally:
+            self.rendering = False
+        if self.on_view_change:
+            self.on_view_change()
+
+    def update_scrollbar(self, visible):
+        if not self.rows:
+            self.scrollbar.set(0, 1)
+            return
+        total = len(self.rows)
+        self.scrollbar.set(self.top / total, min(1, (self.top + visible) / total))
+
+    def scroll(self, rows):
+        top = max(0, min(self.top + rows, len(self.rows) - self.visible_count()))
+        if top != self.top:
+            self.top = top
+            self.render()
+
+    def yview(self, *args):
+        if args[0] == 'moveto':
+            self.top = int(float(args[1]) * len(self.rows))
+            self.render()
+        elif args[0] == 'scroll':
+            step = int(args[1]) * (self.visible_count() if args[2] == 'pages' else 1)
+            self.scroll(step)
+
+    def _on_wheel(self, event):
+        self.scroll(-3 if event.delta > 0 else 3)
+        return 'break'
+
+    def _on_key_up(self, rows):
+        # Выше первой материализованной строки Treeview сам не уйдёт -> сдвигаем окно заранее
+        if self.items and self.tree.focus() == self.items[0] and self.top > 0:
+            self.scroll(-rows)
+
+    def _on_tree_scroll(self, first, last):
+        # Treeview прокрутился сам (клавиатура, see) -> переносим смещение в self.top
+        if self.rendering or not self.items:
+            return
+        offset = round(float(first) * len(self.items))
+        if offset:
+            self.top = self.rendered_top + offset
+            self.render()
@@ -0,0 +1,163 @@
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+from scanner import scan_directory
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct('iIII')
+READ_SIZE = 64 * 1024
+
+# Изменения копятся, пока каталог не затихнет на DEBOUNCE, но не дольше MAX_LATENCY
+DEBOUNCE = 0.2
+MAX_LATENCY = 0.5
+IDLE_TIMEOUT = 0.5
+POLL_INTERVAL = 2.0
+
+class InotifyBackend:
+    def __init__(self, root):
+        self.root = os.path.normpath(root)
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.paths = {}
+        try:
+            self.watch_tree(self.root)
+        except OSError:
+            self.close()
+            raise
+
+    def add_watch(self, path):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            # Каталог мог исчезнуть между обходом и подпиской, а вот исчерпание лимита - настоящая ошибка
+            if error == errno.ENOSPC:
+                raise OSError(error, "inotify watch limit reached")
+            return
+        self.paths[wd] = path
+
+    def watch_tree(self, path):
+        self.add_watch(path)
+        for root, dirs, files in os.walk(path):
+            for dir_name in dirs:
+                self.add_watch(os.path.join(root, dir_name))
+
+    def read(self, timeout):
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        try:
+            data = os.read(self.fd, READ_SIZE)
+        except BlockingIOError:
+            return set()
+        changed = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                # Очередь ядра переполнилась -> события потеряны, пересчитываем всё
+                changed.update(self.paths.values())
+                continue
+            if mask & IN_IGNORED:
+                self.paths.pop(wd, None)
+                continue
+            path = self.paths.get(wd)
+            if path is None:
+                continue
+            changed.add(path)
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                # Файлы, появившиеся до подписки на новый каталог, событий не дадут
+                new_dir = os.path.join(path, name)
+                self.watch_tree(new_dir)
+                changed.add(new_dir)
+        return changed
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+class PollingBackend:
+    def __init__(self, root, interval=POLL_INTERVAL):
+        self.root = os.path.normpath(root)
+        self.interval = interval
+        self.state = self.snapshot()
+        self.next_poll = time.monotonic() + interval
+
+    def snapshot(self):
+        state = {}
+        for root, dirs, files in os.walk(self.root):
+            state[os.path.normpath(root)] = {
+                name: (info.is_dir, info.size, info.mtime_ns)
+                for name, info in scan_directory(root).items()
+            }
+        return state
+
+    def read(self, timeout):
+        delay = self.next_poll - time.monotonic()
+        if delay > timeout:
+            time.sleep(timeout)
+            return set()
+        time.sleep(max(0, delay))
+        self.next_poll = time.monotonic() + self.interval
+        state = self.snapshot()
+        changed = {path for path in state.keys() | self.state.keys() if state.get(path) != self.state.get(path)}
+        self.state = state
+        return changed
+
+    def close(self):
+        self.state = {}
+
+def open_backend(root):
+    if sys.platform.startswith('linux'):
+        try:
+            return InotifyBackend(root)
+        except (OSError, AttributeError):
+            pass
+    return PollingBackend(root)
+
+def watch_directory(root, progress, debounce=DEBOUNCE, max_latency=MAX_LATENCY):
+    backend = open_backend(root)
+    try:
+        changed = set()
+        first_change = last_change = 0
+        while True:
+            progress.check()
+            if changed:
+                now = time.monotonic()
+                timeout = max(0, min(last_change + debounce, first_change + max_latency) - now)
+            else:
+                timeout = IDLE_TIMEOUT
+            events = backend.read(timeout)
+            now = time.monotonic()
+            if events:
+                if not changed:
+                    first_change = now
+                changed.update(events)
+                last_change = now
+            if changed and (now - last_change >= debounce or now - first_change >= max_latency):
+                progress.emit(sorted(changed))
+                changed = set()
+    finally:
+        backend.close()
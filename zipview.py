@@ -0,0 +1,117 @@
+import os
+import time
+import zipfile
+from collections import OrderedDict
+from hasher import default_engine
+from scanner import FileInfo
+from tree import DirNode
+from jobs import check_progress
+
+SNAPSHOT_FIELDS = frozenset(('size', 'last_modified'))
+# В zip время хранится в формате DOS с точностью до 2 секунд
+ZIP_MTIME_RESOLUTION_NS = 2 * 10**9
+MAX_CACHED_DIGESTS = 100000
+
+def is_snapshot_archive(path):
+    return os.path.isfile(path) and zipfile.is_zipfile(path)
+
+def zip_mtime(date_time):
+    return time.mktime(date_time + (0, 0, -1))
+
+class ZipSnapshot:
+    native_algorithm = 'crc32'
+    fields = SNAPSHOT_FIELDS
+    mtime_resolution_ns = ZIP_MTIME_RESOLUTION_NS
+    has_samples = False
+    has_content = True
+
+    def __init__(self, filepath, engine=None):
+        self.filepath = filepath
+        self.engine = engine or default_engine
+        self.zf = zipfile.ZipFile(filepath)
+        self.members = {}
+        self.digest_cache = OrderedDict()
+        self.tree = self.build_tree()
+
+    def make_info(self, parts, zinfo=None):
+        path = os.path.join(self.filepath, *parts)
+        if zinfo is None:
+            return FileInfo(parts[-1] if parts else '', path, True, 0, 0, 0)
+        mtime = zip_mtime(zinfo.date_time)
+        info = FileInfo(parts[-1], path, zinfo.is_dir(), zinfo.file_size, mtime, int(mtime * 10**9))
+        if not zinfo.is_dir():
+            self.members[path] = zinfo
+        return info
+
+    def build_tree(self):
+        dirs = {(): (self.make_info(()), {})}
+
+        def ensure_dir(parts):
+            missing = []
+            parent = parts
+            while parent not in dirs:
+                missing.append(parent)
+                parent = parent[:-1]
+            for parent in reversed(missing):
+                dirs[parent] = (self.make_info(parent), {})
+                dirs[parent[:-1]][1][parent[-1]] = parent
+            return dirs[parts]
+
+        for zinfo in self.zf.infolist():
+            parts = tuple(part for part in zinfo.filename.split('/') if part)
+            if not parts:
+                continue
+            if zinfo.is_dir():
+                children = ensure_dir(parts)[1]
+                dirs[parts] = (self.make_info(parts, zinfo), children)
+            else:
+                ensure_dir(parts[:-1])[1][parts[-1]] = self.make_info(parts, zinfo)
+
+        # Родитель попадает в dirs раньше подкаталогов -> узлы строятся с конца, без рекурсии
+        nodes = {}
+        for parts in reversed(list(dirs)):
+            info, children = dirs[parts]
+            nodes[parts] = DirNode(info, {
+                name: nodes.pop(child) if isinstance(child, tuple) else child
+                for name, child in children.items()
+            })
+        root = nodes[()]
+        root.source = self
+        return root
+
+    def member(self, info):
+        return self.members[info.path]
+
+    def stored_digest(self, info):
+        return f'{self.member(info).CRC:08x}'
+
+    def member_digest(self, info, algorithm, sampled=False, progress=None):
+        check_progress(progress, files=1, path=info.path)
+        zinfo = self.member(info)
+        if algorithm == 'crc32' and not sampled:
+            return f'{zinfo.CRC:08x}'
+        key = (zinfo.filename, algorithm, sampled)
+        if key in self.digest_cache:
+            self.digest_cache.move_to_end(key)
+            return self.digest_cache[key]
+        with self.open(info) as f:
+            digest = self.engine.hash_stream(f, zinfo.file_size, algorithm, sampled, progress)
+        self.digest_cache[key] = digest
+        if len(self.digest_cache) > MAX_CACHED_DIGESTS:
+            self.digest_cache.popitem(last=False)
+        return digest
+
+    def digests(self, infos, algorithm, sampled=False, progress=None):
+        return {info.path: self.member_digest(info, algorithm, sampled, progress) for info in infos}
+
+    def open(self, info):
+        return self.zf.open(self.member(info))
+
+    def close(self):
+        self.zf.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()